@@ -1,12 +1,10 @@
-from datetime import date
-
 from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.utils.translation import gettext as _
 from .forms import RegistrationForm, LoginForm, ResetPasswordForm, CustomPasswordChangeForm, ProfileUpdateForm
 from django.contrib.auth.decorators import login_required
-from adminpanel.models import Event
+from adminpanel.audit import log_event
 from .models import Account, PasswordResetToken
 
 def register_view(request):
@@ -14,8 +12,7 @@ def register_view(request):
         form = RegistrationForm(request.POST)
         if form.is_valid():
             form.save()
-            Event.objects.create(
-                date=date.today(),
+            log_event(
                 content=_("new_account_created_for") + f" {form.cleaned_data['first_name']} {form.cleaned_data['last_name']}",
                 user=form.instance,
                 type='USER_REGISTER'
@@ -31,8 +28,7 @@ def login_view(request):
         if form.is_valid():
             user = form.get_user()
             login(request, user)
-            Event.objects.create(
-                date=date.today(),
+            log_event(
                 content=_("login_for") + f" {user.first_name} {user.last_name}",
                 user=user,
                 type='LOGIN'
@@ -50,8 +46,7 @@ def login_view(request):
     return render(request, 'account/login.html', {'form': form})
 
 def logout_view(request):
-    Event.objects.create(
-        date=date.today(),
+    log_event(
         content=_("logout_for") + f" {request.user.first_name} {request.user.last_name}",
         user=request.user,
         type='LOGOUT'
@@ -116,8 +111,7 @@ def profile_view(request):
                 profile_form.save()
 
                 # Log the profile update event
-                Event.objects.create(
-                    date=date.today(),
+                log_event(
                     content=_("profile_updated_for") + f" {request.user.get_full_name()}",
                     user=request.user,
                     type='PROFILE_UPDATE'
@@ -134,8 +128,7 @@ def profile_view(request):
                 update_session_auth_hash(request, user)
 
                 # Log the password change event
-                Event.objects.create(
-                    date=date.today(),
+                log_event(
                     content=_("password_changed_for") + f" {request.user.get_full_name()}",
                     user=request.user,
                     type='PASSWORD_CHANGE'
@@ -0,0 +1,138 @@
+import gzip
+import json
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from account.models import Account
+from adminpanel.models import Event, EventFacet
+
+ARCHIVE_GLOB = 'events-*.jsonl.gz'
+
+
+class ArchivedEvent:
+    """
+    An event read back from an archive, with the attributes the history template uses
+    """
+
+    def __init__(self, record, user=None):
+        self.id = record['id']
+        self.date = date.fromisoformat(record['date'])
+        self.type = record['type']
+        self.content = record['content']
+        self.user_id = record['user_id']
+        self.user = user
+        self.user_name_snapshot = record['user_name']
+
+
+def archive_path(year, month):
+    return Path(settings.EVENT_ARCHIVE_DIR) / f"events-{year:04d}-{month:02d}.jsonl.gz"
+
+
+def expired_events(today=None):
+    """
+    Events older than the retention of their type (EVENT_RETENTION_DAYS, EVENT_RETENTION_DEFAULT_DAYS otherwise)
+    """
+    today = today or timezone.localdate()
+    retention = settings.EVENT_RETENTION_DAYS
+
+    expired = Q(date__lt=today - timedelta(days=settings.EVENT_RETENTION_DEFAULT_DAYS)) & ~Q(type__in=list(retention))
+    for event_type, days in retention.items():
+        expired |= Q(type=event_type, date__lt=today - timedelta(days=days))
+    return Event.objects.filter(expired)
+
+
+def archive_events(today=None, batch_size=5000):
+    """
+    Move the expired events to the monthly archives, returns the number of archived events per month.
+    Each batch is appended to the archives before being deleted: a crash in between only
+    duplicates lines, which searches skip by id
+    """
+    expired = expired_events(today).order_by('id').values(
+        'id', 'date', 'type', 'content', 'user_id', 'user_name_snapshot', 'user__first_name', 'user__last_name'
+    )
+
+    archived = {}
+    while True:
+        batch = list(expired[:batch_size])
+        if not batch:
+            EventFacet.rebuild()
+            return archived
+
+        months = {}
+        for row in batch:
+            months.setdefault((row['date'].year, row['date'].month), []).append(row)
+
+        for (year, month), rows in months.items():
+            path = archive_path(year, month)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Appending adds a gzip member, gzip.open reads all of them as one stream
+            with gzip.open(path, 'at', encoding='utf-8') as archive:
+                for row in rows:
+                    user_name = row['user_name_snapshot']
+                    if not user_name and row['user_id'] is not None:
+                        user_name = f"{row['user__first_name']} {row['user__last_name']}"
+                    archive.write(json.dumps({
+                        'id': row['id'],
+                        'date': row['date'].isoformat(),
+                        'type': row['type'],
+                        'content': row['content'],
+                        'user_id': row['user_id'],
+                        'user_name': user_name,
+                    }) + '\n')
+            archived[(year, month)] = archived.get((year, month), 0) + len(rows)
+
+        with transaction.atomic():
+            Event.objects.filter(id__in=[row['id'] for row in batch]).delete()
+
+
+def search_archives(search='', event_type='', user_id=None, date_from=None, date_to=None, limit=None):
+    """
+    Search the archives, newest first. Only the monthly files overlapping the date range are read
+    """
+    limit = limit or settings.EVENT_ARCHIVE_SEARCH_LIMIT
+    search = search.casefold()
+    user_id = int(user_id) if str(user_id or '').isdigit() else None
+
+    paths = sorted(Path(settings.EVENT_ARCHIVE_DIR).glob(ARCHIVE_GLOB), reverse=True)
+    results, seen = [], set()
+    for path in paths:
+        year, month = (int(part) for part in path.name[len('events-'):-len('.jsonl.gz')].split('-'))
+        if date_from and (year, month) < (date_from.year, date_from.month):
+            break
+        if date_to and (year, month) > (date_to.year, date_to.month):
+            continue
+
+        matches = []
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                record = json.loads(line)
+                if record['id'] in seen:
+                    continue
+                if event_type and record['type'] != event_type:
+                    continue
+                if user_id is not None and record['user_id'] != user_id:
+                    continue
+                if date_from and record['date'] < date_from.isoformat():
+                    continue
+                if date_to and record['date'] > date_to.isoformat():
+                    continue
+                if search and search not in record['content'].casefold() \
+                        and search not in record['type'].casefold() \
+                        and search not in (record['user_name'] or '').casefold():
+                    continue
+                seen.add(record['id'])
+                matches.append(record)
+
+        matches.sort(key=lambda record: (record['date'], record['id']), reverse=True)
+        results.extend(matches)
+        if len(results) >= limit:
+            break
+
+    results = results[:limit]
+    users = Account.objects.in_bulk({record['user_id'] for record in results if record['user_id'] is not None})
+    return [ArchivedEvent(record, users.get(record['user_id'])) for record in results]
@@ -0,0 +1,156 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import date
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from account.models import Account
+from adminpanel.models import Event, EventFacet
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_wake = threading.Event()
+_buffer = []
+_thread = None
+
+
+def log_event(type, content, user=None):
+    """
+    Record an audit event. Events are buffered and written in bulk by a background thread,
+    so the caller never waits on the insert (unless AUDIT_SYNC is set, e.g. in tests)
+    """
+    event = Event(
+        date=timezone.localdate(),
+        content=content,
+        type=type,
+        user_id=getattr(user, 'pk', None),
+        user_name_snapshot=user.get_full_name() if getattr(user, 'pk', None) else '',
+    )
+
+    if settings.AUDIT_SYNC:
+        event.save()
+        EventFacet.record([event])
+        return
+
+    with _lock:
+        _buffer.append(event)
+        size = len(_buffer)
+        _start_thread()
+    if size >= settings.AUDIT_BUFFER_SIZE:
+        _wake.set()
+
+
+def flush():
+    """
+    Write the buffered events, they are spooled to disk if the database is unavailable
+    """
+    with _lock:
+        events = _buffer[:]
+        del _buffer[:]
+    if not events:
+        return
+
+    try:
+        _write(events)
+    except Exception:
+        logger.exception("Could not write %s audit event(s), spooling them", len(events))
+        _spool(events)
+
+
+def _write(events):
+    with transaction.atomic():
+        _forget_deleted_users(events)
+        Event.objects.bulk_create(events, batch_size=500)
+        EventFacet.record(events)
+
+
+def _forget_deleted_users(events):
+    # Users deleted since their event was logged only keep their name snapshot
+    user_ids = {event.user_id for event in events if event.user_id is not None}
+    existing = set(Account.objects.filter(id__in=user_ids).values_list('id', flat=True))
+    for event in events:
+        if event.user_id not in existing:
+            event.user_id = None
+
+
+def _spool(events):
+    path = Path(settings.AUDIT_SPOOL_DIR) / f"{os.getpid()}-{uuid.uuid4().hex}.jsonl"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as spool:
+        for event in events:
+            spool.write(json.dumps({
+                'date': event.date.isoformat(),
+                'content': event.content,
+                'type': event.type,
+                'user_id': event.user_id,
+                'user_name_snapshot': event.user_name_snapshot,
+            }) + '\n')
+
+
+def replay_spool():
+    """
+    Write the events spooled by previous processes, returns how many were written
+    """
+    written = 0
+    for path in sorted(Path(settings.AUDIT_SPOOL_DIR).glob('*.jsonl')):
+        # Claimed by renaming, so concurrent processes never replay the same file
+        claimed = path.with_suffix(f'.{os.getpid()}.replaying')
+        try:
+            path.rename(claimed)
+        except OSError:
+            continue
+
+        with open(claimed, encoding='utf-8') as spool:
+            events = [Event(**json.loads(line)) for line in spool if line.strip()]
+        for event in events:
+            event.date = date.fromisoformat(event.date)
+
+        try:
+            _write(events)
+        except Exception:
+            claimed.rename(path)
+            raise
+        claimed.unlink()
+        written += len(events)
+    return written
+
+
+def _run():
+    try:
+        replay_spool()
+    except Exception:
+        logger.exception("Could not replay the audit spool")
+
+    while True:
+        _wake.wait(settings.AUDIT_FLUSH_INTERVAL)
+        _wake.clear()
+        close_old_connections()
+        flush()
+
+
+def _start_thread():
+    global _thread
+    if _thread is None:
+        _thread = threading.Thread(target=_run, name='audit-writer', daemon=True)
+        _thread.start()
+
+
+def _reset_after_fork():
+    # The writer thread is not copied into forked processes, and neither are the parent's events
+    global _lock, _wake, _thread
+    _lock = threading.Lock()
+    _wake = threading.Event()
+    _thread = None
+    del _buffer[:]
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(flush)
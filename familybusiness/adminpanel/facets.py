@@ -0,0 +1,62 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Max, Sum
+from django.utils.functional import cached_property
+
+from account.models import Account
+from adminpanel.models import Event, EventFacet
+
+
+class CountedPaginator(Paginator):
+    """
+    Paginator with a known total, so paging only runs the query of the page
+    """
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        return self._count
+
+
+def _facets():
+    return EventFacet.objects.filter(count__gt=0)
+
+
+def available_types():
+    return _facets().values_list('type', flat=True).distinct().order_by('type')
+
+
+def users_with_events():
+    return Account.objects.filter(
+        id__in=_facets().filter(user__isnull=False).values('user_id')
+    ).order_by('email')
+
+
+def count_events(events, event_type='', user_id='', search='', date_from=None, date_to=None):
+    """
+    Number of events matching the filters. Type and user filters are summed from the facets,
+    searches and date ranges are counted once and cached until an event is written or deleted
+    """
+    facets = _facets()
+    if event_type:
+        facets = facets.filter(type=event_type)
+    if user_id:
+        facets = facets.filter(user_id=user_id)
+
+    if not search and not date_from and not date_to:
+        return facets.aggregate(total=Sum('count'))['total'] or 0
+
+    # Inserts raise the last id, deletes lower the total: either changes the key
+    version = (
+        Event.objects.aggregate(last=Max('id'))['last'],
+        _facets().aggregate(total=Sum('count'))['total'],
+    )
+    filters = (event_type, user_id, search, date_from, date_to, version)
+    key = 'event_count:' + hashlib.sha256(repr(filters).encode()).hexdigest()
+    return cache.get_or_set(key, events.count, settings.EVENT_COUNT_CACHE_SECONDS)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from adminpanel import archive
+
+
+class Command(BaseCommand):
+    help = "Moves the events older than their retention period to compressed monthly archive files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Events moved per batch")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the expired events")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f"{archive.expired_events().count()} event(s) to archive")
+            return
+
+        archived = archive.archive_events(batch_size=options['batch_size'])
+        for (year, month), count in sorted(archived.items()):
+            self.stdout.write(f"{archive.archive_path(year, month).name}: {count} event(s)")
+        self.stdout.write(self.style.SUCCESS(f"{sum(archived.values())} event(s) archived"))
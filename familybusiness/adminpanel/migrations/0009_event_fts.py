@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:02
+
+from django.db import migrations, OperationalError
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Concat
+
+FTS_SQL = [
+    # External content table: the text lives in adminpanel_event, FTS5 only stores the index
+    """
+    CREATE VIRTUAL TABLE adminpanel_event_fts USING fts5(
+        content, type, user_name_snapshot,
+        content='adminpanel_event', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER adminpanel_event_fts_insert AFTER INSERT ON adminpanel_event BEGIN
+        INSERT INTO adminpanel_event_fts(rowid, content, type, user_name_snapshot)
+        VALUES (new.id, new.content, new.type, new.user_name_snapshot);
+    END
+    """,
+    """
+    CREATE TRIGGER adminpanel_event_fts_delete AFTER DELETE ON adminpanel_event BEGIN
+        INSERT INTO adminpanel_event_fts(adminpanel_event_fts, rowid, content, type, user_name_snapshot)
+        VALUES ('delete', old.id, old.content, old.type, old.user_name_snapshot);
+    END
+    """,
+    """
+    CREATE TRIGGER adminpanel_event_fts_update AFTER UPDATE ON adminpanel_event BEGIN
+        INSERT INTO adminpanel_event_fts(adminpanel_event_fts, rowid, content, type, user_name_snapshot)
+        VALUES ('delete', old.id, old.content, old.type, old.user_name_snapshot);
+        INSERT INTO adminpanel_event_fts(rowid, content, type, user_name_snapshot)
+        VALUES (new.id, new.content, new.type, new.user_name_snapshot);
+    END
+    """,
+    "INSERT INTO adminpanel_event_fts(adminpanel_event_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS adminpanel_event_fts_insert",
+    "DROP TRIGGER IF EXISTS adminpanel_event_fts_delete",
+    "DROP TRIGGER IF EXISTS adminpanel_event_fts_update",
+    "DROP TABLE IF EXISTS adminpanel_event_fts",
+]
+
+
+def fill_user_name_snapshots(apps, schema_editor):
+    """
+    The search indexes the name snapshot instead of joining the users, fill it for older events
+    """
+    Event = apps.get_model('adminpanel', 'Event')
+    Account = apps.get_model('account', 'Account')
+
+    names = Account.objects.filter(id=OuterRef('user_id')).annotate(
+        full_name=Concat('first_name', Value(' '), 'last_name')
+    ).values('full_name')[:1]
+    Event.objects.filter(user_name_snapshot='', user__isnull=False).update(user_name_snapshot=Subquery(names))
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fts5_check USING fts5(x)")
+            cursor.execute("DROP TABLE temp.fts5_check")
+    except OperationalError:
+        # SQLite built without FTS5, the history keeps searching with LIKE
+        return
+    for sql in FTS_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0005_alter_account_options_and_more'),
+        ('adminpanel', '0008_transaction_import_event'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_user_name_snapshots, migrations.RunPython.noop),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
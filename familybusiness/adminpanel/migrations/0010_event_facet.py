@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_events(apps, schema_editor):
+    Event = apps.get_model('adminpanel', 'Event')
+    EventFacet = apps.get_model('adminpanel', 'EventFacet')
+    grouped = Event.objects.values('type', 'user_id').annotate(count=Count('id')).order_by()
+    EventFacet.objects.bulk_create(EventFacet(**row) for row in grouped.iterator())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adminpanel', '0009_event_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(max_length=50, verbose_name='type')),
+                ('count', models.PositiveBigIntegerField(default=0, verbose_name='count')),
+                ('user', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'event facet',
+                'verbose_name_plural': 'event facets',
+                'constraints': [models.UniqueConstraint(fields=('type', 'user'), name='unique_event_facet')],
+            },
+        ),
+        migrations.RunPython(count_events, migrations.RunPython.noop),
+    ]
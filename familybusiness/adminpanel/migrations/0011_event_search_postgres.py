@@ -0,0 +1,30 @@
+from django.db import migrations
+
+# The history search of adminpanel.search on PostgreSQL (SQLite uses the FTS5 table of 0009)
+CREATE_INDEX = """
+    CREATE INDEX IF NOT EXISTS adminpanel_event_search_idx ON adminpanel_event USING gin (
+        to_tsvector('simple', content || ' ' || type || ' ' || user_name_snapshot)
+    )
+"""
+DROP_INDEX = "DROP INDEX IF EXISTS adminpanel_event_search_idx"
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adminpanel', '0010_event_facet'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:37
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_facets_without_user(apps, schema_editor):
+    """
+    Concurrent writers may have created several rows for the events without user, keep one per type
+    """
+    EventFacet = apps.get_model('adminpanel', 'EventFacet')
+    duplicates = (
+        EventFacet.objects.filter(user__isnull=True).values('type').order_by()
+        .annotate(kept=Min('id'), total=Sum('count'), rows=Count('id')).filter(rows__gt=1)
+    )
+    for row in list(duplicates):
+        EventFacet.objects.filter(id=row['kept']).update(count=row['total'])
+        EventFacet.objects.filter(type=row['type'], user__isnull=True).exclude(id=row['kept']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adminpanel', '0011_event_search_postgres'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_facets_without_user, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='eventfacet',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('type',), name='unique_event_facet_no_user'),
+        ),
+    ]
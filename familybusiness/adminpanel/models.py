@@ -1,4 +1,7 @@
-from django.db import models
+from collections import Counter
+
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, F, Q
 from django.utils.translation import gettext_lazy as _
 
 class Event(models.Model):
@@ -13,6 +16,7 @@ class Event(models.Model):
         ('TRANSACTION_DELETE', _('event_type_transaction_delete')),
         ('TRANSACTION_UPDATE', _('event_type_transaction_update')),
         ('TRANSACTION_EXPORT', _('event_type_transaction_export')),
+        ('TRANSACTION_IMPORT', _('event_type_transaction_import')),
         ('OBJECTIVE_UPDATE', _('event_type_objective_update')),
         ('USER_REGISTER', _('event_type_user_register')),
         ('PASSWORD_CHANGE', _('event_type_password_change')),
@@ -39,7 +43,69 @@ class Event(models.Model):
     class Meta:
         verbose_name = _("event")
         verbose_name_plural = _("events")
+        indexes = [
+            models.Index(fields=['user', 'date'], name='event_user_date_idx'),
+            models.Index(fields=['type', 'id'], name='event_type_id_idx'),
+        ]
 
     def __str__(self):
         user_display = self.user.get_full_name() if self.user else self.user_name_snapshot or _("deleted_user")
-        return f"{self.type} - {self.date.strftime('%Y-%m-%d')} - {user_display}"
\ No newline at end of file
+        return f"{self.type} - {self.date.strftime('%Y-%m-%d')} - {user_display}"
+
+
+class EventFacet(models.Model):
+    """
+    Number of events per type and user, so the history filters and counts never scan the events.
+    Incremented by the audit writer, rebuilt after archiving. Rows of deleted users are kept
+    so the counts per type stay right.
+    """
+    type = models.CharField(max_length=50, verbose_name=_("type"))
+    user = models.ForeignKey(
+        'account.Account',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+        verbose_name=_("user")
+    )
+    count = models.PositiveBigIntegerField(default=0, verbose_name=_("count"))
+
+    class Meta:
+        verbose_name = _("event facet")
+        verbose_name_plural = _("event facets")
+        constraints = [
+            models.UniqueConstraint(fields=['type', 'user'], name='unique_event_facet'),
+            # NULLs are distinct in the constraint above (nulls_distinct is not supported by SQLite)
+            models.UniqueConstraint(
+                fields=['type'], condition=Q(user__isnull=True), name='unique_event_facet_no_user'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} - {self.user_id} ({self.count})"
+
+    @classmethod
+    def record(cls, events):
+        """
+        Count newly written events
+        """
+        for (event_type, user_id), count in Counter((event.type, event.user_id) for event in events).items():
+            rows = cls.objects.filter(type=event_type, user_id=user_id)
+            if rows.update(count=F('count') + count):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(type=event_type, user_id=user_id, count=count)
+            except IntegrityError:
+                # Created concurrently, fall back on the update
+                rows.update(count=F('count') + count)
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Recount every facet from the events
+        """
+        grouped = Event.objects.values('type', 'user_id').annotate(count=Count('id')).order_by()
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(cls(**row) for row in grouped.iterator())
@@ -0,0 +1,66 @@
+import re
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from account.models import Account
+
+FTS_TABLE = 'adminpanel_event_fts'
+WORD = re.compile(r'\w+')
+
+# Same expression as the GIN index of migration 0011, PostgreSQL only uses the index for this exact document
+PG_DOCUMENT = "to_tsvector('simple', adminpanel_event.content || ' ' || adminpanel_event.type || ' ' || adminpanel_event.user_name_snapshot)"
+
+
+@lru_cache(maxsize=None)
+def fts_available():
+    """
+    Whether the FTS5 index of migration 0009 exists (SQLite built with FTS5)
+    """
+    return connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+
+
+def match_expression(text):
+    """
+    FTS5 query matching every word of the search, as a prefix
+    """
+    return ' '.join(f'"{word}"*' for word in WORD.findall(text))
+
+
+def tsquery(text):
+    """
+    PostgreSQL query matching every word of the search, as a prefix
+    """
+    return ' & '.join(f"'{word}':*" for word in WORD.findall(text))
+
+
+def search_events(events, text):
+    """
+    Filter events on a search text: content, type, author name and email
+    """
+    expression = match_expression(text)
+    if not expression:
+        return events
+
+    # Emails change on the account so they are not indexed, the few matching users are looked up instead
+    by_email = Q(user__in=Account.objects.filter(email__icontains=text))
+
+    if fts_available():
+        return events.filter(Q(id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expression]
+        )) | by_email)
+
+    if connection.vendor == 'postgresql':
+        return events.alias(
+            matched=RawSQL(f"{PG_DOCUMENT} @@ to_tsquery('simple', %s)", [tsquery(text)], output_field=BooleanField())
+        ).filter(Q(matched=True) | by_email)
+
+    return events.filter(
+        Q(content__icontains=text) |
+        Q(type__icontains=text) |
+        Q(user__email__icontains=text) |
+        Q(user__first_name__icontains=text) |
+        Q(user__last_name__icontains=text)
+    )
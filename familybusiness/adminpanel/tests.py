@@ -1 +1,92 @@
-from django.test import TestCase
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from account.models import Account
+from adminpanel import audit
+from adminpanel.models import Event, EventFacet
+
+
+class AuditTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user('user@example.com', "Jane", "Doe", 'password')
+
+    def setUp(self):
+        # The writer thread is never started, the tests flush the buffer themselves
+        patcher = mock.patch.object(audit, '_start_thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(audit._buffer.clear)
+
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        self.spool_dir = Path(spool_dir.name)
+        spool_settings = override_settings(AUDIT_SPOOL_DIR=self.spool_dir)
+        spool_settings.enable()
+        self.addCleanup(spool_settings.disable)
+
+    def facets(self):
+        return {(facet.type, facet.user_id): facet.count for facet in EventFacet.objects.all()}
+
+
+class SyncAuditTest(AuditTestCase):
+
+    @override_settings(AUDIT_SYNC=True)
+    def test_events_are_written_at_once(self):
+        audit.log_event('LOGIN', "Logged in", user=self.user)
+        audit.log_event('LOGIN', "Logged in again", user=self.user)
+        audit.log_event('ERROR', "Anonymous error")
+        audit.log_event('ERROR', "Another anonymous error")
+
+        self.assertEqual(audit._buffer, [])
+        event = Event.objects.get(content="Logged in")
+        self.assertEqual(event.user, self.user)
+        self.assertEqual(event.user_name_snapshot, "Jane Doe")
+        self.assertEqual(Event.objects.filter(user__isnull=True).count(), 2)
+        self.assertEqual(self.facets(), {('LOGIN', self.user.id): 2, ('ERROR', None): 2})
+
+
+@override_settings(AUDIT_SYNC=False)
+class BufferedAuditTest(AuditTestCase):
+
+    def test_events_are_written_on_flush(self):
+        audit.log_event('LOGIN', "Logged in", user=self.user)
+        audit.log_event('ERROR', "Anonymous error")
+        self.assertFalse(Event.objects.exists())
+
+        audit.flush()
+        self.assertEqual(audit._buffer, [])
+        self.assertEqual(Event.objects.count(), 2)
+        self.assertEqual(self.facets(), {('LOGIN', self.user.id): 1, ('ERROR', None): 1})
+
+    @override_settings(AUDIT_BUFFER_SIZE=2)
+    def test_full_buffer_wakes_the_writer(self):
+        audit._wake.clear()
+        audit.log_event('LOGIN', "Logged in", user=self.user)
+        self.assertFalse(audit._wake.is_set())
+        audit.log_event('LOGIN', "Logged in", user=self.user)
+        self.assertTrue(audit._wake.is_set())
+        audit._wake.clear()
+
+    def test_unwritten_events_are_spooled_and_replayed(self):
+        audit.log_event('LOGIN', "Logged in", user=self.user)
+        audit.log_event('ERROR', "Anonymous error")
+
+        with mock.patch.object(audit, '_write', side_effect=Exception("database unavailable")), \
+                self.assertLogs('adminpanel.audit', 'ERROR'):
+            audit.flush()
+        self.assertFalse(Event.objects.exists())
+        self.assertEqual(len(list(self.spool_dir.glob('*.jsonl'))), 1)
+
+        # The author was deleted before the replay, only their name is kept
+        self.user.delete()
+        self.assertEqual(audit.replay_spool(), 2)
+        self.assertEqual(list(self.spool_dir.iterdir()), [])
+        event = Event.objects.get(type='LOGIN')
+        self.assertIsNone(event.user_id)
+        self.assertEqual(event.user_name_snapshot, "Jane Doe")
+        self.assertEqual(self.facets(), {('LOGIN', None): 1, ('ERROR', None): 1})
@@ -2,21 +2,25 @@ import csv
 import re
 
 from django.core.paginator import Paginator
-from django.db import models
-from django.http import HttpResponse
+from django.db import models, transaction as db_transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Count, Sum, Q
+from django.db.models import Count, Sum, Q, F, OuterRef, Subquery, Window
+from django.db.models.functions import Coalesce, Lower, RowNumber
 from django.utils import timezone
 from django.utils.translation import gettext as _
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 from django.utils.timezone import now
 
 from adminpanel.decorators import admin_required
 from adminpanel.forms import UserCreationForm, UserEditForm
+from adminpanel import archive, facets, search
+from adminpanel.audit import log_event
 from adminpanel.models import Event
+from wallet.decorators import is_wallet_member
 from wallet.forms import WalletForm, CategoryForm
 from wallet.models import Wallet, Transaction, Category
 from account.models import Account
@@ -32,22 +36,17 @@ def admin_panel(request):
 
 @admin_required
 def history_list(request):
-    events = Event.objects.all().order_by('-date').order_by('-id')
+    events = Event.objects.select_related('user').order_by('-id')
 
     search_query = request.GET.get('search', '')
     event_type = request.GET.get('type', '')
     user_filter = request.GET.get('user', '')
     date_from = request.GET.get('date_from', '')
     date_to = request.GET.get('date_to', '')
+    search_archives = request.GET.get('archives') == '1'
 
     if search_query:
-        events = events.filter(
-            Q(content__icontains=search_query) |
-            Q(type__icontains=search_query) |
-            Q(user__email__icontains=search_query) |
-            Q(user__first_name__icontains=search_query) |
-            Q(user__last_name__icontains=search_query)
-        )
+        events = search.search_events(events, search_query)
 
     if event_type:
         events = events.filter(type=event_type)
@@ -61,19 +60,23 @@ def history_list(request):
         except ValueError:
             return None
 
-    if date_from:
-        parsed = parse_date(date_from)
-        if parsed:
-            events = events.filter(date__gte=parsed)
+    parsed_from = parse_date(date_from) if date_from else None
+    parsed_to = parse_date(date_to) if date_to else None
+
+    if parsed_from:
+        events = events.filter(date__gte=parsed_from)
 
-    if date_to:
-        parsed = parse_date(date_to)
-        if parsed:
-            events = events.filter(date__lte=parsed)
+    if parsed_to:
+        events = events.filter(date__lte=parsed_to)
 
-    filtered_events = events.count()
+    if search_archives:
+        # Archived events are read from the files, newest first, up to EVENT_ARCHIVE_SEARCH_LIMIT
+        events = archive.search_archives(search_query, event_type, user_filter, parsed_from, parsed_to)
+        filtered_events = len(events)
+    else:
+        filtered_events = facets.count_events(events, event_type, user_filter, search_query, parsed_from, parsed_to)
 
-    paginator = Paginator(events, 25)
+    paginator = facets.CountedPaginator(events, 25, filtered_events)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
@@ -86,6 +89,7 @@ def history_list(request):
         'TRANSACTION_CREATE': {'icon': 'mdi-cash-plus', 'color': 'is-success', 'label': _('event_type_transaction_create')},
         'TRANSACTION_DELETE': {'icon': 'mdi-cash-remove', 'color': 'is-warning', 'label': _('event_type_transaction_delete')},
         'TRANSACTION_UPDATE': {'icon': 'mdi-cash', 'color': 'is-info', 'label': _('event_type_transaction_update')},
+        'TRANSACTION_IMPORT': {'icon': 'mdi-file-import', 'color': 'is-link', 'label': _('event_type_transaction_import')},
         'OBJECTIVE_UPDATE': {'icon': 'mdi-target', 'color': 'is-info', 'label': _('event_type_objective_update')},
         'USER_REGISTER': {'icon': 'mdi-account-plus', 'color': 'is-success', 'label': _('event_type_user_register')},
         'PASSWORD_CHANGE': {'icon': 'mdi-key-change', 'color': 'is-warning', 'label': _('event_type_password_change')},
@@ -98,14 +102,15 @@ def history_list(request):
         'page_obj': page_obj,
         'events': page_obj.object_list,
         'filtered_events': filtered_events,
-        'available_types': Event.objects.values_list('type', flat=True).distinct().order_by('type'),
-        'users_with_events': Account.objects.filter(events__isnull=False).distinct().order_by('email'),
+        'available_types': facets.available_types(),
+        'users_with_events': facets.users_with_events(),
         'event_type_mapping': event_type_mapping,
         'current_search': search_query,
         'current_type': event_type,
         'current_user': user_filter,
         'current_date_from': date_from,
         'current_date_to': date_to,
+        'search_archives': search_archives,
         'now': now(),
     }
 
@@ -117,8 +122,9 @@ def user_management(request):
     """
     Main view for user management
     """
-    # Get all users
-    users = Account.objects.all().order_by('-date_joined')
+    # Get all users, with their last activity read from the (user, date) index of the events
+    last_activity = Event.objects.filter(user=OuterRef('pk')).order_by('-date').values('date')[:1]
+    users = Account.objects.annotate(last_activity=Subquery(last_activity)).order_by('-date_joined', '-id')
 
     # filters
     search_query = request.GET.get('search', '')
@@ -148,32 +154,29 @@ def user_management(request):
             users = users.filter(is_active=False)
 
     # stats
-    total_users = Account.objects.count()
-    active_users = Account.objects.filter(is_active=True).count()
-    admin_users = Account.objects.filter(is_staff=True).count()
-    filtered_count = users.count()
-
-    # Add info to wallet for each users
-    users_with_stats = []
-    for user in users:
-        users_with_stats.append({
-            'user': user,
-            'last_activity': Event.objects.filter(user=user).order_by('-date').first().date if Event.objects.filter(user=user).exists() else None
-        })
+    stats = Account.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(is_active=True)),
+        admins=Count('id', filter=Q(is_staff=True)),
+    )
 
-    paginator = Paginator(users_with_stats, 20)
+    # Paginated in the database, only the users of the page are read
+    paginator = Paginator(users, 20)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    filtered_count = paginator.count
+
+    users_with_stats = [{'user': user, 'last_activity': user.last_activity} for user in page_obj.object_list]
 
     # Available roles
     available_roles = Account.objects.values_list('role', flat=True).distinct().exclude(role='')
 
     context = {
         'page_obj': page_obj,
-        'users_with_stats': page_obj.object_list,
-        'total_users': total_users,
-        'active_users': active_users,
-        'admin_users': admin_users,
+        'users_with_stats': users_with_stats,
+        'total_users': stats['total'],
+        'active_users': stats['active'],
+        'admin_users': stats['admins'],
         'filtered_count': filtered_count,
         'available_roles': available_roles,
 
@@ -193,8 +196,7 @@ def create_user(request):
         if form.is_valid():
             form.save()
             messages.success(request, _("user_created_successfully"))
-            Event.objects.create(
-                date=now(),
+            log_event(
                 content=_("new_user_created") + f": {form.cleaned_data['first_name']} {form.cleaned_data['last_name']}",
                 user=request.user,
                 type='ADMIN_ACTION'
@@ -222,8 +224,7 @@ def edit_user(request, user_id):
         if form.is_valid():
             form.save()
             messages.success(request, _("user_modified_successfully").format(user_name=user_to_edit.get_full_name()))
-            Event.objects.create(
-                date=now(),
+            log_event(
                 content=_("user_modified") + f": {user_to_edit.get_full_name()}",
                 user=request.user,
                 type='ADMIN_ACTION'
@@ -271,10 +272,12 @@ def delete_user(request, user_id):
     if request.method == 'POST':
         try:
             user_name = user_to_delete.get_full_name()
-            user_to_delete.delete()
+            # Their transactions in the wallets of other users are deleted by the cascade too
+            with db_transaction.atomic():
+                Transaction.unapply_many(Transaction.objects.filter(user=user_to_delete))
+                user_to_delete.delete()
             messages.success(request, _("user_deleted_successfully").format(user_name=user_name))
-            Event.objects.create(
-                date=now(),
+            log_event(
                 content=_("user_deleted") + f": {user_name}",
                 user=request.user,
                 type='ADMIN_ACTION'
@@ -303,12 +306,25 @@ def wallet_management(request):
     """
     View for wallet management
     """
-    # Get all wallets and linked infos
-    wallets = Wallet.objects.select_related('owner').prefetch_related('users', 'transactions').order_by('-id')
+    # Get all wallets, their stats are computed by subqueries on the wallet indexes
+    transactions = Transaction.objects.filter(wallet=OuterRef('pk'))
+    last_transaction = transactions.order_by('-date')
+    members = Wallet.users.through.objects.filter(wallet=OuterRef('pk'))
+    wallets = Wallet.objects.select_related('owner').annotate(
+        transaction_count=Coalesce(Subquery(
+            transactions.order_by().values('wallet').annotate(count=Count('id')).values('count')
+        ), 0),
+        last_transaction_date=Subquery(last_transaction.values('date')[:1]),
+        last_transaction_title=Subquery(last_transaction.values('title')[:1]),
+        user_count=Coalesce(Subquery(
+            members.order_by().values('wallet').annotate(count=Count('id')).values('count')
+        ), 0),
+    )
 
     # Filters
     search_query = request.GET.get('search', '')
     owner_filter = request.GET.get('owner', '')
+    sort = request.GET.get('sort', '')
 
     # apply filters
     if search_query:
@@ -322,45 +338,54 @@ def wallet_management(request):
     if owner_filter:
         wallets = wallets.filter(owner_id=owner_filter)
 
-    filtered_count = wallets.count()
+    orderings = {
+        'name': [Lower('name'), '-id'],
+        '-balance': ['-balance', '-id'],
+        '-transactions': ['-transaction_count', '-id'],
+        '-last_transaction': [F('last_transaction_date').desc(nulls_last=True), '-id'],
+    }
+    wallets = wallets.order_by(*orderings.get(sort, ['-id']))
+
+    # Paginated in the database, only the wallets of the page are read
+    paginator = Paginator(wallets, 15)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    filtered_count = paginator.count
 
     # Add detailed stats for wallets
     wallets_with_stats = []
-    for wallet in wallets:
-        transactions = wallet.transactions.all()
-        user_count = wallet.users.count()
-        last_transaction = transactions.order_by('-date').first()
-
+    for wallet in page_obj.object_list:
         # Compute progression on the objective
         progress = 0
         if wallet.objective > 0:
             progress = min((wallet.balance / wallet.objective) * 100, 100)
 
+        last_transaction = None
+        if wallet.last_transaction_date:
+            last_transaction = {'date': wallet.last_transaction_date, 'title': wallet.last_transaction_title}
+
         wallets_with_stats.append({
             'wallet': wallet,
-            'user_count': user_count,
-            'transaction_count': transactions.count(),
+            'user_count': wallet.user_count,
+            'transaction_count': wallet.transaction_count,
             'last_transaction': last_transaction,
             'progress': progress,
-            'is_shared': user_count > 1,
-            'is_active': transactions.exists(),
+            'is_shared': wallet.user_count > 1,
+            'is_active': wallet.transaction_count > 0,
         })
 
-    paginator = Paginator(wallets_with_stats, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    wallet_owners = Account.objects.filter(wallet__isnull=False).distinct().order_by('first_name', 'last_name')
+    wallet_owners = Account.objects.filter(id__in=Wallet.objects.values('owner_id')).order_by('first_name', 'last_name')
 
     context = {
         'page_obj': page_obj,
-        'wallets_with_stats': page_obj.object_list,
+        'wallets_with_stats': wallets_with_stats,
         'filtered_count': filtered_count,
         'wallet_owners': wallet_owners,
 
         # active filters
         'current_search': search_query,
         'current_owner': owner_filter,
+        'current_sort': sort if sort in orderings else '',
     }
 
     return render(request, 'adminpanel/wallet_management.html', context)
@@ -383,8 +408,7 @@ def delete_wallet(request, wallet_id):
                 wallet_name=wallet_name,
                 transaction_count=transaction_count
             ))
-            Event.objects.create(
-                date=now(),
+            log_event(
                 content=_("wallet_deleted") + f": {wallet_name}",
                 user=request.user,
                 type='ADMIN_ACTION'
@@ -392,8 +416,7 @@ def delete_wallet(request, wallet_id):
             return redirect('adminpanel:wallet_management')
         except Exception as e:
             messages.error(request, _("error_during_deletion").format(error=str(e)))
-            Event.objects.create(
-                date=now(),
+            log_event(
                 content=_("error_deleting_wallet").format(wallet_name=wallet.name, error=str(e)),
                 user=request.user,
                 type='ERROR'
@@ -415,14 +438,68 @@ def delete_wallet(request, wallet_id):
 
     return render(request, 'adminpanel/delete_wallet.html', context)
 
+
+class _Echo:
+    """
+    File-like object handing each CSV line back to the caller instead of buffering it
+    """
+    def write(self, value):
+        return value
+
+
+def _parse_export_date(date_str):
+    try:
+        return datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def _transaction_csv_labels():
+    """
+    The labels of the CSV export, translated in the view: the lines are generated after it has
+    returned, once the language of the request is no longer active
+    """
+    return {
+        'header': [_("date"), _("title"), _("category"), _("amount_euro"), _("type"), _("author")],
+        'income': _("income"),
+        'expense': _("expense"),
+        'no_category': _("no_category"),
+        'unknown': _("unknown"),
+    }
+
+
+def _transaction_csv_lines(rows, labels, chunk_size=2000):
+    """
+    Generate the CSV export line by line, reading the transactions by chunks
+    """
+    income, expense = labels['income'], labels['expense']
+    no_category, unknown = labels['no_category'], labels['unknown']
+
+    writer = csv.writer(_Echo())
+    yield writer.writerow(labels['header'])
+
+    for day, title, category, amount, is_income, first_name, last_name in rows.iterator(chunk_size=chunk_size):
+        yield writer.writerow([
+            timezone.localtime(day).strftime('%d/%m/%Y'),
+            title,
+            category if category is not None else no_category,
+            f"{amount:.2f}",
+            income if is_income else expense,
+            f"{first_name} {last_name}" if first_name is not None else unknown
+        ])
+
+
 @login_required
 def export_transactions_csv(request, wallet_id):
     wallet = get_object_or_404(Wallet, id=wallet_id)
 
-    if request.user not in wallet.users.all() and not request.user.is_staff:
+    if not request.user.is_staff and not is_wallet_member(request.user, wallet.id):
         messages.error(request, _("no_permission_export_transactions"))
-        Event.objects.create(
-            date=now(),
+        log_event(
             content=_("unauthorized_export_attempt").format(
                 wallet_name=wallet.name,
                 user_name=request.user.get_full_name()
@@ -432,34 +509,26 @@ def export_transactions_csv(request, wallet_id):
         )
         return redirect('adminpanel:wallet_management')
 
-    transactions = Transaction.objects.filter(wallet=wallet).order_by('date')
+    transactions = Transaction.objects.filter(wallet=wallet)
+
+    # Optional slice of the export, bounds are local days and both are included
+    date_from = _parse_export_date(request.GET.get('date_from', ''))
+    date_to = _parse_export_date(request.GET.get('date_to', ''))
+    # The first and last days representable are no bounds (their day boundaries overflow)
+    if date_from and date_from > date.min:
+        transactions = transactions.filter(date__gte=_start_of_day(date_from))
+    if date_to and date_to < date.max:
+        transactions = transactions.filter(date__lt=_start_of_day(date_to + timedelta(days=1)))
+
+    rows = transactions.order_by('date', 'id').values_list(
+        'date', 'title', 'category__name', 'amount', 'is_income', 'user__first_name', 'user__last_name'
+    )
 
-    response = HttpResponse(content_type='text/csv')
     filename = f"transactions_{wallet.name.replace(' ', '_')}.csv"
+    response = StreamingHttpResponse(_transaction_csv_lines(rows, _transaction_csv_labels()), content_type='text/csv')
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
 
-    writer = csv.writer(response)
-    writer.writerow([
-        _("date"),
-        _("title"),
-        _("category"),
-        _("amount_euro"),
-        _("type"),
-        _("author")
-    ])
-
-    for transaction in transactions:
-        writer.writerow([
-            transaction.date.strftime('%d/%m/%Y'),
-            transaction.title,
-            transaction.category.name if transaction.category else _("no_category"),
-            f"{transaction.amount:.2f}",
-            _("income") if transaction.is_income else _("expense"),
-            transaction.user.get_full_name() if transaction.user else _("unknown")
-        ])
-
-    Event.objects.create(
-        date=now(),
+    log_event(
         content=_("transactions_exported").format(
             wallet_name=wallet.name,
             user_name=request.user.get_full_name()
@@ -497,28 +566,36 @@ def category_management(request):
     total_categories = Category.objects.count()
     used_categories = Category.objects.filter(transaction__isnull=False).distinct().count()
     unused_categories = total_categories - used_categories
-    filtered_count = categories.count()
 
-    categories_with_stats = []
-    for category in categories:
-        recent_transactions = Transaction.objects.filter(category=category).order_by('-date')[:3]
-        last_used = recent_transactions.first().date if recent_transactions.exists() else None
+    paginator = Paginator(categories, 20)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    filtered_count = paginator.count
+
+    # The 3 most recent transactions of every category of the page, in a single windowed query
+    recent = {}
+    recent_transactions = Transaction.objects.filter(
+        category_id__in=[category.id for category in page_obj.object_list]
+    ).annotate(
+        row_number=Window(RowNumber(), partition_by=F('category_id'), order_by=[F('date').desc(), F('id').desc()])
+    ).filter(row_number__lte=3).only('category_id', 'date', 'title', 'amount', 'is_income').order_by('category_id', 'row_number')
+    for trx in recent_transactions:
+        recent.setdefault(trx.category_id, []).append(trx)
 
+    categories_with_stats = []
+    for category in page_obj.object_list:
+        transactions = recent.get(category.id, [])
         categories_with_stats.append({
             'category': category,
             'transaction_count': category.transaction_count,
             'used_by_wallets': category.used_by_wallets,
-            'last_used': last_used,
-            'recent_transactions': recent_transactions,
+            'last_used': transactions[0].date if transactions else None,
+            'recent_transactions': transactions,
         })
 
-    paginator = Paginator(categories_with_stats, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
     context = {
         'page_obj': page_obj,
-        'categories_with_stats': page_obj.object_list,
+        'categories_with_stats': categories_with_stats,
         'total_categories': total_categories,
         'used_categories': used_categories,
         'unused_categories': unused_categories,
@@ -547,8 +624,7 @@ def create_category(request):
             else:
                 category = form.save()
                 messages.success(request, _("category_created_successfully").format(category_name=category.name))
-                Event.objects.create(
-                    date=now(),
+                log_event(
                     content=_("new_category_created") + f": {category.name}",
                     user=request.user,
                     type='ADMIN_ACTION'
@@ -585,12 +661,13 @@ def edit_category(request, category_id):
             else:
                 old_name = category.name
                 category = form.save()
+                # Category names are part of the cached charts of every wallet using it
+                Wallet.objects.filter(daily_rollups__category=category).update(data_version=F('data_version') + 1)
                 messages.success(request, _("category_renamed_successfully").format(
                     old_name=old_name,
                     new_name=category.name
                 ))
-                Event.objects.create(
-                    date=now(),
+                log_event(
                     content=_("category_modified") + f": {old_name} → {category.name}",
                     user=request.user,
                     type='ADMIN_ACTION'
@@ -622,15 +699,19 @@ def delete_category(request, category_id):
         if action == 'delete':
             try:
                 category_name = category.name
-                transaction_count = Transaction.objects.filter(category=category).count()
-                category.delete()
+                category_transactions = Transaction.objects.filter(category=category)
+                transaction_count = category_transactions.count()
+
+                # The cascade bypasses Transaction.delete, so take the deleted amounts out of the balances here
+                with db_transaction.atomic():
+                    Transaction.unapply_many(category_transactions)
+                    category.delete()
 
                 messages.success(request, _("category_and_transactions_deleted_successfully").format(
                     category_name=category_name,
                     transaction_count=transaction_count
                 ))
-                Event.objects.create(
-                    date=now(),
+                log_event(
                     content=_("category_deleted") + f": {category_name}",
                     user=request.user,
                     type='ADMIN_ACTION'
@@ -0,0 +1,84 @@
+import logging
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection as default_connection, connections
+
+logger = logging.getLogger(__name__)
+
+# Messages of the errors raised when the database stays locked longer than the busy timeout (SQLite)
+# or when concurrent transactions conflict (PostgreSQL)
+LOCK_ERRORS = (
+    'database is locked', 'database table is locked', 'database is busy',
+    'deadlock detected', 'could not obtain lock', 'could not serialize access',
+)
+
+
+def configure_connection(sender, connection, **kwargs):
+    """
+    Apply SQLITE_PRAGMAS to every new SQLite connection (connection_created receiver)
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+def close_connections():
+    """
+    Close every connection and connection pool before forking: the child processes must open their own
+    """
+    connections.close_all()
+    for connection in connections.all(initialized_only=True):
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
+
+
+def insert_rows(model, fields, rows, using='default'):
+    """
+    Insert rows of values already adapted to the database (connection.ops.adapt_*) with a single
+    executemany. bulk_create prepares every value through its field, which is most of the time
+    spent on large inserts. Run it in a transaction: SQLite commits every row otherwise
+    """
+    connection = connections[using]
+    opts = model._meta
+    columns = ', '.join(connection.ops.quote_name(opts.get_field(name).column) for name in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {connection.ops.quote_name(opts.db_table)} ({columns}) VALUES ({placeholders})', rows
+        )
+
+
+def is_lock_error(error):
+    return isinstance(error, OperationalError) and any(message in str(error).lower() for message in LOCK_ERRORS)
+
+
+def retry_on_lock(func=None, retries=None, delay=None):
+    """
+    Decorator calling func again, with an exponential backoff and jitter, while the database is locked.
+    Nothing is retried inside an atomic block: the whole transaction has to be run again
+    """
+    retries = settings.DB_LOCK_RETRIES if retries is None else retries
+    delay = settings.DB_LOCK_RETRY_DELAY if delay is None else delay
+
+    def decorator(func):
+        @wraps(func)
+        def _wrapped(*args, **kwargs):
+            for attempt in range(retries + 1):
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as e:
+                    if not is_lock_error(e) or attempt == retries or default_connection.in_atomic_block:
+                        raise
+                    wait = delay * 2 ** attempt * random.uniform(0.5, 1.5)
+                    logger.info("Database locked in %s, retrying in %.2fs", func.__qualname__, wait)
+                    time.sleep(wait)
+
+        return _wrapped
+
+    return decorator(func) if func else decorator
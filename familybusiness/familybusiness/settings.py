@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os.path
 from pathlib import Path
 
-from apscheduler.executors.pool import ThreadPoolExecutor
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,7 +42,6 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'django_apscheduler',
 
     'home',
     'account',
@@ -74,6 +73,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'wallet.context_processors.fragment_cache',
             ],
         },
     },
@@ -85,15 +85,84 @@ WSGI_APPLICATION = 'familybusiness.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-        'OPTIONS': {
-            'timeout': 20,
+# SQLite by default, DB_ENGINE=postgresql with the DB_* variables below for PostgreSQL
+# PostgreSQL needs psycopg, an optional dependency left out of requirements.txt: pip install "psycopg[binary,pool]"
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'familybusiness'),
+            'USER': os.environ.get('DB_USER', 'familybusiness'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('DB_POOL_MAX_SIZE'):
+        # psycopg pool shared by the threads of a process, it replaces persistent connections
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ['DB_POOL_MAX_SIZE']),
+        }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'timeout': 20,
+                # Writers take the lock when their transaction begins, so they wait for it (up to the
+                # timeout) instead of failing when a read transaction has to be upgraded
+                'transaction_mode': 'IMMEDIATE',
+            }
         }
     }
+else:
+    raise ImproperlyConfigured(f"Unknown DB_ENGINE {DB_ENGINE!r}, use sqlite or postgresql")
+
+# Connections are kept open between requests (except with a pool), and checked before being reused
+DATABASES['default']['CONN_MAX_AGE'] = 0 if 'pool' in DATABASES['default']['OPTIONS'] \
+    else int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Applied to every new SQLite connection, see familybusiness.db
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # readers and the writer no longer block each other
+    'synchronous': 'NORMAL',  # durable with WAL, only syncs at checkpoints
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # in KiB when negative
+    'temp_store': 'MEMORY',
+}
+
+# Lock errors still raised after the timeout are retried with an exponential backoff (familybusiness.db.retry_on_lock)
+DB_LOCK_RETRIES = 5
+DB_LOCK_RETRY_DELAY = 0.05
+
+# Cache: local memory by default (per process), CACHE_BACKEND=file or redis to share it between processes,
+# CACHE_LOCATION is the directory or the server URL
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'familybusiness'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', BASE_DIR / 'cache'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
 }
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(f"Unknown CACHE_BACKEND {CACHE_BACKEND!r}, use {', '.join(CACHE_BACKENDS)}")
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.environ.get('CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'KEY_PREFIX': 'familybusiness',
+    }
+}
+
+# Seconds the fragments of the wallet pages stay cached. They are keyed on the wallet's data version,
+# so changes to its transactions, members, objective and to the names of its members and categories show at once
+WALLET_FRAGMENT_CACHE_SECONDS = 600
 
 AUTH_USER_MODEL = 'account.Account'
 
@@ -129,14 +198,56 @@ LOGGING = {
     }
 }
 
-SCHEDULER_EXECUTORS = {
-    'default': ThreadPoolExecutor(20),
-}
-
-SCHEDULER_JOB_DEFAULTS = {
-    'coalesce': False,
-    'max_instances': 5,
+# Generated PDF reports, rendered by `manage.py run_report_workers`
+REPORTS_ROOT = BASE_DIR / 'reports'
+REPORT_WORKER_PROCESSES = 2
+# Size above which the least recently downloaded reports are deleted
+REPORT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# Seconds after which a running report is considered abandoned by its worker (crashed or killed):
+# it is queued again, and failed once it has been claimed REPORT_JOB_MAX_ATTEMPTS times
+REPORT_JOB_TIMEOUT = 600
+REPORT_JOB_MAX_ATTEMPTS = 3
+
+# Seconds the wallets a user is a member of stay cached, dropped earlier when the members change.
+# Only used with a cache shared by every process (CACHE_BACKEND=file or redis), so the invalidation
+# reaches all of them: with the local memory cache, memberships are checked on every request
+WALLET_MEMBERSHIP_CACHE_SECONDS = 300
+
+# Audit events are buffered and written in bulk every AUDIT_FLUSH_INTERVAL seconds,
+# or as soon as AUDIT_BUFFER_SIZE are waiting. Events that cannot be written are spooled
+# to AUDIT_SPOOL_DIR and replayed by the next process. AUDIT_SYNC writes them immediately (tests)
+AUDIT_SYNC = False
+AUDIT_FLUSH_INTERVAL = 1.0
+AUDIT_BUFFER_SIZE = 100
+AUDIT_SPOOL_DIR = BASE_DIR / 'audit_spool'
+
+# Events older than their retention (in days, per type) are moved by `manage.py archive_events`
+# to gzip JSONL files per month in EVENT_ARCHIVE_DIR, which the history can still search
+EVENT_RETENTION_DAYS = {
+    'LOGIN': 90,
+    'LOGOUT': 90,
+    'ERROR': 180,
 }
+EVENT_RETENTION_DEFAULT_DAYS = 730
+EVENT_ARCHIVE_DIR = BASE_DIR / 'event_archive'
+EVENT_ARCHIVE_SEARCH_LIMIT = 1000
+
+# Seconds a history count with a search or a date range stays cached (also dropped on new events)
+EVENT_COUNT_CACHE_SECONDS = 300
+
+# Future transactions are executed by `manage.py run_scheduler`, a single leader holding this lease
+SCHEDULER_LEASE_SECONDS = 60
+# Saving a future transaction wakes the scheduler up with a datagram sent to each host of
+# SCHEDULER_NOTIFY_HOSTS, the servers running a copy (only the leader listens, on SCHEDULER_BIND_HOST).
+# It also rereads every date after SCHEDULER_MAX_SLEEP seconds, in case a datagram was lost
+SCHEDULER_NOTIFY_PORT = int(os.environ.get('SCHEDULER_NOTIFY_PORT', 8765))
+SCHEDULER_NOTIFY_ADDRESSES = [
+    (host.strip(), SCHEDULER_NOTIFY_PORT)
+    for host in os.environ.get('SCHEDULER_NOTIFY_HOSTS', '127.0.0.1').split(',')
+    if host.strip()
+]
+SCHEDULER_BIND_ADDRESS = (os.environ.get('SCHEDULER_BIND_HOST', '127.0.0.1'), SCHEDULER_NOTIFY_PORT)
+SCHEDULER_MAX_SLEEP = 300
 
 
 # Internationalization
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Wallet, Transaction, Category, WalletInvitation, FutureTransaction
+from .models import Wallet, Transaction, Category, WalletInvitation, FutureTransaction, WalletDailyRollup
 
 
 @admin.register(Wallet)
@@ -20,6 +20,13 @@ class TransactionAdmin(admin.ModelAdmin):
 class FutureTransactionAdmin(admin.ModelAdmin):
     list_display = ('title', 'wallet', 'execution_date', 'frequency', 'active')
 
+
+@admin.register(WalletDailyRollup)
+class WalletDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('wallet', 'day', 'category', 'is_income', 'total', 'count')
+    list_filter = ('is_income', 'wallet', 'category')
+    date_hierarchy = 'day'
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name',)
@@ -1,5 +1,3 @@
-import sys
-
 from django.apps import AppConfig
 
 
@@ -8,6 +6,8 @@ class WalletConfig(AppConfig):
     name = 'wallet'
 
     def ready(self):
-        if 'runserver' in sys.argv or 'shell_plus' in sys.argv:
-            from . import scheduler
-            scheduler.start()
\ No newline at end of file
+        from django.db.backends.signals import connection_created
+        from familybusiness.db import configure_connection
+        from . import signals  # noqa: F401
+
+        connection_created.connect(configure_connection, dispatch_uid='configure_connection')
@@ -0,0 +1,8 @@
+from django.conf import settings
+
+
+def fragment_cache(request):
+    """
+    Lifetime of the {% cache %} fragments of the wallet pages
+    """
+    return {'FRAGMENT_CACHE_SECONDS': settings.WALLET_FRAGMENT_CACHE_SECONDS}
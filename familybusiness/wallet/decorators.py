@@ -0,0 +1,92 @@
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponseForbidden
+from django.shortcuts import get_object_or_404, redirect
+from django.utils.translation import gettext as _
+
+from adminpanel.audit import log_event
+from .models import Wallet
+
+
+# Backends private to each process: a membership dropped in one worker would stay cached in the others
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def membership_cache_key(user_id):
+    return f'wallet_memberships:{user_id}'
+
+
+def membership_cache_enabled():
+    return (
+        settings.WALLET_MEMBERSHIP_CACHE_SECONDS > 0
+        and settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+    )
+
+
+def is_wallet_member(user, wallet_id):
+    """
+    Check that the user is a member of the wallet. With a cache shared by every process,
+    confirmed memberships are cached per user and dropped when the members of one of its wallets
+    change (see signals). Otherwise the membership is checked on every call
+    """
+    if not membership_cache_enabled():
+        return Wallet.users.through.objects.filter(wallet_id=wallet_id, account_id=user.pk).exists()
+
+    key = membership_cache_key(user.pk)
+    wallet_ids = cache.get(key, set())
+    if wallet_id in wallet_ids:
+        return True
+
+    if not Wallet.users.through.objects.filter(wallet_id=wallet_id, account_id=user.pk).exists():
+        return False
+    cache.set(key, wallet_ids | {wallet_id}, settings.WALLET_MEMBERSHIP_CACHE_SECONDS)
+    return True
+
+
+def _wallet_required(check, view_func, attempt, message, forbidden):
+    @wraps(view_func)
+    def _wrapped_view(request, wallet_id, *args, **kwargs):
+        wallet = get_object_or_404(Wallet.objects.select_related('owner'), id=wallet_id)
+
+        if not check(request.user, wallet):
+            if forbidden:
+                return HttpResponseForbidden()
+            messages.error(request, _(message))
+            if attempt:
+                log_event(
+                    content=_(attempt) + f": {wallet.name}",
+                    user=request.user,
+                    type='ERROR'
+                )
+            return redirect('wallet:wallet_list')
+
+        return view_func(request, wallet, *args, **kwargs)
+
+    return _wrapped_view
+
+
+def wallet_member_required(view_func=None, attempt=None, message='no_access_to_wallet', forbidden=False):
+    """
+    Decorator resolving the wallet_id of the URL and passing the wallet to the view if the user is a member.
+    Otherwise the user is redirected with an error message (and the attempt is logged), or gets a 403 if forbidden
+    """
+    def decorator(func):
+        return _wallet_required(lambda user, wallet: is_wallet_member(user, wallet.id), func, attempt, message, forbidden)
+
+    return decorator(view_func) if view_func else decorator
+
+
+def wallet_owner_required(view_func=None, attempt=None, message='no_access_to_wallet', forbidden=False):
+    """
+    Same as wallet_member_required, for the owner of the wallet only
+    """
+    def decorator(func):
+        return _wallet_required(lambda user, wallet: wallet.owner_id == user.pk, func, attempt, message, forbidden)
+
+    return decorator(view_func) if view_func else decorator
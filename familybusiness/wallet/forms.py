@@ -107,6 +107,27 @@ class FutureTransactionForm(forms.ModelForm):
         self.fields['frequency'].choices = list(FutureTransaction.Frequency.choices)
 
 
+class TransactionImportForm(forms.Form):
+    """Form to import a CSV or OFX bank statement"""
+    MAX_FILE_SIZE = 20 * 1024 * 1024
+
+    file = forms.FileField(
+        label=_('statement_file'),
+        widget=forms.ClearableFileInput(attrs={'class': 'file-input', 'accept': '.csv,.ofx,.qfx'})
+    )
+    category = forms.ModelChoiceField(
+        queryset=Category.objects.all(),
+        label=_('default_category'),
+        widget=forms.Select(attrs={'class': 'select is-fullwidth'})
+    )
+    dry_run = forms.BooleanField(required=False, initial=True, label=_('preview_only'))
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if file.size > self.MAX_FILE_SIZE:
+            raise forms.ValidationError(_('statement_file_too_large'))
+        return file
+
 
 class InvitationForm(forms.Form):
     """Form to generate an invitation link"""
@@ -0,0 +1,226 @@
+import csv
+import io
+import re
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from .models import Transaction, Category
+
+# A parsed statement line, amount is signed (negative for expenses)
+StatementRow = namedtuple('StatementRow', ['line', 'date', 'title', 'amount', 'category'])
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M')
+MAX_AMOUNT = Decimal('99999999.99')
+PREVIEW_ROWS = 20
+
+OFX_TRANSACTION = re.compile(r'<STMTTRN>(.*?)(?:</STMTTRN>|(?=<STMTTRN>)|(?=</BANKTRANLIST>))', re.S | re.I)
+OFX_TAG = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+class StatementError(ValueError):
+    pass
+
+
+def _csv_columns():
+    """
+    Accepted CSV headers for each field, including the headers of our own CSV export
+    """
+    return {
+        'date': {'date', 'date operation', 'date opération', 'date comptable', 'booking date', _("date").lower()},
+        'title': {'title', 'titre', 'libellé', 'libelle', 'description', 'communication', 'name', 'payee',
+                  _("title").lower()},
+        'amount': {'amount', 'montant', 'amount_euro', _("amount_euro").lower()},
+        'category': {'category', 'catégorie', 'categorie', _("category").lower()},
+        'type': {'type', _("type").lower()},
+    }
+
+
+def parse_amount(value):
+    value = value.replace('\xa0', '').replace(' ', '').replace('€', '').strip()
+    # "1.234,56" and "1,234.56": the last separator is the decimal one
+    if ',' in value and value.rfind(',') > value.rfind('.'):
+        value = value.replace('.', '').replace(',', '.')
+    else:
+        value = value.replace(',', '')
+    try:
+        amount = Decimal(value).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise StatementError(_("invalid_amount").format(value=value))
+    if abs(amount) > MAX_AMOUNT:
+        raise StatementError(_("invalid_amount").format(value=value))
+    return amount
+
+
+def parse_date(value):
+    value = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    raise StatementError(_("invalid_date").format(value=value))
+
+
+def _decode(data):
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return data.decode('latin-1')
+
+
+def parse_csv(text):
+    """
+    Parse a CSV bank statement, return the rows and the errors (line, message) of the rejected lines
+    """
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(io.StringIO(text), dialect)
+
+    header = [column.strip().lower() for column in next(reader, [])]
+    positions = {}
+    for field, names in _csv_columns().items():
+        for position, column in enumerate(header):
+            if column in names:
+                positions[field] = position
+                break
+
+    if not {'date', 'amount'} <= positions.keys():
+        raise StatementError(_("import_missing_columns"))
+
+    income_labels = {'income', _("income").lower()}
+    rows, errors = [], []
+    for line, values in enumerate(reader, start=2):
+        if not any(values):
+            continue
+        try:
+            values = {field: values[position].strip() for field, position in positions.items()}
+        except IndexError:
+            errors.append((line, _("import_incomplete_line")))
+            continue
+
+        try:
+            date = parse_date(values['date'])
+            amount = parse_amount(values['amount'])
+        except StatementError as e:
+            errors.append((line, str(e)))
+            continue
+
+        # Our own export writes positive amounts next to a type column
+        if 'type' in values and amount > 0 and values['type'].lower() not in income_labels:
+            amount = -amount
+
+        rows.append(StatementRow(line, date, values.get('title', ''), amount, values.get('category', '')))
+    return rows, errors
+
+
+def parse_ofx(text):
+    """
+    Parse the transactions of an OFX statement (SGML or XML)
+    """
+    rows, errors = [], []
+    for line, block in enumerate(OFX_TRANSACTION.findall(text), start=1):
+        tags = {tag.upper(): value.strip() for tag, value in OFX_TAG.findall(block)}
+        try:
+            date = datetime.strptime(tags.get('DTPOSTED', '')[:8], '%Y%m%d')
+        except ValueError:
+            errors.append((line, _("invalid_date").format(value=tags.get('DTPOSTED', ''))))
+            continue
+        try:
+            amount = parse_amount(tags.get('TRNAMT', ''))
+        except StatementError as e:
+            errors.append((line, str(e)))
+            continue
+        title = tags.get('NAME') or tags.get('MEMO', '')
+        rows.append(StatementRow(line, date, title, amount, ''))
+
+    if not rows and not errors:
+        raise StatementError(_("import_no_transactions"))
+    return rows, errors
+
+
+def read_statement(data, filename=''):
+    """
+    Parse an uploaded statement, OFX or CSV depending on its name and content
+    """
+    text = _decode(data)
+    if filename.lower().endswith(('.ofx', '.qfx')) or text.lstrip()[:100].upper().startswith(('OFXHEADER', '<?XML', '<OFX')):
+        return parse_ofx(text)
+    return parse_csv(text)
+
+
+def _category_ids(rows, default_category):
+    """
+    Map the category names of the statement to existing categories, unknown names go to the default one
+    """
+    categories = {name.casefold(): category_id for category_id, name in Category.objects.values_list('id', 'name')}
+    mapping, unknown = {}, set()
+    for name in {row.category for row in rows}:
+        category_id = categories.get(name.casefold()) if name else None
+        if category_id is None:
+            if name:
+                unknown.add(name)
+            category_id = default_category.id
+        mapping[name] = category_id
+    return mapping, sorted(unknown)
+
+
+def _local_datetime(value, tz=None):
+    return value if timezone.is_aware(value) else timezone.make_aware(value, tz)
+
+
+def preview_statement(rows, default_category):
+    """
+    What an import would do, without writing anything
+    """
+    mapping, unknown = _category_ids(rows, default_category)
+    names = dict(Category.objects.filter(id__in=set(mapping.values())).values_list('id', 'name'))
+
+    income = sum((row.amount for row in rows if row.amount > 0), Decimal(0))
+    expenses = -sum((row.amount for row in rows if row.amount < 0), Decimal(0))
+    return {
+        'count': len(rows),
+        'income': income,
+        'expenses': expenses,
+        'net': income - expenses,
+        'unknown_categories': unknown,
+        'rows': [
+            {
+                'date': _local_datetime(row.date),
+                'title': row.title[:100],
+                'amount': abs(row.amount),
+                'is_income': row.amount > 0,
+                'category': names[mapping[row.category]],
+            }
+            for row in rows[:PREVIEW_ROWS]
+        ],
+    }
+
+
+def import_statement(wallet, user, rows, default_category, batch_size=1000):
+    """
+    Store the statement rows in a wallet with batched inserts, the balance and the daily rollups
+    are updated once for the whole statement (see Transaction.bulk_add)
+    """
+    mapping, _unknown = _category_ids(rows, default_category)
+    untitled = _("imported_transaction")
+    tz = timezone.get_current_timezone()
+
+    transactions = [
+        Transaction(
+            title=(row.title or untitled)[:100],
+            category_id=mapping[row.category],
+            user=user,
+            amount=abs(row.amount),
+            date=_local_datetime(row.date, tz),
+            wallet=wallet,
+            is_income=row.amount > 0,
+        )
+        for row in rows
+    ]
+    return Transaction.bulk_add(transactions, batch_size=batch_size)
@@ -0,0 +1,150 @@
+import multiprocessing
+import sqlite3
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, OperationalError
+from django.utils import timezone
+
+from familybusiness.db import close_connections
+
+# SQLite's own defaults, as before the production profile
+DEFAULT_PROFILE = {
+    'pragmas': {'journal_mode': 'DELETE', 'synchronous': 'FULL'},
+    'transaction_mode': None,
+}
+
+
+def _worker(role, database, profile, wallet_id, user_id, category_id, seconds, results):
+    # Each process needs its own Django setup and database connection
+    django.setup()
+    connections.close_all()
+
+    if profile is not None:
+        options = connections['default'].settings_dict['OPTIONS']
+        connections['default'].settings_dict['NAME'] = database
+        settings.SQLITE_PRAGMAS = profile['pragmas']
+        if profile['transaction_mode']:
+            options['transaction_mode'] = profile['transaction_mode']
+        else:
+            options.pop('transaction_mode', None)
+
+    from familybusiness.db import is_lock_error
+    from wallet import rollups
+    from wallet.models import Wallet, Transaction
+
+    wallet = Wallet.objects.get(id=wallet_id)
+    start_of_month = timezone.localdate().replace(day=1)
+    operations, errors, latencies = 0, 0, []
+
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            if role == 'write':
+                Transaction(
+                    title="Benchmark", amount=Decimal('12.34'), date=timezone.now(), is_income=operations % 2 == 0,
+                    wallet_id=wallet_id, user_id=user_id, category_id=category_id,
+                ).save()
+            else:
+                list(Transaction.objects.filter(wallet_id=wallet_id).select_related('category').order_by('-date', '-id')[:50])
+                rollups.period_totals(wallet, start_of_month)
+        except OperationalError as e:
+            if not is_lock_error(e):
+                raise
+            errors += 1
+            continue
+        operations += 1
+        latencies.append(time.monotonic() - started)
+
+    connections.close_all()
+    results.put((role, operations, errors, latencies))
+
+
+class Command(BaseCommand):
+    help = "Measures the concurrent read and write throughput of the database, per SQLite profile"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help="Number of reading processes")
+        parser.add_argument('--writers', type=int, default=2, help="Number of writing processes")
+        parser.add_argument('--seconds', type=float, default=10, help="Duration of each run")
+        parser.add_argument('--profile', choices=['default', 'tuned', 'all'], default='all',
+                            help="SQLite profile to measure, SQLite's defaults or SQLITE_PRAGMAS")
+
+    def handle(self, *args, **options):
+        from account.models import Account
+        from wallet.models import Wallet, Category
+
+        user = Account.objects.order_by('id').first()
+        if user is None:
+            raise CommandError("Create an account first")
+        category = Category.objects.order_by('id').first() or Category.objects.create(name="Benchmark")
+
+        if connection.vendor == 'sqlite':
+            tuned = {'pragmas': settings.SQLITE_PRAGMAS, 'transaction_mode': 'IMMEDIATE'}
+            profiles = {'default': DEFAULT_PROFILE, 'tuned': tuned}
+            if options['profile'] != 'all':
+                profiles = {options['profile']: profiles[options['profile']]}
+        else:
+            profiles = {connection.vendor: None}
+
+        # Benchmark transactions go to a scratch wallet, itself in a copy of the database on SQLite
+        wallet = Wallet.objects.create(name="Benchmark", owner=user)
+        try:
+            for name, profile in profiles.items():
+                with tempfile.TemporaryDirectory() as directory:
+                    database = None
+                    if profile is not None:
+                        database = str(Path(directory) / 'bench.sqlite3')
+                        connection.ensure_connection()
+                        with sqlite3.connect(database) as copy:
+                            connection.connection.backup(copy)
+                    self.report(name, self.run(database, profile, wallet.id, user.id, category.id, options))
+        finally:
+            wallet.delete()
+
+    def run(self, database, profile, wallet_id, user_id, category_id, options):
+        # Connections must not be shared with the child processes
+        close_connections()
+
+        results = multiprocessing.Queue()
+        roles = ['read'] * options['readers'] + ['write'] * options['writers']
+        workers = [
+            multiprocessing.Process(target=_worker, args=(
+                role, database, profile, wallet_id, user_id, category_id, options['seconds'], results
+            ))
+            for role in roles
+        ]
+        for worker in workers:
+            worker.start()
+        # A crashed worker never reports, do not wait for it forever
+        collected = [results.get(timeout=options['seconds'] + 60) for _ in workers]
+        for worker in workers:
+            worker.join()
+
+        totals = {}
+        for role, operations, errors, latencies in collected:
+            total = totals.setdefault(role, {'operations': 0, 'errors': 0, 'latencies': []})
+            total['operations'] += operations
+            total['errors'] += errors
+            total['latencies'] += latencies
+        for total in totals.values():
+            total['per_second'] = total['operations'] / options['seconds']
+        return totals
+
+    def report(self, name, totals):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Profile {name}"))
+        for role in ('read', 'write'):
+            if role not in totals:
+                continue
+            total = totals[role]
+            latencies = sorted(total['latencies'])
+            p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+            self.stdout.write(
+                f"  {role:<5} {total['per_second']:9.1f} op/s  p95 {p95:7.1f} ms  lock errors {total['errors']}"
+            )
@@ -0,0 +1,288 @@
+import json
+import multiprocessing
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Exists, OuterRef
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone, translation
+
+from familybusiness.db import close_connections
+
+RESULTS_DIR = settings.BASE_DIR / 'benchmarks'
+
+# Scenario: (share of the requests, needs a staff account)
+SCENARIOS = {
+    'wallet_list': (20, False),
+    'wallet_detail': (20, False),
+    'transaction_list': (20, False),
+    'add_transaction': (10, False),
+    'history_list': (8, True),
+    'wallet_management': (6, True),
+    'export_csv': (4, False),
+    'report': (2, False),
+}
+# A form sent back with errors is a 200, successful posts and queued reports redirect
+EXPECTED_STATUS = {'add_transaction': 302, 'report': 302}
+
+
+def _percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0
+
+
+def _request(name, client, staff_client, wallet_id, category_ids, rng):
+    """
+    Send the request of a scenario, return the response with its content read
+    """
+    from wallet import reports
+
+    if name == 'wallet_list':
+        return client.get(reverse('wallet:wallet_list'))
+    if name == 'wallet_detail':
+        return client.get(reverse('wallet:wallet_detail', args=[wallet_id]))
+    if name == 'transaction_list':
+        filters = rng.choice([{}, {}, {'type': 'expense'}, {'category': rng.choice(category_ids)}])
+        return client.get(reverse('wallet:transaction_list', args=[wallet_id]), filters)
+    if name == 'add_transaction':
+        data = {
+            'title': "Benchmark",
+            'category': rng.choice(category_ids),
+            'amount': f'{rng.uniform(1, 200):.2f}',
+            'date': timezone.localtime().strftime('%Y-%m-%dT%H:%M'),
+            'description': '',
+        }
+        if rng.random() < 0.1:
+            data['is_income'] = 'on'
+        return client.post(reverse('wallet:add_transaction', args=[wallet_id]), data)
+    if name == 'history_list':
+        filters = rng.choice([{}, {}, {'page': rng.randint(2, 20)}, {'type': 'LOGIN'}, {'search': 'transaction'}])
+        return staff_client.get(reverse('adminpanel:history_list'), filters)
+    if name == 'wallet_management':
+        return staff_client.get(reverse('adminpanel:wallet_management'), {'sort': rng.choice(['name', '-balance'])})
+    if name == 'export_csv':
+        # Exports usually cover the last year, the stream is read as a browser would
+        date_from = (timezone.localdate() - timedelta(days=365)).isoformat()
+        response = client.get(reverse('wallet:export_transactions_csv', args=[wallet_id]), {'date_from': date_from})
+        b''.join(response.streaming_content)
+        return response
+    if name == 'report':
+        # Queued reports are rendered here, as a report worker would, unless already cached
+        response = client.get(reverse('wallet:generate_monthly_report', args=[wallet_id]))
+        job = reports.claim_next_job()
+        if job is not None:
+            reports.run_job(job)
+        return response
+    raise ValueError(name)
+
+
+def _worker(index, database, reports_root, account_id, wallet_id, staff_id, scenarios, options, results):
+    # Each process needs its own Django setup and database connection
+    django.setup()
+    connections.close_all()
+    if database is not None:
+        connections['default'].settings_dict['NAME'] = database
+    settings.REPORTS_ROOT = Path(reports_root)
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+    translation.activate(settings.LANGUAGE_CODE)
+
+    from django.test import Client
+    from account.models import Account
+    from adminpanel import audit
+    from wallet.models import Category
+
+    rng = random.Random(options['seed'] + index)
+    category_ids = list(Category.objects.values_list('id', flat=True))
+    client = Client(raise_request_exception=False)
+    client.force_login(Account.objects.get(id=account_id))
+    staff_client = None
+    if staff_id is not None:
+        staff_client = Client(raise_request_exception=False)
+        staff_client.force_login(Account.objects.get(id=staff_id))
+
+    names = list(scenarios)
+    weights = [SCENARIOS[name][0] for name in names]
+
+    # First requests load the templates and translations, they are not measured
+    for name in names:
+        _request(name, client, staff_client, wallet_id, category_ids, rng)
+
+    samples = []
+    deadline = time.monotonic() + options['seconds']
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights=weights)[0]
+        started = time.monotonic()
+        with CaptureQueriesContext(connection) as queries:
+            try:
+                response = _request(name, client, staff_client, wallet_id, category_ids, rng)
+                ok = response.status_code == EXPECTED_STATUS.get(name, 200)
+            except Exception:
+                ok = False
+        samples.append((name, time.monotonic() - started, len(queries), ok))
+        if options['think']:
+            time.sleep(rng.expovariate(1 / options['think']))
+
+    audit.flush()
+    connections.close_all()
+    results.put(samples)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the latency, throughput and queries of the main views under concurrent simulated users. "
+        "Requests go through the Django test client inside each process, without HTTP server: only the view time "
+        "(middlewares, queries, rendering) is measured, not the network, the WSGI server nor the static files."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=4, help="Number of concurrent simulated users (processes)")
+        parser.add_argument('--seconds', type=float, default=30, help="Duration of the run")
+        parser.add_argument('--think', type=float, default=0, help="Mean pause of a user between two requests, in seconds")
+        parser.add_argument('--views', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS),
+                            help="Scenarios to run, all by default")
+        parser.add_argument('--seed', type=int, default=1, help="Random seed of the users and requests")
+        parser.add_argument('--in-place', action='store_true',
+                            help="With SQLite, run on the database itself instead of a copy (writes are kept)")
+        parser.add_argument('--output', help="JSON file of the results, in benchmarks/ by default")
+        parser.add_argument('--compare', help="JSON results of a previous run to compare with")
+
+    def handle(self, *args, **options):
+        from account.models import Account
+        from adminpanel.models import Event
+        from wallet.models import Transaction, Wallet
+
+        # Simulated users are members of wallets holding transactions, preferably different ones
+        memberships = list(
+            Wallet.users.through.objects
+            .filter(Exists(Transaction.objects.filter(wallet_id=OuterRef('wallet_id'))))
+            .order_by('id')
+            .values_list('account_id', 'wallet_id')[:10_000]
+        )
+        if not memberships:
+            raise CommandError("No wallet with transactions, seed the database first (seed_data)")
+        rng = random.Random(options['seed'])
+        if len(memberships) >= options['users']:
+            users = rng.sample(memberships, options['users'])
+        else:
+            users = rng.choices(memberships, k=options['users'])
+
+        scenarios = options['views']
+        staff = Account.objects.filter(is_staff=True, is_active=True).order_by('id').first()
+        if staff is None:
+            skipped = [name for name in scenarios if SCENARIOS[name][1]]
+            scenarios = [name for name in scenarios if not SCENARIOS[name][1]]
+            if skipped:
+                self.stdout.write(self.style.WARNING(f"No staff account, skipping {', '.join(skipped)}"))
+        if not scenarios:
+            raise CommandError("No scenario to run")
+
+        environment = {
+            'vendor': connection.vendor,
+            'debug': settings.DEBUG,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'wallets': Wallet.objects.count(),
+            'transactions': Transaction.objects.count(),
+            'events': Event.objects.count(),
+        }
+        if settings.DEBUG:
+            self.stdout.write(self.style.WARNING("DEBUG is on, the views are slower than in production"))
+
+        with tempfile.TemporaryDirectory() as directory:
+            database = None
+            # Writes go to a copy of the SQLite database, unless asked otherwise
+            if connection.vendor == 'sqlite' and not options['in_place']:
+                self.stdout.write("Copying the database...")
+                database = str(Path(directory) / 'bench.sqlite3')
+                connection.ensure_connection()
+                with sqlite3.connect(database) as copy:
+                    connection.connection.backup(copy)
+            samples = self.run(database, directory, users, staff.id if staff else None, scenarios, options)
+
+        results = {
+            'date': timezone.now().isoformat(),
+            'options': {key: options[key] for key in ('users', 'seconds', 'think', 'views', 'seed', 'in_place')},
+            'environment': environment,
+            'views': self.summarize(samples, scenarios, options['seconds']),
+        }
+        self.report(results['views'])
+
+        output = Path(options['output']) if options['output'] else (
+            RESULTS_DIR / f"bench_views-{timezone.localtime():%Y%m%d-%H%M%S}.json"
+        )
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {output}"))
+
+        if options['compare']:
+            self.compare(json.loads(Path(options['compare']).read_text())['views'], results['views'])
+
+    def run(self, database, reports_root, users, staff_id, scenarios, options):
+        # Connections must not be shared with the child processes
+        close_connections()
+
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=_worker, args=(
+                index, database, reports_root, account_id, wallet_id, staff_id, scenarios, options, results
+            ))
+            for index, (account_id, wallet_id) in enumerate(users)
+        ]
+        for worker in workers:
+            worker.start()
+        # A crashed worker never reports, do not wait for it forever
+        samples = []
+        for _worker_process in workers:
+            samples += results.get(timeout=options['seconds'] + 300)
+        for worker in workers:
+            worker.join()
+        return samples
+
+    def summarize(self, samples, scenarios, seconds):
+        views = {}
+        for name in [*scenarios, 'total']:
+            selected = [sample for sample in samples if name in ('total', sample[0])]
+            latencies = sorted(latency for _name, latency, _queries, _ok in selected)
+            queries = [count for _name, _latency, count, _ok in selected]
+            views[name] = {
+                'requests': len(selected),
+                'errors': sum(1 for *_sample, ok in selected if not ok),
+                'per_second': round(len(selected) / seconds, 2),
+                'p50_ms': round(_percentile(latencies, 0.50) * 1000, 1),
+                'p95_ms': round(_percentile(latencies, 0.95) * 1000, 1),
+                'p99_ms': round(_percentile(latencies, 0.99) * 1000, 1),
+                'queries': round(sum(queries) / len(queries), 1) if queries else 0,
+                'max_queries': max(queries, default=0),
+            }
+        return views
+
+    def report(self, views):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"  {'view':<18} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}"
+        ))
+        for name, view in views.items():
+            self.stdout.write(
+                f"  {name:<18} {view['per_second']:8.1f} {view['p50_ms']:8.1f} {view['p95_ms']:8.1f} "
+                f"{view['p99_ms']:8.1f} {view['queries']:8.1f} {view['errors']:7}"
+            )
+
+    def compare(self, previous, views):
+        self.stdout.write(self.style.MIGRATE_HEADING("Compared with the previous run"))
+        for name, view in views.items():
+            before = previous.get(name)
+            if not before or not before['p95_ms'] or not before['per_second']:
+                continue
+            p95 = (view['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+            throughput = (view['per_second'] - before['per_second']) / before['per_second'] * 100
+            style = self.style.ERROR if p95 > 10 else self.style.SUCCESS if p95 < -10 else str
+            self.stdout.write(style(
+                f"  {name:<18} p95 {before['p95_ms']:8.1f} -> {view['p95_ms']:8.1f} ms ({p95:+.0f}%)  "
+                f"req/s {throughput:+.0f}%  queries {before['queries']} -> {view['queries']}"
+            ))
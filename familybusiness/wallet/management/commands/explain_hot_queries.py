@@ -0,0 +1,72 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from account.models import Account
+from adminpanel.models import Event
+from wallet.models import Wallet, Transaction, FutureTransaction, WalletInvitation
+
+# A plan line reading the whole table instead of searching an index, per database vendor
+FULL_SCANS = {
+    'sqlite': re.compile(r'\bSCAN (?!.*\bUSING\b.*\bINDEX\b)\S+'),
+    'postgresql': re.compile(r'\bSeq Scan on\b'),
+}
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN QUERY PLAN on the hot queries and fails if one of them falls back to a full table scan"
+
+    def hot_queries(self):
+        """
+        The query shapes used by wallet/views.py, wallet/tasks.py and adminpanel/views.py
+        """
+        now = timezone.now()
+        wallet_id = Wallet.objects.values_list('id', flat=True).first() or 1
+        user_id = Account.objects.values_list('id', flat=True).first() or 1
+
+        return [
+            ("transaction_list", Transaction.objects.filter(wallet_id=wallet_id).order_by('-date')),
+            ("transaction_list next page", Transaction.objects.filter(
+                wallet_id=wallet_id, date__lte=now).exclude(date=now, id__gte=1000).order_by('-date', '-id')[:51]),
+            ("wallet_detail recent", Transaction.objects.filter(wallet_id=wallet_id).order_by('-date')[:5]),
+            ("monthly income", Transaction.objects.filter(
+                wallet_id=wallet_id, is_income=True, date__gte=now - timedelta(days=30))),
+            ("report period", Transaction.objects.filter(
+                wallet_id=wallet_id, date__gte=now - timedelta(days=365), date__lte=now).order_by('-date')),
+            ("scheduler due", FutureTransaction.objects.filter(active=True, execution_date__lte=now)),
+            ("active invitations", WalletInvitation.objects.filter(
+                wallet_id=wallet_id, is_used=False, expires_at__gt=now).order_by('-created_at')),
+            ("history by type", Event.objects.filter(type='LOGIN').order_by('-id')[:25]),
+            ("user last activity", Event.objects.filter(user_id=user_id).order_by('-date')[:1]),
+        ]
+
+    def handle(self, *args, **options):
+        full_scan = FULL_SCANS.get(connection.vendor)
+        if full_scan is None:
+            raise CommandError(f"Query plans of {connection.vendor} are not supported")
+
+        if connection.vendor == 'postgresql':
+            # Small tables are read sequentially even when an index exists, only report missing indexes
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+        full_scans = []
+
+        for name, queryset in self.hot_queries():
+            plan = queryset.explain()
+            scans = [line for line in plan.splitlines() if full_scan.search(line)]
+
+            if scans:
+                full_scans.append(name)
+                self.stdout.write(self.style.ERROR(f"[FULL SCAN] {name}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"[OK] {name}"))
+
+            for line in plan.splitlines():
+                self.stdout.write(f"    {line}")
+
+        if full_scans:
+            raise CommandError(f"Full table scan in: {', '.join(full_scans)}")
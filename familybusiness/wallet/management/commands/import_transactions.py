@@ -0,0 +1,59 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from account.models import Account
+from wallet import importers
+from wallet.models import Wallet, Category
+
+
+class Command(BaseCommand):
+    help = "Imports a CSV or OFX bank statement into a wallet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('wallet', type=int, help="Id of the wallet")
+        parser.add_argument('statement', help="Path of the CSV or OFX file")
+        parser.add_argument('--category', required=True,
+                            help="Name of the category used for lines without a known category")
+        parser.add_argument('--user', help="Email of the author of the transactions (default: the wallet owner)")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per INSERT")
+        parser.add_argument('--dry-run', action='store_true', help="Parse and summarize without importing")
+
+    def handle(self, *args, **options):
+        try:
+            wallet = Wallet.objects.select_related('owner').get(id=options['wallet'])
+            user = Account.objects.get(email=options['user']) if options['user'] else wallet.owner
+        except (Wallet.DoesNotExist, Account.DoesNotExist) as e:
+            raise CommandError(e)
+
+        # Category names are not unique, the oldest one matching wins
+        category = Category.objects.filter(name__iexact=options['category']).order_by('id').first()
+        if category is None:
+            raise CommandError(f"Unknown category: {options['category']}")
+
+        path = Path(options['statement'])
+        start = time.monotonic()
+        try:
+            rows, errors = importers.read_statement(path.read_bytes(), path.name)
+        except (OSError, importers.StatementError) as e:
+            raise CommandError(e)
+
+        for line, error in errors:
+            self.stdout.write(self.style.WARNING(f"Line {line} skipped: {error}"))
+
+        if options['dry_run']:
+            preview = importers.preview_statement(rows, category)
+            self.stdout.write(
+                f"{preview['count']} transaction(s): +{preview['income']}€ / -{preview['expenses']}€ "
+                f"(net {preview['net']:+}€)"
+            )
+            if preview['unknown_categories']:
+                self.stdout.write(f"Unknown categories, imported as {category.name}: "
+                                  f"{', '.join(preview['unknown_categories'])}")
+            return
+
+        count = importers.import_statement(wallet, user, rows, category, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} transaction(s) imported into {wallet.name} in {time.monotonic() - start:.1f}s"
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet import reports
+from wallet.models import Wallet, WalletDailyRollup
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per-wallet daily rollups from the transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallet', type=int, help="Only rebuild the rollups of this wallet id")
+
+    def handle(self, *args, **options):
+        wallet = None
+        if options['wallet'] is not None:
+            wallet = Wallet.objects.filter(id=options['wallet']).first()
+            if wallet is None:
+                raise CommandError(f"Wallet {options['wallet']} does not exist")
+
+        count = WalletDailyRollup.rebuild(wallet=wallet)
+        # The rebuild bumps the data versions, the reports rendered before it are never served again
+        reports.purge_reports(wallet=wallet)
+        self.stdout.write(self.style.SUCCESS(f"{count} rollup rows rebuilt"))
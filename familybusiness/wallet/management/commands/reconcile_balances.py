@@ -0,0 +1,38 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from wallet.models import Wallet
+
+
+class Command(BaseCommand):
+    help = "Recomputes every wallet's balance from its transactions and reports or fixes any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Correct the drifted balances")
+
+    def handle(self, *args, **options):
+        wallets = Wallet.with_expected_balance().values_list('id', 'name', 'balance', 'initial_balance', 'transactions_net')
+
+        drifted = 0
+        for wallet_id, name, balance, initial_balance, transactions_net in wallets:
+            # SQLite sums decimals as floats, round back to cents
+            expected = (initial_balance + (transactions_net or Decimal('0'))).quantize(Decimal('0.01'))
+            drift = expected - balance
+            if not drift:
+                continue
+
+            drifted += 1
+            self.stdout.write(self.style.WARNING(
+                f"Wallet {wallet_id} ({name}): balance {balance}€, expected {expected}€ (drift {drift:+}€)"
+            ))
+            if options['fix']:
+                # Apply the correction as a delta so concurrent transactions are kept
+                Wallet.adjust_balance(wallet_id, drift)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("All balances are consistent"))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"{drifted} wallet balance(s) fixed"))
+        else:
+            self.stdout.write(f"{drifted} wallet balance(s) drifted, run with --fix to correct them")
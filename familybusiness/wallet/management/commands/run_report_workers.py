@@ -0,0 +1,57 @@
+import multiprocessing
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from familybusiness.db import close_connections
+
+
+def _worker(poll_interval, once):
+    # Each process needs its own Django setup and database connection
+    django.setup()
+    connections.close_all()
+
+    from adminpanel import audit
+    from wallet import reports
+    try:
+        reports.work(poll_interval, once=once)
+    finally:
+        # Worker processes exit without running atexit handlers
+        audit.flush()
+
+
+class Command(BaseCommand):
+    help = "Runs a pool of worker processes rendering the queued PDF reports"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.REPORT_WORKER_PROCESSES,
+                            help="Number of worker processes")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to wait when the queue is empty")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once the queue is empty instead of waiting for new jobs")
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        self.stdout.write(f"Starting {processes} report worker(s)")
+
+        # Connections must not be shared with the child processes
+        close_connections()
+
+        workers = [
+            multiprocessing.Process(target=_worker, args=(options['poll_interval'], options['once']), daemon=True)
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+
+        self.stdout.write(self.style.SUCCESS("Report workers stopped"))
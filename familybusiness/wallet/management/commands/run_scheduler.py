@@ -0,0 +1,58 @@
+import os
+import socket
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, OperationalError
+
+from wallet.models import SchedulerLease
+
+LEASE_NAME = 'future_transactions'
+
+
+class Command(BaseCommand):
+    help = "Runs the scheduler executing the future transactions, as the single leader among running copies"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lease-seconds', type=int, default=settings.SCHEDULER_LEASE_SECONDS,
+                            help="Duration of the leader lease, a crashed leader is replaced after it")
+
+    def acquire(self, holder, duration):
+        close_old_connections()
+        try:
+            return SchedulerLease.acquire(LEASE_NAME, holder, duration)
+        except OperationalError:
+            # A locked database counts as a failed attempt, the lease is still ours on the next one
+            return False
+
+    def handle(self, *args, **options):
+        from wallet import scheduler
+
+        duration = timedelta(seconds=options['lease_seconds'])
+        # Renewed three times per lease, so a slow renewal does not lose it
+        renew_interval = duration.total_seconds() / 3
+        holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self.stdout.write(f"Scheduler {holder} waiting for the lease")
+        try:
+            while True:
+                if not self.acquire(holder, duration):
+                    time.sleep(renew_interval)
+                    continue
+
+                self.stdout.write(self.style.SUCCESS(f"Scheduler {holder} is the leader"))
+                running = scheduler.DueScheduler()
+                try:
+                    while True:
+                        running.run_for(renew_interval)
+                        if not self.acquire(holder, duration):
+                            break
+                finally:
+                    running.close()
+                self.stdout.write(self.style.WARNING(f"Scheduler {holder} lost the lease"))
+        except KeyboardInterrupt:
+            SchedulerLease.release(LEASE_NAME, holder)
+            self.stdout.write("Scheduler stopped")
@@ -0,0 +1,346 @@
+import bisect
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone, translation
+from django.utils.translation import gettext as _
+
+from account.models import Account
+from familybusiness.db import insert_rows
+from adminpanel.models import Event, EventFacet
+from wallet.models import Category, FutureTransaction, Transaction, Wallet, WalletDailyRollup
+
+EMAIL_DOMAIN = 'seed.familybusiness.test'
+
+FIRST_NAMES = [
+    'Emma', 'Louis', 'Olivia', 'Arthur', 'Louise', 'Jules', 'Alice', 'Noah', 'Chloé', 'Lucas', 'Léa', 'Adam',
+    'Camille', 'Victor', 'Manon', 'Hugo', 'Juliette', 'Nathan', 'Sarah', 'Gabriel', 'Inès', 'Thomas', 'Marie', 'Elias',
+]
+LAST_NAMES = [
+    'Peeters', 'Janssens', 'Maes', 'Dubois', 'Lambert', 'Dupont', 'Martin', 'Leroy', 'Simon', 'Laurent', 'Claes',
+    'Lemaire', 'Renard', 'Michel', 'Bernard', 'Petit', 'Mertens', 'Willems', 'Goossens', 'Fontaine', 'Durand', 'Moreau',
+]
+WALLET_NAMES = ['Compte commun', 'Courses', 'Vacances', 'Épargne', 'Maison', 'Enfants', 'Voiture', 'Loisirs', 'Budget']
+
+# Category: (share of the transactions, median amount in €, spread of the amounts, share of incomes,
+# titles of the expenses, titles of the incomes)
+CATEGORY_PROFILES = {
+    'Alimentation': (30, 35, 0.7, 0, ['Delhaize', 'Colruyt', 'Carrefour Market', 'Aldi', 'Boulangerie', 'Marché'], []),
+    'Transport': (12, 40, 0.8, 0, ["Plein d'essence", 'Abonnement STIB', 'Billet de train', 'Parking', 'Taxi'], []),
+    'Logement': (4, 450, 0.8, 0, ['Loyer', 'Électricité', 'Eau', 'Chauffage', 'Entretien'], []),
+    'Santé': (4, 30, 0.9, 0.2, ['Pharmacie', 'Médecin', 'Dentiste', 'Kiné'], ['Remboursement mutuelle']),
+    'Loisirs': (8, 25, 0.9, 0, ['Cinéma', 'Restaurant', 'Concert', 'Salle de sport', 'Livres'], []),
+    'Vêtements': (4, 45, 0.8, 0, ['Chaussures', 'Vêtements enfants', 'Soldes', 'Manteau'], []),
+    'Éducation': (2, 60, 1.0, 0, ['Frais scolaires', 'Fournitures', 'Stage', 'Cours de musique'], []),
+    'Services': (6, 20, 0.8, 0, ['Internet', 'Téléphone', 'Streaming', 'Coiffeur', 'Frais bancaires'], []),
+    'Épargne': (2, 150, 0.6, 0.3, ['Versement épargne'], ['Retrait épargne']),
+    'Revenus': (4, 1500, 0.35, 1, [], ['Salaire', 'Prime', 'Allocations familiales', 'Pécule de vacances']),
+    'Cadeaux': (3, 40, 0.9, 0.2, ['Anniversaire', 'Cadeau de Noël', 'Mariage'], ['Cadeau reçu']),
+    'Voyages': (2, 180, 1.0, 0, ['Hôtel', "Billets d'avion", 'Location de voiture', 'Excursion'], []),
+    'Assurances': (2, 60, 0.6, 0, ['Assurance auto', 'Assurance habitation', 'Assurance familiale'], []),
+    'Taxes': (1, 250, 1.0, 0.1, ['Impôts', 'Taxe communale', 'Précompte immobilier'], ["Remboursement d'impôts"]),
+    'Autres': (5, 30, 1.1, 0.15, ['Divers', 'Retrait', 'Virement'], ['Remboursement', 'Vente']),
+}
+DEFAULT_PROFILE = (1, 30, 1.0, 0.1, ['Divers'], ['Remboursement'])
+
+# Recurring operations: (category, title, median amount in €, is_income, frequency)
+FUTURE_TEMPLATES = [
+    ('Logement', 'Loyer', 750, False, FutureTransaction.Frequency.MONTHLY),
+    ('Revenus', 'Salaire', 2100, True, FutureTransaction.Frequency.MONTHLY),
+    ('Services', 'Internet', 45, False, FutureTransaction.Frequency.MONTHLY),
+    ('Assurances', 'Assurance auto', 480, False, FutureTransaction.Frequency.YEARLY),
+    ('Alimentation', 'Panier bio', 30, False, FutureTransaction.Frequency.WEEKLY),
+    ('Voyages', 'Acompte vacances', 400, False, FutureTransaction.Frequency.ONCE),
+]
+
+# Event types as logged in production, by frequency
+EVENT_WEIGHTS = {
+    'LOGIN': 40, 'LOGOUT': 15, 'TRANSACTION_CREATE': 20, 'TRANSACTION_UPDATE': 5, 'TRANSACTION_DELETE': 3,
+    'WALLET_UPDATE': 3, 'OBJECTIVE_UPDATE': 2, 'TRANSACTION_EXPORT': 2, 'REPORT_GENERATE': 2,
+    'PASSWORD_CHANGE': 1, 'ERROR': 2, 'WALLET_CREATE': 1,
+}
+
+# Messages of the generated events, as logged by the views
+TRANSACTION_EVENTS = {
+    'TRANSACTION_CREATE': "transaction_added",
+    'TRANSACTION_UPDATE': "transaction_modified",
+    'TRANSACTION_DELETE': "transaction_deleted",
+}
+WALLET_EVENTS = {
+    'WALLET_CREATE': "new_wallet_created",
+    'WALLET_UPDATE': "wallet_modified",
+    'OBJECTIVE_UPDATE': "objective_modified",
+    'TRANSACTION_EXPORT': "transactions_exported",
+    'REPORT_GENERATE': "report_generated",
+    'ERROR': "unauthorized_wallet_access_attempt",
+}
+
+# Mean hour and spread of the transactions during the day
+DAY_HOUR, HOUR_SPREAD = 14, 3.5
+
+
+def _cents(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+class Command(BaseCommand):
+    help = "Generates reproducible synthetic accounts, wallets, transactions and events, e.g. to measure performance"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=50, help="Number of accounts")
+        parser.add_argument('--wallets', type=int, default=100, help="Number of wallets")
+        parser.add_argument('--shared', type=float, default=0.5, help="Share of the wallets with other members")
+        parser.add_argument('--categories', type=int, default=len(CATEGORY_PROFILES), help="Number of categories used")
+        parser.add_argument('--transactions', type=int, default=100_000, help="Number of transactions")
+        parser.add_argument('--years', type=float, default=3, help="Years of history")
+        parser.add_argument('--future', type=int, default=2, help="Recurring future transactions per wallet")
+        parser.add_argument('--events', type=int, default=20_000, help="Number of history events")
+        parser.add_argument('--seed', type=int, default=1, help="Random seed, the same seed generates the same data")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Rows per bulk insert")
+        parser.add_argument('--password', default='password', help="Password of the generated accounts")
+
+    def handle(self, *args, **options):
+        if options['accounts'] < 1 or options['wallets'] < 1 or options['categories'] < 1:
+            raise CommandError("At least one account, wallet and category are needed")
+
+        email_prefix = f"seed{options['seed']}-"
+        if Account.objects.filter(email__startswith=email_prefix, email__endswith=f'@{EMAIL_DOMAIN}').exists():
+            raise CommandError(f"Data of seed {options['seed']} already exists, use another --seed")
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.started = time.monotonic()
+        self.today = timezone.localdate()
+        self.span_days = max(int(options['years'] * 365), 1)
+        self.first_day = self.today - timedelta(days=self.span_days)
+
+        # Event contents are stored translated, as log_event does
+        with translation.override(settings.LANGUAGE_CODE):
+            accounts = self.create_accounts(options['accounts'], email_prefix, options['password'])
+            categories = self.get_categories(options['categories'])
+            wallets = self.create_wallets(options['wallets'], accounts, options['shared'])
+            self.create_transactions(options['transactions'], wallets, categories)
+            self.create_future_transactions(options['future'], wallets, categories)
+            self.create_events(options['events'], accounts)
+
+        self.stdout.write(self.style.SUCCESS(f"Seed {options['seed']} generated in {self.elapsed():.0f}s"))
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def log(self, message):
+        self.stdout.write(f"[{self.elapsed():6.1f}s] {message}")
+
+    def create_accounts(self, count, email_prefix, password):
+        # Hashing is slow on purpose, every account shares the same hash
+        password = make_password(password)
+        accounts = []
+        for n in range(count):
+            accounts.append(Account(
+                email=f'{email_prefix}{n}@{EMAIL_DOMAIN}',
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                password=password,
+                date_joined=timezone.now() - timedelta(days=self.span_days + self.rng.randrange(60)),
+            ))
+        accounts = Account.objects.bulk_create(accounts, batch_size=self.batch_size)
+        self.log(f"{len(accounts)} accounts")
+        return accounts
+
+    def get_categories(self, count):
+        names = list(CATEGORY_PROFILES)[:count] + [f"Catégorie {n}" for n in range(len(CATEGORY_PROFILES) + 1, count + 1)]
+        existing = {category.name: category for category in Category.objects.filter(name__in=names)}
+        created = Category.objects.bulk_create(Category(name=name) for name in names if name not in existing)
+        categories = list(existing.values()) + created
+        categories.sort(key=lambda category: names.index(category.name))
+        self.log(f"{len(categories)} categories ({len(created)} created)")
+        return categories
+
+    def create_wallets(self, count, accounts, shared):
+        wallets, members = [], []
+        for _n in range(count):
+            owner = self.rng.choice(accounts)
+            initial_balance = _cents(self.rng.randrange(0, 500_000))
+            wallets.append(Wallet(
+                name=f"{self.rng.choice(WALLET_NAMES)} {owner.last_name}",
+                owner=owner,
+                balance=initial_balance,
+                initial_balance=initial_balance,
+                objective=_cents(self.rng.choice([0, 100_000, 250_000, 500_000, 1_000_000, 2_500_000])),
+            ))
+            # Most wallets are personal, shared ones mostly have one or two other members
+            others = []
+            if self.rng.random() < shared:
+                extra = min(self.rng.choices([1, 2, 3, 4], weights=[60, 25, 10, 5])[0], len(accounts) - 1)
+                others = self.rng.sample([account for account in accounts if account is not owner], extra)
+            members.append([owner] + others)
+
+        wallets = Wallet.objects.bulk_create(wallets, batch_size=self.batch_size)
+        Wallet.users.through.objects.bulk_create(
+            (
+                Wallet.users.through(wallet_id=wallet.id, account_id=account.id)
+                for wallet, wallet_members in zip(wallets, members) for account in wallet_members
+            ),
+            batch_size=self.batch_size,
+        )
+        for wallet, wallet_members in zip(wallets, members):
+            wallet.members = wallet_members
+        self.log(f"{len(wallets)} wallets, {sum(map(len, members))} memberships")
+        return wallets
+
+    def allocate(self, total, wallets):
+        """
+        Split the transactions between the wallets: a few large wallets hold most of them (80/20)
+        """
+        weights = [self.rng.paretovariate(1.16) for _wallet in wallets]
+        scale = total / sum(weights)
+        counts = [int(weight * scale) for weight in weights]
+        counts[weights.index(max(weights))] += total - sum(counts)
+        return counts
+
+    def pick(self, cum_weights):
+        """
+        Index drawn from cumulative weights, random.choices without its per-call overhead
+        """
+        return bisect.bisect(cum_weights, self.rng.random() * cum_weights[-1])
+
+    def create_transactions(self, total, wallets, categories):
+        profiles = [CATEGORY_PROFILES.get(category.name, DEFAULT_PROFILE) for category in categories]
+        cum_weights = list(itertools.accumulate(profile[0] for profile in profiles))
+        adapt_date = connection.ops.adapt_datefield_value
+        adapt_datetime = connection.ops.adapt_datetimefield_value
+        adapt_decimal = connection.ops.adapt_decimalfield_value
+        midnight = datetime.combine(self.first_day, datetime.min.time(), tzinfo=timezone.get_current_timezone())
+        fields = ['title', 'category', 'user', 'amount', 'date', 'wallet', 'description', 'is_income']
+        rollup_fields = ['wallet', 'day', 'category', 'is_income', 'total', 'count']
+        created = logged = 0
+
+        for wallet, count in zip(wallets, self.allocate(total, wallets)):
+            if not count:
+                continue
+            # Wallets were opened at different times, their transactions run until yesterday
+            opened = int(self.span_days * self.rng.random() * 0.75)
+            days = sorted(self.rng.randrange(opened, self.span_days) for _n in range(count))
+            # The owner writes most of the transactions
+            author_ids = [wallet.owner.id] * 2 + [member.id for member in wallet.members[1:]]
+            totals, net = {}, 0
+
+            with transaction.atomic():
+                rows = []
+                for day in days:
+                    index = self.pick(cum_weights)
+                    _weight, median, spread, income_rate, expense_titles, income_titles = profiles[index]
+                    cents = max(int(self.rng.lognormvariate(0, spread) * median * 100), 1)
+                    is_income = self.rng.random() < income_rate
+                    seconds = min(max(self.rng.gauss(DAY_HOUR, HOUR_SPREAD), 6), 23.9) * 3600
+                    rows.append((
+                        self.rng.choice(income_titles if is_income else expense_titles),
+                        categories[index].id,
+                        self.rng.choice(author_ids),
+                        adapt_decimal(_cents(cents)),
+                        adapt_datetime(midnight + timedelta(days=day, seconds=int(seconds))),
+                        wallet.id,
+                        '',
+                        is_income,
+                    ))
+
+                    row = totals.setdefault((day, categories[index].id, is_income), [0, 0])
+                    row[0] += cents
+                    row[1] += 1
+                    net += cents if is_income else -cents
+
+                    if len(rows) >= self.batch_size:
+                        insert_rows(Transaction, fields, rows)
+                        created += len(rows)
+                        rows = []
+                insert_rows(Transaction, fields, rows)
+                created += len(rows)
+
+                # The inserts skip save(): the new wallet gets its rollups and balance here, in one go
+                insert_rows(WalletDailyRollup, rollup_fields, [
+                    (
+                        wallet.id, adapt_date(self.first_day + timedelta(days=day)), category_id, is_income,
+                        adapt_decimal(_cents(cents)), number,
+                    )
+                    for (day, category_id, is_income), (cents, number) in totals.items()
+                ])
+                Wallet.adjust_balance(wallet.id, _cents(net))
+
+            if created - logged >= 1_000_000:
+                logged = created
+                self.log(f"{created:,} / {total:,} transactions")
+
+        self.log(f"{created:,} transactions")
+
+    def create_future_transactions(self, per_wallet, wallets, categories):
+        by_name = {category.name: category for category in categories}
+        future = []
+        for wallet in wallets:
+            for category_name, title, median, is_income, frequency in self.rng.sample(
+                FUTURE_TEMPLATES, min(per_wallet, len(FUTURE_TEMPLATES))
+            ):
+                future.append(FutureTransaction(
+                    title=title,
+                    category=by_name.get(category_name, categories[-1]),
+                    user=self.rng.choice(wallet.members),
+                    amount=_cents(int(self.rng.lognormvariate(0, 0.2) * median * 100)),
+                    wallet=wallet,
+                    is_income=is_income,
+                    execution_date=timezone.now() + timedelta(days=self.rng.randint(1, 30), hours=self.rng.randrange(24)),
+                    frequency=frequency,
+                ))
+        # bulk_create does not notify the scheduler, it picks them up on its next resync
+        future = FutureTransaction.objects.bulk_create(future, batch_size=self.batch_size)
+        self.log(f"{len(future)} future transactions")
+
+    def create_events(self, count, accounts):
+        # A few users are much more active than the others
+        activity = list(itertools.accumulate(self.rng.paretovariate(1.5) for _account in accounts))
+        types = list(EVENT_WEIGHTS)
+        type_weights = list(itertools.accumulate(EVENT_WEIGHTS.values()))
+        days = sorted(self.rng.randrange(self.span_days + 1) for _n in range(count))
+        adapt_date = connection.ops.adapt_datefield_value
+        fields = ['date', 'content', 'type', 'user', 'user_name_snapshot']
+
+        with transaction.atomic():
+            rows = []
+            for day in days:
+                user = accounts[self.pick(activity)]
+                event_type = types[self.pick(type_weights)]
+                rows.append((
+                    adapt_date(self.first_day + timedelta(days=day)),
+                    self.event_content(event_type, user),
+                    event_type,
+                    user.id,
+                    user.get_full_name(),
+                ))
+                if len(rows) >= self.batch_size:
+                    insert_rows(Event, fields, rows)
+                    rows = []
+            insert_rows(Event, fields, rows)
+            EventFacet.rebuild()
+
+        self.log(f"{count:,} events")
+
+    def event_content(self, event_type, user):
+        name = user.get_full_name()
+        if event_type == 'LOGIN':
+            return _("login_for") + f" {name}"
+        if event_type == 'LOGOUT':
+            return _("logout_for") + f" {name}"
+        if event_type == 'PASSWORD_CHANGE':
+            return _("password_changed_for") + f" {name}"
+        if event_type in TRANSACTION_EVENTS:
+            amount = _cents(int(self.rng.lognormvariate(0, 0.7) * 3500))
+            title = self.rng.choice(CATEGORY_PROFILES['Alimentation'][4])
+            return _(TRANSACTION_EVENTS[event_type]) + f" ({_('expense')}): {title} - {amount}€"
+
+        wallet_name = f"{self.rng.choice(WALLET_NAMES)} {user.last_name}"
+        return _(WALLET_EVENTS[event_type]) + f": {wallet_name}"
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def build_rollups(apps, schema_editor):
+    """
+    Fill the daily rollups from the existing transactions
+    """
+    Transaction = apps.get_model('wallet', 'Transaction')
+    WalletDailyRollup = apps.get_model('wallet', 'WalletDailyRollup')
+
+    grouped = (
+        Transaction.objects
+        .annotate(day=TruncDate('date', tzinfo=timezone.get_current_timezone()))
+        .values('wallet_id', 'day', 'category_id', 'is_income')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    WalletDailyRollup.objects.bulk_create(
+        [WalletDailyRollup(**row) for row in grouped],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0006_alter_wallet_objective'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='date'),
+        ),
+        migrations.CreateModel(
+            name='WalletDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='day')),
+                ('is_income', models.BooleanField(default=False, verbose_name='is_income')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='total')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='count')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wallet.category', verbose_name='category')),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='wallet.wallet', verbose_name='wallet')),
+            ],
+            options={
+                'verbose_name': 'wallet daily rollup',
+                'verbose_name_plural': 'wallet daily rollups',
+                'constraints': [models.UniqueConstraint(fields=('wallet', 'day', 'category', 'is_income'), name='unique_wallet_daily_rollup')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:25
+
+from django.db import migrations, models
+from django.db.models import Case, F, Sum, When
+
+
+def compute_initial_balances(apps, schema_editor):
+    """
+    Derive the opening balance of existing wallets from their current balance and transactions
+    """
+    Wallet = apps.get_model('wallet', 'Wallet')
+
+    wallets = Wallet.objects.annotate(
+        transactions_net=Sum(
+            Case(
+                When(transactions__is_income=True, then=F('transactions__amount')),
+                default=-F('transactions__amount'),
+            )
+        )
+    )
+    for wallet in wallets:
+        wallet.initial_balance = wallet.balance - (wallet.transactions_net or 0)
+        wallet.save(update_fields=['initial_balance'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0007_walletdailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='initial_balance',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=10, verbose_name='initial_balance'),
+        ),
+        migrations.RunPython(compute_initial_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0008_wallet_initial_balance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='futuretransaction',
+            index=models.Index(condition=models.Q(('active', True)), fields=['execution_date'], name='future_trx_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['wallet', 'date'], name='transaction_wallet_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['wallet', 'is_income', 'date'], name='transaction_wallet_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='walletinvitation',
+            index=models.Index(condition=models.Q(('is_used', False)), fields=['wallet', 'expires_at'], name='invitation_wallet_active_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0009_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='data_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False, verbose_name='data_version'),
+        ),
+    ]
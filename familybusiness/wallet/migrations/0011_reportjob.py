@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0010_wallet_data_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('monthly', 'monthly'), ('quarterly', 'quarterly'), ('annual', 'annual')], max_length=10, verbose_name='period')),
+                ('start_date', models.DateTimeField(verbose_name='start_date')),
+                ('end_date', models.DateTimeField(verbose_name='end_date')),
+                ('language', models.CharField(max_length=10, verbose_name='language')),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], default='pending', max_length=10, verbose_name='status')),
+                ('file_path', models.CharField(blank=True, max_length=255, verbose_name='file_path')),
+                ('error', models.TextField(blank=True, verbose_name='error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created_at')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='started_at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='finished_at')),
+                ('requested_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_jobs', to=settings.AUTH_USER_MODEL, verbose_name='requested_by')),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_jobs', to='wallet.wallet', verbose_name='wallet')),
+            ],
+            options={
+                'verbose_name': 'report job',
+                'verbose_name_plural': 'report jobs',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='report_job_queue_idx')],
+            },
+        ),
+    ]
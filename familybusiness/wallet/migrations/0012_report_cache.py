@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0011_reportjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='cache_key',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='cache_key'),
+        ),
+        migrations.AddField(
+            model_name='reportjob',
+            name='file_size',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='file_size'),
+        ),
+        migrations.AddField(
+            model_name='reportjob',
+            name='last_accessed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='last_accessed_at'),
+        ),
+        migrations.AddField(
+            model_name='walletdailyrollup',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='version'),
+        ),
+        migrations.AddIndex(
+            model_name='reportjob',
+            index=models.Index(fields=['wallet', 'cache_key'], name='report_job_cache_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0012_report_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerLease',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='name')),
+                ('holder', models.CharField(max_length=255, verbose_name='holder')),
+                ('expires_at', models.DateTimeField(verbose_name='expires_at')),
+            ],
+            options={
+                'verbose_name': 'scheduler lease',
+                'verbose_name_plural': 'scheduler leases',
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:53
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0015_report_job_attempts'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='walletdailyrollup',
+            name='version',
+        ),
+    ]
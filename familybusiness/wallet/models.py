@@ -2,16 +2,23 @@ import uuid
 from datetime import timedelta
 
 from dateutil.relativedelta import relativedelta
-from django.db import models
+from django.db import connection, models, transaction as db_transaction, IntegrityError
+from django.db.models import F, Sum, Count, Case, When
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from familybusiness.db import insert_rows
+
+
 class Wallet(models.Model):
     name = models.CharField(max_length=100, verbose_name=_("name"))
     owner = models.ForeignKey('account.Account', on_delete=models.CASCADE, verbose_name=_("owner"))
     users = models.ManyToManyField('account.Account', related_name='wallets', blank=True, verbose_name=_("users"))
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, verbose_name=_("balance"))
+    initial_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, verbose_name=_("initial_balance"))
     objective = models.DecimalField(max_digits=15, decimal_places=2, default=0.00, verbose_name=_("objective"))
+    data_version = models.PositiveBigIntegerField(default=0, editable=False, verbose_name=_("data_version"))
 
     class Meta:
         verbose_name = _("wallet")
@@ -20,6 +27,40 @@ class Wallet(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def adjust_balance(cls, wallet_id, delta):
+        """
+        Apply a balance change in a single UPDATE statement, without reading the row first.
+        Also bumps the data version, which changes whenever the wallet's transactions do.
+        """
+        cls.objects.filter(pk=wallet_id).update(
+            balance=F('balance') + delta,
+            data_version=F('data_version') + 1,
+        )
+
+    @classmethod
+    def touch(cls, wallet_id):
+        """
+        Bump the data version after a change shown on the wallet pages without touching the
+        transactions (members, objective), so their cached fragments are rendered again
+        """
+        cls.objects.filter(pk=wallet_id).update(data_version=F('data_version') + 1)
+
+    @classmethod
+    def with_expected_balance(cls):
+        """
+        Annotate every wallet with the balance computed from its transactions
+        """
+        return cls.objects.annotate(
+            transactions_net=Sum(
+                Case(
+                    When(transactions__is_income=True, then=F('transactions__amount')),
+                    default=-F('transactions__amount'),
+                )
+            )
+        )
+
+
 class WalletInvitation(models.Model):
     wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='invitations')
     token = models.UUIDField(default=uuid.uuid4, unique=True)
@@ -33,6 +74,10 @@ class WalletInvitation(models.Model):
     class Meta:
         verbose_name = _("wallet_invitation")
         verbose_name_plural = _("wallet_invitations")
+        indexes = [
+            # Partial index: SQLite compiles is_used=False to "NOT is_used", which a plain column index cannot match
+            models.Index(fields=['wallet', 'expires_at'], condition=models.Q(is_used=False), name='invitation_wallet_active_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.expires_at:
@@ -45,6 +90,7 @@ class WalletInvitation(models.Model):
     def __str__(self):
         return f"Invitation to {self.wallet.name} - {self.token}"
 
+
 class Category(models.Model):
     name = models.CharField(max_length=100, verbose_name=_("name"))
 
@@ -55,6 +101,7 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+
 class Transaction(models.Model):
     title = models.CharField(max_length=100, verbose_name=_("title"))
     category = models.ForeignKey(Category, on_delete=models.CASCADE, verbose_name=_("category"))
@@ -68,10 +115,250 @@ class Transaction(models.Model):
     class Meta:
         verbose_name = _("transaction")
         verbose_name_plural = _("transactions")
+        indexes = [
+            models.Index(fields=['wallet', 'date'], name='transaction_wallet_date_idx'),
+            models.Index(fields=['wallet', 'is_income', 'date'], name='transaction_wallet_type_idx'),
+            models.Index(fields=['category', 'date'], name='transaction_category_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.amount}€ - {self.date.strftime('%Y-%m-%d %H:%M:%S')}"
 
+    @property
+    def signed_amount(self):
+        return self.amount if self.is_income else -self.amount
+
+    def save(self, *args, **kwargs):
+        with db_transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = Transaction.objects.filter(pk=self.pk).first()
+
+            super().save(*args, **kwargs)
+
+            # Keep the wallet balance and the daily rollups in sync with the stored row
+            delta = self.signed_amount
+            if previous is not None:
+                if previous.wallet_id == self.wallet_id:
+                    delta -= previous.signed_amount
+                else:
+                    Wallet.adjust_balance(previous.wallet_id, -previous.signed_amount)
+                WalletDailyRollup.apply(previous, -1)
+            Wallet.adjust_balance(self.wallet_id, delta)
+            WalletDailyRollup.apply(self, 1)
+
+    def delete(self, *args, **kwargs):
+        with db_transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Wallet.adjust_balance(self.wallet_id, -self.signed_amount)
+            WalletDailyRollup.apply(self, -1)
+        return result
+
+    @classmethod
+    def bulk_add(cls, transactions, batch_size=1000):
+        """
+        Insert new transactions with batched inserts, one balance update per wallet and one
+        update per rollup row. The values are adapted here instead of through bulk_create,
+        which spends most of its time preparing them. The inserted instances get no pk.
+        """
+        ops = connection.ops
+        fields = ['title', 'category', 'user', 'amount', 'date', 'wallet', 'description', 'is_income']
+
+        with db_transaction.atomic():
+            for start in range(0, len(transactions), batch_size):
+                insert_rows(cls, fields, [
+                    (
+                        trx.title, trx.category_id, trx.user_id, ops.adapt_decimalfield_value(trx.amount, 10, 2),
+                        ops.adapt_datetimefield_value(trx.date), trx.wallet_id, trx.description, trx.is_income,
+                    )
+                    for trx in transactions[start:start + batch_size]
+                ])
+
+            nets = {}
+            for trx in transactions:
+                nets[trx.wallet_id] = nets.get(trx.wallet_id, 0) + trx.signed_amount
+            for wallet_id, net in nets.items():
+                Wallet.adjust_balance(wallet_id, net)
+            WalletDailyRollup.apply_many(transactions)
+        return len(transactions)
+
+    @classmethod
+    def unapply_many(cls, transactions):
+        """
+        Take transactions about to be deleted by a cascade (user or category deletion) out of the
+        balances and the daily rollups, one update per wallet and rollup row. Must run in the
+        transaction of the deletion
+        """
+        WalletDailyRollup.unapply_many(transactions)
+        nets = (
+            transactions
+            .values('wallet_id')
+            .annotate(net=Sum(Case(When(is_income=True, then=F('amount')), default=-F('amount'))))
+            .order_by()
+        )
+        for row in nets:
+            Wallet.adjust_balance(row['wallet_id'], -row['net'])
+
+
+class WalletDailyRollup(models.Model):
+    """
+    Per-wallet daily totals, split by category and type.
+    Kept up to date by Transaction.save/delete so dashboards and reports
+    aggregate over days instead of transactions.
+    Rows are kept when their count drops to zero, the readers sum over them anyway.
+    """
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='daily_rollups', verbose_name=_("wallet"))
+    day = models.DateField(verbose_name=_("day"))
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, verbose_name=_("category"))
+    is_income = models.BooleanField(default=False, verbose_name=_("is_income"))
+    total = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name=_("total"))
+    count = models.PositiveIntegerField(default=0, verbose_name=_("count"))
+
+    class Meta:
+        verbose_name = _("wallet daily rollup")
+        verbose_name_plural = _("wallet daily rollups")
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'day', 'category', 'is_income'], name='unique_wallet_daily_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet_id} - {self.day} - {self.category_id} ({'+' if self.is_income else '-'}{self.total}€ / {self.count})"
+
+    @staticmethod
+    def local_day(value, tz=None):
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value, tz)
+        return timezone.localdate(value, tz)
+
+    @classmethod
+    def apply(cls, trx, sign):
+        """
+        Add (sign=1) or remove (sign=-1) a transaction from its rollup row
+        """
+        rows = cls.objects.filter(
+            wallet_id=trx.wallet_id,
+            day=cls.local_day(trx.date),
+            category_id=trx.category_id,
+            is_income=trx.is_income,
+        )
+        amount = trx.amount * sign
+
+        if rows.update(total=F('total') + amount, count=F('count') + sign):
+            return
+
+        if sign > 0:
+            try:
+                with db_transaction.atomic():
+                    cls.objects.create(
+                        wallet_id=trx.wallet_id,
+                        day=cls.local_day(trx.date),
+                        category_id=trx.category_id,
+                        is_income=trx.is_income,
+                        total=amount,
+                        count=1,
+                    )
+            except IntegrityError:
+                # Created concurrently, fall back on the update
+                rows.update(total=F('total') + amount, count=F('count') + 1)
+
+    @classmethod
+    def apply_totals(cls, wallet_id, totals, batch_size=1000):
+        """
+        Add pre-aggregated transactions to the rollups of a wallet,
+        totals maps (day, category_id, is_income) to (total, count)
+        """
+        if not totals:
+            return
+
+        days = [day for day, _category_id, _is_income in totals]
+        existing = {
+            (day, category_id, is_income): pk
+            for pk, day, category_id, is_income in cls.objects.filter(
+                wallet_id=wallet_id, day__range=(min(days), max(days))
+            ).values_list('id', 'day', 'category_id', 'is_income')
+        }
+
+        created = []
+        for (day, category_id, is_income), (total, count) in totals.items():
+            pk = existing.get((day, category_id, is_income))
+            if pk is None:
+                created.append(cls(
+                    wallet_id=wallet_id,
+                    day=day,
+                    category_id=category_id,
+                    is_income=is_income,
+                    total=total,
+                    count=count,
+                ))
+            else:
+                cls.objects.filter(pk=pk).update(total=F('total') + total, count=F('count') + count)
+        cls.objects.bulk_create(created, batch_size=batch_size)
+
+    @classmethod
+    def apply_many(cls, transactions):
+        """
+        Add new transactions to the rollups, one query per rollup row
+        """
+        # The current time zone is looked up once, not once per transaction
+        tz = timezone.get_current_timezone()
+        totals = {}
+        for trx in transactions:
+            wallet_totals = totals.setdefault(trx.wallet_id, {})
+            key = (cls.local_day(trx.date, tz), trx.category_id, trx.is_income)
+            total, count = wallet_totals.get(key, (0, 0))
+            wallet_totals[key] = (total + trx.amount, count + 1)
+
+        for wallet_id, wallet_totals in totals.items():
+            cls.apply_totals(wallet_id, wallet_totals)
+
+    @classmethod
+    def unapply_many(cls, transactions):
+        """
+        Remove a queryset of transactions from the rollups, one query per rollup row
+        """
+        grouped = (
+            transactions
+            .annotate(day=TruncDate('date', tzinfo=timezone.get_current_timezone()))
+            .values('wallet_id', 'day', 'category_id', 'is_income')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by()
+        )
+        for row in grouped:
+            cls.objects.filter(
+                wallet_id=row['wallet_id'], day=row['day'], category_id=row['category_id'], is_income=row['is_income'],
+            ).update(total=F('total') - row['total'], count=F('count') - row['count'])
+
+    @classmethod
+    def rebuild(cls, wallet=None, batch_size=1000):
+        """
+        Recompute the rollups from the transactions, for one wallet or all of them.
+        The data version of the rebuilt wallets is bumped, their cached pages and reports are stale
+        """
+        transactions = Transaction.objects.all()
+        rollups = cls.objects.all()
+        wallets = Wallet.objects.all()
+        if wallet is not None:
+            transactions = transactions.filter(wallet=wallet)
+            rollups = rollups.filter(wallet=wallet)
+            wallets = wallets.filter(pk=wallet.pk)
+
+        grouped = (
+            transactions
+            .annotate(day=TruncDate('date', tzinfo=timezone.get_current_timezone()))
+            .values('wallet_id', 'day', 'category_id', 'is_income')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by()
+        )
+
+        with db_transaction.atomic():
+            rollups.delete()
+            created = cls.objects.bulk_create(
+                (cls(**row) for row in grouped.iterator()),
+                batch_size=batch_size,
+            )
+            wallets.update(data_version=F('data_version') + 1)
+        return len(created)
+
 
 class FutureTransaction(models.Model):
     class Frequency(models.TextChoices):
@@ -95,34 +382,152 @@ class FutureTransaction(models.Model):
     class Meta:
         verbose_name = _("future transaction")
         verbose_name_plural = _("future transactions")
+        indexes = [
+            # Partial index: SQLite compiles active=True to a bare "active" term, which a plain column index cannot match
+            models.Index(fields=['execution_date'], condition=models.Q(active=True), name='future_trx_due_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.amount}€ on {self.execution_date} ({self.frequency})"
 
-    def create_transaction(self):
-        Transaction.objects.create(
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._notify_scheduler(self.pk)
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        result = super().delete(*args, **kwargs)
+        self._notify_scheduler(pk)
+        return result
+
+    @staticmethod
+    def _notify_scheduler(pk):
+        from .scheduler import notify
+        # Once committed, so the scheduler reads the new execution date
+        db_transaction.on_commit(lambda: notify(pk))
+
+    def build_transaction(self, date):
+        return Transaction(
             title=self.title,
-            category=self.category,
-            user=self.user,
+            category_id=self.category_id,
+            user_id=self.user_id,
             amount=self.amount,
-            wallet=self.wallet,
+            wallet_id=self.wallet_id,
             description=self.description,
             is_income=self.is_income,
-            date=self.execution_date,
+            date=date,
         )
 
-    def get_next_execution_date(self):
+    def due_occurrences(self, until):
+        """
+        Dates of every occurrence due up to until, and the execution date following them (None when over)
+        """
+        dates = []
+        next_date = self.execution_date
+        while next_date is not None and next_date <= until:
+            dates.append(next_date)
+            next_date = self._next_date(next_date)
+        return dates, next_date
+
+    def _next_date(self, date):
 
         if self.frequency == FutureTransaction.Frequency.ONCE:
             return None
 
         if self.frequency == FutureTransaction.Frequency.DAILY:
-            return self.execution_date + timedelta(days=1)
+            return date + timedelta(days=1)
         elif self.frequency == FutureTransaction.Frequency.WEEKLY:
-            return self.execution_date + timedelta(weeks=1)
+            return date + timedelta(weeks=1)
         elif self.frequency == FutureTransaction.Frequency.MONTHLY:
-            return self.execution_date + relativedelta(months=+1)
+            return date + relativedelta(months=+1)
         elif self.frequency == FutureTransaction.Frequency.YEARLY:
-            return self.execution_date + relativedelta(years=+1)
+            return date + relativedelta(years=+1)
 
         return None
+
+
+class ReportJob(models.Model):
+    """
+    A PDF report queued by a wallet member and rendered by the report workers
+    """
+    class Period(models.TextChoices):
+        MONTHLY = "monthly", _("monthly")
+        QUARTERLY = "quarterly", _("quarterly")
+        ANNUAL = "annual", _("annual")
+
+    class Status(models.TextChoices):
+        PENDING = "pending", _("pending")
+        RUNNING = "running", _("running")
+        DONE = "done", _("done")
+        FAILED = "failed", _("failed")
+
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='report_jobs', verbose_name=_("wallet"))
+    requested_by = models.ForeignKey('account.Account', on_delete=models.CASCADE, related_name='report_jobs', verbose_name=_("requested_by"))
+    period = models.CharField(max_length=10, choices=Period.choices, verbose_name=_("period"))
+    start_date = models.DateTimeField(verbose_name=_("start_date"))
+    end_date = models.DateTimeField(verbose_name=_("end_date"))
+    language = models.CharField(max_length=10, verbose_name=_("language"))
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING, verbose_name=_("status"))
+    file_path = models.CharField(max_length=255, blank=True, verbose_name=_("file_path"))
+    file_size = models.PositiveBigIntegerField(default=0, verbose_name=_("file_size"))
+    cache_key = models.CharField(max_length=64, blank=True, default='', verbose_name=_("cache_key"))
+    last_accessed_at = models.DateTimeField(null=True, blank=True, verbose_name=_("last_accessed_at"))
+    error = models.TextField(blank=True, verbose_name=_("error"))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_("attempts"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("created_at"))
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name=_("started_at"))
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name=_("finished_at"))
+
+    class Meta:
+        verbose_name = _("report job")
+        verbose_name_plural = _("report jobs")
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='report_job_queue_idx'),
+            models.Index(fields=['wallet', 'cache_key'], name='report_job_cache_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_period_display()} - {self.wallet_id} ({self.status})"
+
+
+class SchedulerLease(models.Model):
+    """
+    Leader lock of the scheduler: the process holding an unexpired lease is the only one running jobs.
+    The leader renews it well before it expires, so a crashed leader is replaced after at most one lease
+    """
+    name = models.CharField(max_length=50, primary_key=True, verbose_name=_("name"))
+    holder = models.CharField(max_length=255, verbose_name=_("holder"))
+    expires_at = models.DateTimeField(verbose_name=_("expires_at"))
+
+    class Meta:
+        verbose_name = _("scheduler lease")
+        verbose_name_plural = _("scheduler leases")
+
+    def __str__(self):
+        return f"{self.name} - {self.holder} (until {self.expires_at})"
+
+    @classmethod
+    def acquire(cls, name, holder, duration):
+        """
+        Take or renew the lease, False when another holder has it
+        """
+        now = timezone.now()
+        taken = (
+            cls.objects
+            .filter(name=name)
+            .filter(models.Q(holder=holder) | models.Q(expires_at__lte=now))
+            .update(holder=holder, expires_at=now + duration)
+        )
+        if taken:
+            return True
+
+        try:
+            with db_transaction.atomic():
+                cls.objects.create(name=name, holder=holder, expires_at=now + duration)
+        except IntegrityError:
+            return False
+        return True
+
+    @classmethod
+    def release(cls, name, holder):
+        cls.objects.filter(name=name, holder=holder).update(expires_at=timezone.now())
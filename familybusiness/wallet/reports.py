@@ -0,0 +1,273 @@
+import hashlib
+import io
+import logging
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import F, Q, Sum, Count
+from django.db.models.functions import Coalesce
+from django.template.loader import get_template
+from django.utils import timezone, translation
+from django.utils.translation import gettext as _
+from xhtml2pdf import pisa
+
+from adminpanel.audit import log_event
+from . import rollups
+from .models import Transaction, ReportJob
+
+logger = logging.getLogger(__name__)
+
+
+def build_report_context(wallet, start_date, end_date, period_type, generated_by):
+    """
+    Gather the statistics shown in a PDF report
+    """
+    # Get transactions for the period
+    transactions = Transaction.objects.filter(
+        wallet=wallet,
+        date__gte=start_date,
+        date__lte=end_date
+    ).select_related('category', 'user').order_by('-date')
+
+    # Calculate statistics from the daily rollups
+    start_day = timezone.localdate(start_date)
+    end_day = timezone.localdate(end_date)
+    period_income, period_expenses = rollups.period_totals(wallet, start_day, end_day)
+
+    net_result = period_income - period_expenses
+
+    # Statistics by category (expenses only)
+    category_stats = rollups.category_breakdown(wallet, start_day, end_day)
+
+    # Statistics by user
+    user_totals = (
+        transactions
+        .values('user_id', 'user__first_name', 'user__last_name', 'is_income')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    stats_by_user = {}
+    for row in user_totals:
+        stats = stats_by_user.setdefault(row['user_id'], {
+            'user_name': f"{row['user__first_name']} {row['user__last_name']}",
+            'income_total': 0,
+            'expense_total': 0,
+            'transaction_count': 0
+        })
+        stats['income_total' if row['is_income'] else 'expense_total'] = row['total']
+        stats['transaction_count'] += row['count']
+    user_stats = list(stats_by_user.values())
+
+    # Sort by transaction count (descending)
+    user_stats.sort(key=lambda x: x['transaction_count'], reverse=True)
+
+    return {
+        'wallet': wallet,
+        'period_type': period_type,
+        'start_date': start_date,
+        'end_date': end_date,
+        'transactions': transactions,
+        'period_income': period_income,
+        'period_expenses': period_expenses,
+        'net_result': net_result,
+        'category_stats': category_stats,
+        'user_stats': user_stats,
+        'transaction_count': sum(stats['transaction_count'] for stats in user_stats),
+        'generated_at': timezone.now(),
+        'generated_by': generated_by,
+    }
+
+
+def render_report_pdf(context):
+    """
+    Render the report template to PDF bytes, None if rendering failed
+    """
+    html = get_template('wallet/report_pdf.html').render(context)
+
+    result = io.BytesIO()
+    pdf = pisa.pisaDocument(io.BytesIO(html.encode("UTF-8")), result)
+    if pdf.err:
+        return None
+    return result.getvalue()
+
+
+def report_filename(job):
+    """
+    Name under which a finished report is downloaded
+    """
+    with translation.override(job.language):
+        period_type = job.get_period_display()
+        start_date = timezone.localtime(job.start_date)
+        end_date = timezone.localtime(job.end_date)
+        return f"{_('report')}_{period_type}_{job.wallet.name}_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.pdf"
+
+
+def report_cache_key(wallet, period, start_date, end_date, language):
+    """
+    Key of a report in the cache: the wallet, the period bounds (by day) and the wallet's data version,
+    which changes with any of its transactions, members, categories or objective
+    """
+    start_day = timezone.localdate(start_date)
+    end_day = timezone.localdate(end_date)
+    key = f"{wallet.id}|{wallet.name}|{period}|{start_day}|{end_day}|{wallet.data_version}|{language}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def find_cached_job(wallet, cache_key):
+    """
+    Return a finished job for the same report, or one queued or running since less than REPORT_JOB_TIMEOUT,
+    if any. Older ones were probably abandoned by their worker
+    """
+    stale = stale_before()
+    job = (
+        ReportJob.objects
+        .filter(wallet=wallet, cache_key=cache_key)
+        .filter(
+            Q(status=ReportJob.Status.DONE)
+            | Q(status=ReportJob.Status.PENDING, created_at__gte=stale)
+            | Q(status=ReportJob.Status.RUNNING, started_at__gte=stale)
+        )
+        .order_by('-created_at')
+        .first()
+    )
+    if job is not None and job.status == ReportJob.Status.DONE and not Path(job.file_path).exists():
+        return None
+    return job
+
+
+def _delete_jobs(jobs):
+    for job in jobs:
+        Path(job.file_path).unlink(missing_ok=True)
+        job.delete()
+
+
+def evict_reports(max_bytes):
+    """
+    Delete the least recently downloaded reports, across all wallets, until the cache fits in max_bytes
+    """
+    finished = ReportJob.objects.filter(status=ReportJob.Status.DONE)
+    excess = (finished.aggregate(total=Sum('file_size'))['total'] or 0) - max_bytes
+    if excess <= 0:
+        return
+
+    evicted = []
+    for job in finished.order_by(Coalesce('last_accessed_at', 'finished_at')).iterator():
+        evicted.append(job)
+        excess -= job.file_size
+        if excess <= 0:
+            break
+    _delete_jobs(evicted)
+
+
+def purge_reports(wallet=None):
+    """
+    Delete the cached reports of a wallet, or of all wallets
+    """
+    finished = ReportJob.objects.filter(status=ReportJob.Status.DONE)
+    if wallet is not None:
+        finished = finished.filter(wallet=wallet)
+    _delete_jobs(list(finished))
+
+
+def stale_before():
+    """
+    Start date before which a running job is considered abandoned by its worker
+    """
+    return timezone.now() - timedelta(seconds=settings.REPORT_JOB_TIMEOUT)
+
+
+def recover_stale_jobs():
+    """
+    Queue again the jobs left running by a worker that crashed or was killed,
+    or fail them once they have been claimed REPORT_JOB_MAX_ATTEMPTS times
+    """
+    stale = ReportJob.objects.filter(status=ReportJob.Status.RUNNING, started_at__lt=stale_before())
+    stale.filter(attempts__gte=settings.REPORT_JOB_MAX_ATTEMPTS).update(
+        status=ReportJob.Status.FAILED,
+        error=f"Abandoned after {settings.REPORT_JOB_MAX_ATTEMPTS} attempts",
+        finished_at=timezone.now(),
+    )
+    stale.filter(attempts__lt=settings.REPORT_JOB_MAX_ATTEMPTS).update(status=ReportJob.Status.PENDING, started_at=None)
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest pending job to running, so each job is rendered by a single worker
+    """
+    recover_stale_jobs()
+    while True:
+        job_id = (
+            ReportJob.objects
+            .filter(status=ReportJob.Status.PENDING)
+            .order_by('created_at')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+
+        claimed = ReportJob.objects.filter(id=job_id, status=ReportJob.Status.PENDING).update(
+            status=ReportJob.Status.RUNNING,
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return ReportJob.objects.select_related('wallet', 'requested_by').get(id=job_id)
+
+
+def run_job(job):
+    """
+    Render a claimed job and store the PDF under REPORTS_ROOT
+    """
+    with translation.override(job.language):
+        period_type = job.get_period_display()
+        try:
+            context = build_report_context(
+                job.wallet, job.start_date, job.end_date, period_type, job.requested_by
+            )
+            pdf = render_report_pdf(context)
+        except Exception as e:
+            logger.exception("Report job %s failed", job.id)
+            pdf = None
+            job.error = str(e)
+
+        if pdf is None:
+            job.status = ReportJob.Status.FAILED
+            job.error = job.error or _("error_generating_report")
+        else:
+            path = settings.REPORTS_ROOT / str(job.wallet_id) / f"{job.id}.pdf"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(pdf)
+
+            job.status = ReportJob.Status.DONE
+            job.file_path = str(path)
+            job.file_size = len(pdf)
+
+            log_event(
+                content=_("report_generated") + f" ({period_type}): {job.wallet.name}",
+                user=job.requested_by,
+                type='REPORT_GENERATE'
+            )
+
+    job.finished_at = timezone.now()
+    job.last_accessed_at = job.finished_at
+    job.save(update_fields=['status', 'file_path', 'file_size', 'error', 'finished_at', 'last_accessed_at'])
+
+    evict_reports(settings.REPORT_CACHE_MAX_BYTES)
+
+
+def work(poll_interval, once=False):
+    """
+    Worker loop: render pending jobs, sleep when the queue is empty
+    """
+    while True:
+        job = claim_next_job()
+        if job is not None:
+            run_job(job)
+            continue
+
+        if once:
+            return
+        time.sleep(poll_interval)
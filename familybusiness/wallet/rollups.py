@@ -0,0 +1,82 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Sum
+
+from .models import WalletDailyRollup
+
+
+def _rollups(wallet, start_day=None, end_day=None):
+    rollups = WalletDailyRollup.objects.filter(wallet=wallet)
+    if start_day is not None:
+        rollups = rollups.filter(day__gte=start_day)
+    if end_day is not None:
+        rollups = rollups.filter(day__lte=end_day)
+    return rollups
+
+
+def period_totals(wallet, start_day=None, end_day=None):
+    """
+    Return the (income, expenses) totals of a wallet over a range of days
+    """
+    totals = {True: 0, False: 0}
+    rows = (
+        _rollups(wallet, start_day, end_day)
+        .values('is_income')
+        .annotate(total=Sum('total'))
+        .order_by()
+    )
+    for row in rows:
+        totals[row['is_income']] = row['total'] or 0
+    return totals[True], totals[False]
+
+
+def transaction_count(wallet, category_id=None, is_income=None):
+    """
+    Number of transactions of a wallet, optionally filtered by category and type
+    """
+    rollups = _rollups(wallet)
+    if category_id is not None:
+        rollups = rollups.filter(category_id=category_id)
+    if is_income is not None:
+        rollups = rollups.filter(is_income=is_income)
+    return rollups.aggregate(total=Sum('count'))['total'] or 0
+
+
+def daily_series(wallet, start_day, end_day):
+    """
+    Return the labels, incomes and expenses of every day in the range, for Chart.js
+    """
+    daily_data = defaultdict(lambda: {'income': 0, 'expense': 0})
+    rows = (
+        _rollups(wallet, start_day, end_day)
+        .values('day', 'is_income')
+        .annotate(total=Sum('total'))
+        .order_by()
+    )
+    for row in rows:
+        daily_data[row['day']]['income' if row['is_income'] else 'expense'] += float(row['total'])
+
+    dates = []
+    incomes = []
+    expenses = []
+    for i in range((end_day - start_day).days + 1):
+        day = start_day + timedelta(days=i)
+        dates.append(day.strftime('%d/%m'))
+        incomes.append(daily_data[day]['income'])
+        expenses.append(daily_data[day]['expense'])
+
+    return dates, incomes, expenses
+
+
+def category_breakdown(wallet, start_day=None, end_day=None, is_income=False):
+    """
+    Totals and counts per category, largest first
+    """
+    return (
+        _rollups(wallet, start_day, end_day)
+        .filter(is_income=is_income, count__gt=0)
+        .values('category_id', 'category__name')
+        .annotate(total=Sum('total'), count=Sum('count'))
+        .order_by('-total')
+    )
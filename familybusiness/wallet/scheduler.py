@@ -1,25 +1,134 @@
-from apscheduler.schedulers.background import BackgroundScheduler
-from django_apscheduler.jobstores import DjangoJobStore, register_events
+import heapq
+import logging
+import select
+import socket
+import time
 
-from familybusiness import settings
+from django.conf import settings
+from django.utils import timezone
+
+from wallet.models import FutureTransaction
 from wallet.tasks import execute_future_transaction
 
-scheduler = BackgroundScheduler(
-    executors=settings.SCHEDULER_EXECUTORS,
-    job_defaults=settings.SCHEDULER_JOB_DEFAULTS,
-)
-
-def start():
-    scheduler.add_jobstore(DjangoJobStore(), 'default')
-
-    scheduler.add_job(
-        execute_future_transaction,
-        trigger='interval',
-        minutes=1,
-        id="execute_future_transaction",
-        name="Execute Future Transaction",
-        replace_existing=True
-    )
-
-    register_events(scheduler)
-    scheduler.start()
+logger = logging.getLogger(__name__)
+
+
+def notify(future_transaction_id):
+    """
+    Wake the scheduler up so it reloads a created, edited or deleted future transaction.
+    The leader may run on any of the configured hosts, each one gets the datagram
+    """
+    payload = str(future_transaction_id).encode()
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for address in settings.SCHEDULER_NOTIFY_ADDRESSES:
+            try:
+                sock.sendto(payload, address)
+            except OSError:
+                # The scheduler catches up on its next resync
+                logger.warning("Could not notify the scheduler on %s:%s of future transaction %s",
+                               *address, future_transaction_id)
+
+
+class DueScheduler:
+    """
+    Min-heap of the upcoming execution dates, only run by the process holding the scheduler lease.
+    It sleeps until the earliest date and wakes up early on a notification (see notify), or only
+    polls every max_sleep when the notification address cannot be bound.
+    Entries are never updated in place: a heap entry is stale once it differs from self.dates.
+    """
+
+    def __init__(self, address=None, max_sleep=None):
+        self.dates = {}
+        self.heap = []
+        self.max_sleep = max_sleep or settings.SCHEDULER_MAX_SLEEP
+        self.resync_at = 0
+
+        address = address or settings.SCHEDULER_BIND_ADDRESS
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self.socket.bind(address)
+        except OSError as e:
+            logger.warning("Could not listen for notifications on %s:%s (%s), polling every %ss",
+                           *address, e, self.max_sleep)
+            self.socket.close()
+            self.socket = None
+        else:
+            self.socket.setblocking(False)
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+
+    def reload(self):
+        """
+        Read every upcoming date, also done every max_sleep in case a notification was lost
+        """
+        self.dates = dict(FutureTransaction.objects.filter(active=True).values_list('id', 'execution_date'))
+        self.heap = [(date, future_transaction_id) for future_transaction_id, date in self.dates.items()]
+        heapq.heapify(self.heap)
+        self.resync_at = time.monotonic() + self.max_sleep
+
+    def refresh(self, ids):
+        dates = dict(FutureTransaction.objects.filter(id__in=ids, active=True).values_list('id', 'execution_date'))
+        for future_transaction_id in ids:
+            date = dates.get(future_transaction_id)
+            if date is None:
+                self.dates.pop(future_transaction_id, None)
+            elif self.dates.get(future_transaction_id) != date:
+                self.dates[future_transaction_id] = date
+                heapq.heappush(self.heap, (date, future_transaction_id))
+
+    def next_date(self):
+        while self.heap and self.dates.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def wait(self, timeout):
+        """
+        Sleep up to timeout seconds, return the ids received in notifications
+        """
+        ids = set()
+        if self.socket is None:
+            time.sleep(max(timeout, 0))
+            return ids
+
+        ready, _, _ = select.select([self.socket], [], [], max(timeout, 0))
+        while ready:
+            try:
+                data = self.socket.recv(64)
+            except BlockingIOError:
+                break
+            try:
+                ids.add(int(data))
+            except ValueError:
+                continue
+        return ids
+
+    def run_for(self, seconds):
+        """
+        Execute the due occurrences for the given time, then return so the caller can renew its lease
+        """
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            if time.monotonic() >= self.resync_at:
+                self.reload()
+
+            next_date = self.next_date()
+            now = timezone.now()
+            if next_date is not None and next_date <= now:
+                metrics = execute_future_transaction()
+                self.reload()
+                if not metrics['occurrences']:
+                    # Still due but not executed (database locked), do not spin on it
+                    ids = self.wait(1)
+                    if ids:
+                        self.refresh(ids)
+                continue
+
+            timeout = min(deadline, self.resync_at) - time.monotonic()
+            if next_date is not None:
+                timeout = min(timeout, (next_date - now).total_seconds())
+
+            ids = self.wait(timeout)
+            if ids:
+                self.refresh(ids)
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+
+from .decorators import membership_cache_key
+from .models import Wallet
+
+
+@receiver(m2m_changed, sender=Wallet.users.through)
+def forget_memberships(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop the cached memberships of the users added to or removed from a wallet,
+    and the cached fragments of the wallets whose members changed
+    """
+    if action == 'pre_clear':
+        # pk_set is not given on clear, the members are read before they are removed
+        if reverse:
+            user_ids, wallet_ids = [instance.pk], list(instance.wallets.values_list('id', flat=True))
+        else:
+            user_ids, wallet_ids = list(instance.users.values_list('id', flat=True)), [instance.pk]
+    elif action in ('post_add', 'post_remove'):
+        user_ids, wallet_ids = ([instance.pk], pk_set) if reverse else (pk_set, [instance.pk])
+    else:
+        return
+
+    cache.delete_many([membership_cache_key(user_id) for user_id in user_ids])
+    for wallet_id in wallet_ids:
+        Wallet.touch(wallet_id)
+
+
+@receiver(pre_delete, sender=Wallet)
+def forget_wallet_memberships(sender, instance, **kwargs):
+    """
+    The members of a deleted wallet are removed by the cascade, without m2m_changed
+    """
+    user_ids = instance.users.values_list('id', flat=True)
+    cache.delete_many([membership_cache_key(user_id) for user_id in user_ids])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def refresh_member_names(sender, instance, created, update_fields, **kwargs):
+    """
+    Member names are shown on the cached wallet pages and reports of the user's wallets.
+    Saves of other fields only, such as last_login, are skipped
+    """
+    if created or (update_fields is not None and not {'first_name', 'last_name'} & set(update_fields)):
+        return
+    Wallet.objects.filter(users=instance).update(data_version=F('data_version') + 1)
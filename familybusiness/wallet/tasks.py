@@ -1,46 +1,91 @@
 import logging
 import time
+from datetime import timedelta
 
 from django.db import transaction, OperationalError
-from django.utils import timezone
 from django.utils.timezone import now
-from .models import FutureTransaction
+
+from familybusiness.db import retry_on_lock, is_lock_error
+from .models import FutureTransaction, Transaction
 
 logger = logging.getLogger(__name__)
 
+# Lag above which a run is logged as a warning
+LAG_WARNING = timedelta(minutes=5)
+
 def execute_future_transaction():
+    """
+    Create every occurrence due up to now, including the ones missed while the scheduler was down.
+    Each wallet is caught up in a single transaction, returns metrics on the run
+    """
     logger.info("Running scheduled future transaction")
+    started = time.monotonic()
     now_time = now()
 
-    transactions = FutureTransaction.objects.filter(active=True, execution_date__lte=now_time)
+    wallet_ids = (
+        FutureTransaction.objects
+        .filter(active=True, execution_date__lte=now_time)
+        .values_list('wallet_id', flat=True)
+        .distinct()
+        .order_by()
+    )
+
+    metrics = {'wallets': 0, 'future_transactions': 0, 'occurrences': 0, 'max_lag': timedelta(0)}
+    for wallet_id in wallet_ids:
+        safe_execute_wallet(wallet_id, now_time, metrics)
+    metrics['duration'] = time.monotonic() - started
 
-    for trx in transactions:
-        with transaction.atomic():
-            trx = FutureTransaction.objects.select_for_update().get(id=trx.id)
+    if metrics['occurrences']:
+        level = logging.WARNING if metrics['max_lag'] > LAG_WARNING else logging.INFO
+        logger.log(
+            level,
+            "Created %s occurrence(s) of %s future transaction(s) in %s wallet(s) in %.2fs, up to %s behind",
+            metrics['occurrences'], metrics['future_transactions'], metrics['wallets'],
+            metrics['duration'], metrics['max_lag'],
+        )
+    return metrics
 
-            if not trx.active or trx.execution_date > timezone.now():
-                continue
 
-            safe_create_transaction(trx)
+def execute_wallet(wallet_id, now_time):
+    """
+    Catch up the due future transactions of a wallet, returns the counts of this wallet
+    """
+    counts = {'wallets': 1, 'future_transactions': 0, 'occurrences': 0, 'max_lag': timedelta(0)}
+    with transaction.atomic():
+        due = FutureTransaction.objects.select_for_update().filter(
+            wallet_id=wallet_id, active=True, execution_date__lte=now_time
+        )
 
-            next_date = trx.get_next_execution_date()
+        created = []
+        for trx in due:
+            dates, next_date = trx.due_occurrences(now_time)
+            created.extend(trx.build_transaction(date) for date in dates)
+            counts['max_lag'] = max(counts['max_lag'], now_time - dates[0])
+            counts['future_transactions'] += 1
 
+            # Advanced once, past every created occurrence
             if next_date:
                 trx.execution_date = next_date
             else:
                 trx.active = False
+            trx.save(update_fields=['execution_date', 'active'])
 
-            trx.save()
+        Transaction.bulk_add(created)
 
-def safe_create_transaction(trx, retries=3):
-    for i in range(retries):
-        try:
-            trx.create_transaction()
-            return
-        except OperationalError as e:
-            if "database is locked" in str(e):
-                time.sleep(1)
-            else:
-                raise
+    counts['occurrences'] = len(created)
+    return counts
+
+
+def safe_execute_wallet(wallet_id, now_time, metrics):
+    try:
+        # Counted once the wallet is committed, a retried attempt must not add up twice
+        counts = retry_on_lock(execute_wallet)(wallet_id, now_time)
+    except OperationalError as e:
+        if not is_lock_error(e):
+            raise
+        logger.error("Failed to create the transactions of wallet %s after retries", wallet_id)
+        return
 
-    print("Failed to create transaction after retries")
\ No newline at end of file
+    metrics['max_lag'] = max(metrics['max_lag'], counts.pop('max_lag'))
+    for key, count in counts.items():
+        metrics[key] += count
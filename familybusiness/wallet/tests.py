@@ -1 +1,619 @@
-from django.test import TestCase
+import socket
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from account.models import Account
+from . import importers, scheduler, tasks
+from .models import Wallet, Transaction, WalletDailyRollup, Category, FutureTransaction
+from .views import TRANSACTIONS_PAGE_SIZE
+
+
+def local_datetime(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+@override_settings(AUDIT_SYNC=True)
+class WalletTestCase(TestCase):
+    """
+    A wallet with two categories, shared by the tests of the wallet data
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user('owner@example.com', "Owner", "Test", 'password')
+        cls.wallet = Wallet.objects.create(name="Wallet", owner=cls.user, initial_balance=Decimal('100.00'), balance=Decimal('100.00'))
+        cls.wallet.users.add(cls.user)
+        cls.other_wallet = Wallet.objects.create(name="Other", owner=cls.user)
+        cls.food = Category.objects.create(name="Food")
+        cls.salary = Category.objects.create(name="Salary")
+
+    def add(self, amount, date, category=None, is_income=False, wallet=None):
+        return Transaction.objects.create(
+            title="Transaction",
+            category=category or self.food,
+            user=self.user,
+            amount=Decimal(amount),
+            date=date,
+            wallet=wallet or self.wallet,
+            is_income=is_income,
+        )
+
+    def rollups(self):
+        """
+        The rollup rows still counting transactions, as {(wallet, day, category, is_income): (total, count)}
+        """
+        return {
+            (wallet_id, day, category_id, is_income): (total.quantize(Decimal('0.01')), count)
+            for wallet_id, day, category_id, is_income, total, count in WalletDailyRollup.objects.filter(
+                count__gt=0
+            ).values_list('wallet_id', 'day', 'category_id', 'is_income', 'total', 'count')
+        }
+
+    def assertBalancesReconciled(self):
+        """
+        Every balance equals the initial balance plus the transactions
+        """
+        for wallet in Wallet.objects.all():
+            net = sum((trx.signed_amount for trx in wallet.transactions.all()), Decimal(0))
+            self.assertEqual(wallet.balance, wallet.initial_balance + net, wallet.name)
+
+    def assertRollupsRebuilt(self):
+        """
+        The rollups kept up to date match the rollups recomputed from the transactions
+        """
+        kept = self.rollups()
+        WalletDailyRollup.rebuild()
+        self.assertEqual(kept, self.rollups())
+
+
+class WalletDailyRollupTest(WalletTestCase):
+
+    def test_save_adds_to_the_local_day(self):
+        # 00:30 in Paris is the previous day in UTC
+        self.add('10.00', local_datetime(2025, 3, 1, 0, 30))
+        self.add('5.50', local_datetime(2025, 3, 1, 8, 0))
+        self.add('1000.00', local_datetime(2025, 3, 1, 9, 0), category=self.salary, is_income=True)
+
+        self.assertEqual(self.rollups(), {
+            (self.wallet.id, datetime(2025, 3, 1).date(), self.food.id, False): (Decimal('15.50'), 2),
+            (self.wallet.id, datetime(2025, 3, 1).date(), self.salary.id, True): (Decimal('1000.00'), 1),
+        })
+        self.assertRollupsRebuilt()
+
+    def test_edit_moves_the_transaction(self):
+        trx = self.add('10.00', local_datetime(2025, 3, 1, 0, 30))
+        self.add('4.00', local_datetime(2025, 3, 1, 13, 0))
+
+        trx.amount = Decimal('12.00')
+        trx.save()
+        self.assertRollupsRebuilt()
+
+        trx.date = local_datetime(2025, 3, 2, 0, 30)
+        trx.save()
+        self.assertRollupsRebuilt()
+
+        trx.category = self.salary
+        trx.is_income = True
+        trx.save()
+        self.assertRollupsRebuilt()
+
+        trx.wallet = self.other_wallet
+        trx.save()
+        self.assertRollupsRebuilt()
+
+    def test_delete_removes_the_transaction(self):
+        trx = self.add('10.00', local_datetime(2025, 3, 1, 0, 30))
+        self.add('4.00', local_datetime(2025, 3, 1, 13, 0))
+
+        Transaction.objects.get(pk=trx.pk).delete()
+        self.assertEqual(self.rollups(), {
+            (self.wallet.id, datetime(2025, 3, 1).date(), self.food.id, False): (Decimal('4.00'), 1),
+        })
+        self.assertRollupsRebuilt()
+
+    def test_bulk_add(self):
+        self.add('3.00', local_datetime(2025, 3, 1, 12, 0))
+        Transaction.bulk_add([
+            Transaction(title="Bulk", category=self.food, user=self.user, amount=Decimal('2.25'),
+                        date=local_datetime(2025, 3, day, 0, 15), wallet=wallet)
+            for day in (1, 1, 2, 3)
+            for wallet in (self.wallet, self.other_wallet)
+        ])
+        self.assertRollupsRebuilt()
+
+    def test_import(self):
+        self.add('3.00', local_datetime(2025, 3, 1, 12, 0))
+        rows, errors = importers.parse_csv(
+            "date;title;amount;category\n"
+            "01/03/2025 00:30;Groceries;-12,50;Food\n"
+            "2025-03-01;Refund;4,00;food\n"
+            "02/03/2025;Salary;1.500,00;Salary\n"
+            "03/03/2025;Unknown;-1,00;Hobbies\n"
+        )
+        self.assertEqual(errors, [])
+
+        importers.import_statement(self.wallet, self.user, rows, self.food)
+        self.assertRollupsRebuilt()
+
+    def test_rebuild_command_bumps_the_data_version(self):
+        self.add('3.00', local_datetime(2025, 3, 1, 12, 0))
+        WalletDailyRollup.objects.update(total=Decimal('999.00'))
+        data_versions = dict(Wallet.objects.values_list('id', 'data_version'))
+
+        call_command('rebuild_rollups', '--wallet', str(self.wallet.id), stdout=StringIO())
+        self.assertEqual(self.rollups(), {
+            (self.wallet.id, datetime(2025, 3, 1).date(), self.food.id, False): (Decimal('3.00'), 1),
+        })
+        self.assertEqual(dict(Wallet.objects.values_list('id', 'data_version')), {
+            self.wallet.id: data_versions[self.wallet.id] + 1,
+            self.other_wallet.id: data_versions[self.other_wallet.id],
+        })
+
+
+class WalletBalanceTest(WalletTestCase):
+
+    def test_save_edit_and_delete(self):
+        trx = self.add('10.00', local_datetime(2025, 3, 1, 12, 0))
+        self.add('1000.00', local_datetime(2025, 3, 1, 13, 0), category=self.salary, is_income=True)
+        self.assertBalancesReconciled()
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('1090.00'))
+
+        trx.amount = Decimal('25.00')
+        trx.save()
+        self.assertBalancesReconciled()
+
+        trx.is_income = True
+        trx.save()
+        self.assertBalancesReconciled()
+
+        trx.wallet = self.other_wallet
+        trx.save()
+        self.assertBalancesReconciled()
+
+        Transaction.objects.get(pk=trx.pk).delete()
+        self.assertBalancesReconciled()
+
+    def test_category_deletion(self):
+        self.add('10.00', local_datetime(2025, 3, 1, 12, 0))
+        self.add('1000.00', local_datetime(2025, 3, 1, 13, 0), category=self.salary, is_income=True)
+        self.add('5.00', local_datetime(2025, 3, 1, 14, 0), category=self.salary, wallet=self.other_wallet)
+
+        # The transactions deleted by the cascade are taken out of the balances
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self.client.post(reverse('adminpanel:delete_category', args=[self.salary.id]), {'action': 'delete'})
+        self.assertFalse(Category.objects.filter(pk=self.salary.pk).exists())
+        self.assertBalancesReconciled()
+
+    def test_user_deletion(self):
+        member = Account.objects.create_user('member@example.com', "Member", "Test", 'password')
+        self.wallet.users.add(member)
+        self.add('10.00', local_datetime(2025, 3, 1, 12, 0))
+        for amount, is_income in (('30.00', False), ('200.00', True)):
+            Transaction.objects.create(title="Member", category=self.food, user=member, amount=Decimal(amount),
+                                       date=local_datetime(2025, 3, 2, 12, 0), wallet=self.wallet, is_income=is_income)
+
+        # The transactions of the member in the shared wallet are deleted by the cascade
+        data_version = Wallet.objects.get(pk=self.wallet.pk).data_version
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self.client.post(reverse('adminpanel:delete_user', args=[member.id]))
+        self.assertFalse(Account.objects.filter(pk=member.pk).exists())
+        self.assertEqual(self.wallet.transactions.count(), 1)
+        self.assertBalancesReconciled()
+        self.assertRollupsRebuilt()
+        # Cached fragments and reports are rendered again
+        self.assertGreater(Wallet.objects.get(pk=self.wallet.pk).data_version, data_version)
+
+    def test_bulk_add_and_import(self):
+        Transaction.bulk_add([
+            Transaction(title="Bulk", category=self.food, user=self.user, amount=Decimal('2.25'),
+                        date=local_datetime(2025, 3, 1, 12, 0), wallet=wallet, is_income=wallet == self.other_wallet)
+            for wallet in (self.wallet, self.wallet, self.other_wallet)
+        ])
+        self.assertBalancesReconciled()
+
+        rows, errors = importers.parse_csv("date;title;amount\n01/03/2025;Shop;-12,50\n02/03/2025;Salary;1.500,00\n")
+        importers.import_statement(self.wallet, self.user, rows, self.food)
+        self.assertBalancesReconciled()
+
+    def test_reconcile_balances(self):
+        self.add('10.00', local_datetime(2025, 3, 1, 12, 0))
+        Wallet.objects.filter(pk=self.wallet.pk).update(balance=Decimal('42.00'))
+
+        output = StringIO()
+        call_command('reconcile_balances', stdout=output)
+        self.assertIn("drift +48.00", output.getvalue())
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('42.00'))
+
+        call_command('reconcile_balances', '--fix', stdout=StringIO())
+        self.assertBalancesReconciled()
+
+        output = StringIO()
+        call_command('reconcile_balances', stdout=output)
+        self.assertIn("All balances are consistent", output.getvalue())
+
+
+class TransactionPaginationTest(WalletTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Most transactions share the same date, only the id orders them
+        same_date = local_datetime(2025, 3, 1, 12, 0)
+        dates = [same_date] * (2 * TRANSACTIONS_PAGE_SIZE + 10) + [
+            same_date + timedelta(minutes=minutes) for minutes in (-60, -1, 1, 60)
+        ]
+        Transaction.bulk_add([
+            Transaction(title=f"Transaction {index}", category=cls.salary if index % 3 else cls.food, user=cls.user,
+                        amount=Decimal('1.00'), date=date, wallet=cls.wallet, is_income=index % 2 == 0)
+            for index, date in enumerate(dates)
+        ])
+
+    def setUp(self):
+        # Fragments are keyed on the wallet id and data version, which repeat between tests
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def read_pages(self, **filters):
+        url = reverse('wallet:transaction_list', args=[self.wallet.id])
+        ids, cursor, pages = [], None, 0
+        while True:
+            response = self.client.get(url, {**filters, 'cursor': cursor} if cursor else filters)
+            self.assertEqual(response.status_code, 200)
+            ids += [trx.id for trx in response.context['transactions']]
+            cursor = response.context['next_cursor']
+            pages += 1
+            if not cursor:
+                return ids, pages
+
+    def test_pages_cover_every_transaction_once(self):
+        ids, pages = self.read_pages()
+        expected = list(self.wallet.transactions.order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_pages_keep_the_filters(self):
+        ids, _pages = self.read_pages(type='expense', category=self.salary.id)
+        expected = list(
+            self.wallet.transactions.filter(is_income=False, category=self.salary)
+            .order_by('-date', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_load_more(self):
+        url = reverse('wallet:transaction_list', args=[self.wallet.id])
+        first = self.client.get(url)
+        data = self.client.get(url, {'partial': 1, 'cursor': first.context['next_cursor']}).json()
+        self.assertEqual(data['html'].count('class="transaction-item'), TRANSACTIONS_PAGE_SIZE)
+        self.assertTrue(data['next_cursor'])
+
+    def test_invalid_cursor_starts_over(self):
+        url = reverse('wallet:transaction_list', args=[self.wallet.id])
+        first = [trx.id for trx in self.client.get(url).context['transactions']]
+        for cursor in ('garbage', 'garbage_12', '2025-03-01T12:00:00+00:00_x'):
+            response = self.client.get(url, {'cursor': cursor})
+            self.assertEqual([trx.id for trx in response.context['transactions']], first)
+
+
+class StatementParserTest(TestCase):
+
+    def parse_amounts(self, text):
+        rows, errors = importers.parse_csv(text)
+        return [row.amount for row in rows], [line for line, _message in errors]
+
+    def test_amount_formats(self):
+        amounts, errors = self.parse_amounts(
+            "Date;Libellé;Montant\n"
+            "01/03/2025;Salaire;1.234,56\n"
+            "02/03/2025;Courses;-12,00\n"
+            "03/03/2025;Loyer;\"-1 050,00 €\"\n"
+            "04/03/2025;Transfer;1,234.56\n"
+            "05/03/2025;Small;0.5\n"
+        )
+        self.assertEqual(errors, [])
+        self.assertEqual(amounts, [
+            Decimal('1234.56'), Decimal('-12.00'), Decimal('-1050.00'), Decimal('1234.56'), Decimal('0.50'),
+        ])
+
+    def test_malformed_lines_are_reported(self):
+        rows, errors = importers.parse_csv(
+            "date,title,amount\n"
+            "2025-03-01,Valid,10.00\n"
+            "2025-13-01,Bad date,10.00\n"
+            "2025-03-02,Bad amount,ten\n"
+            "2025-03-03,Too big,123456789012\n"
+            "2025-03-04\n"
+            "\n"
+            "2025-03-05,Valid too,-3\n"
+        )
+        self.assertEqual([row.title for row in rows], ["Valid", "Valid too"])
+        self.assertEqual([line for line, _message in errors], [3, 4, 5, 6])
+
+    def test_missing_columns(self):
+        with self.assertRaises(importers.StatementError):
+            importers.parse_csv("when;what\n01/03/2025;Nothing\n")
+
+    def test_ofx(self):
+        rows, errors = importers.read_statement(
+            b"OFXHEADER:100\nDATA:OFXSGML\n\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n"
+            b"<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250301120000<TRNAMT>-12,00<NAME>Courses\n"
+            b"<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250302<TRNAMT>1234.56<MEMO>Salaire</STMTTRN>\n"
+            b"<STMTTRN><DTPOSTED>2025<TRNAMT>1.00<NAME>Bad date\n"
+            b"<STMTTRN><DTPOSTED>20250303<TRNAMT>abc<NAME>Bad amount\n"
+            b"</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n"
+        )
+        self.assertEqual(
+            [(row.date, row.title, row.amount) for row in rows],
+            [(datetime(2025, 3, 1), "Courses", Decimal('-12.00')), (datetime(2025, 3, 2), "Salaire", Decimal('1234.56'))],
+        )
+        self.assertEqual([line for line, _message in errors], [3, 4])
+
+    def test_empty_ofx(self):
+        with self.assertRaises(importers.StatementError):
+            importers.parse_ofx("<OFX><BANKTRANLIST></BANKTRANLIST></OFX>")
+
+
+class StatementImportTest(WalletTestCase):
+
+    def test_reimport_own_export(self):
+        self.add('12.50', local_datetime(2025, 3, 1, 0, 30))
+        self.add('1234.56', local_datetime(2025, 3, 2, 9, 0), category=self.salary, is_income=True)
+        self.add('7.00', local_datetime(2025, 3, 3, 23, 30), category=self.salary)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('wallet:export_transactions_csv', args=[self.wallet.id]))
+        rows, errors = importers.read_statement(b''.join(response.streaming_content), 'export.csv')
+        self.assertEqual(errors, [])
+
+        importers.import_statement(self.other_wallet, self.user, rows, self.food)
+        exported = [
+            (WalletDailyRollup.local_day(trx.date), trx.category_id, trx.amount, trx.is_income)
+            for trx in Transaction.objects.filter(wallet=self.wallet).order_by('date')
+        ]
+        imported = [
+            (WalletDailyRollup.local_day(trx.date), trx.category_id, trx.amount, trx.is_income)
+            for trx in Transaction.objects.filter(wallet=self.other_wallet).order_by('date')
+        ]
+        self.assertEqual(imported, exported)
+        self.assertBalancesReconciled()
+        self.assertRollupsRebuilt()
+
+    def test_import_view(self):
+        self.client.force_login(self.user)
+        url = reverse('wallet:import_transactions', args=[self.wallet.id])
+        statement = b"date;title;amount\n01/03/2025;Shop;-12,50\n02/03/2025;Salary;1.500,00\nbad;line;1\n"
+
+        response = self.client.post(url, {
+            'file': SimpleUploadedFile('statement.csv', statement), 'category': self.food.id, 'dry_run': 'on',
+        })
+        self.assertEqual(response.context['preview']['net'], Decimal('1487.50'))
+        self.assertEqual(response.context['error_count'], 1)
+        self.assertFalse(Transaction.objects.exists())
+
+        response = self.client.post(url, {'file': SimpleUploadedFile('statement.csv', statement), 'category': self.food.id})
+        self.assertRedirects(response, reverse('wallet:transaction_list', args=[self.wallet.id]))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('1587.50'))
+        self.assertRollupsRebuilt()
+
+    def test_import_command_with_duplicate_category_names(self):
+        Category.objects.create(name=self.food.name.upper())
+        with tempfile.NamedTemporaryFile(suffix='.csv') as statement:
+            statement.write(b"date;title;amount\n01/03/2025;Shop;-12,50\n")
+            statement.flush()
+            call_command('import_transactions', str(self.wallet.id), statement.name,
+                         '--category', self.food.name, stdout=StringIO())
+            with self.assertRaises(CommandError):
+                call_command('import_transactions', str(self.wallet.id), statement.name,
+                             '--category', "missing", stdout=StringIO())
+
+        self.assertEqual(Transaction.objects.get().category, self.food)
+        self.assertBalancesReconciled()
+        self.assertRollupsRebuilt()
+
+
+class FutureTransactionCatchUpTest(WalletTestCase):
+
+    def schedule(self, execution_date, frequency, amount='10.00', wallet=None):
+        return FutureTransaction.objects.create(
+            title="Scheduled", category=self.food, user=self.user, amount=Decimal(amount),
+            wallet=wallet or self.wallet, execution_date=execution_date, frequency=frequency,
+        )
+
+    def test_missed_occurrences_are_created_at_once(self):
+        now = timezone.now()
+        daily_start = now - timedelta(days=3, hours=1)
+        monthly_start = now - relativedelta(months=2, days=1)
+        daily = self.schedule(daily_start, FutureTransaction.Frequency.DAILY)
+        monthly = self.schedule(monthly_start, FutureTransaction.Frequency.MONTHLY, wallet=self.other_wallet)
+        once = self.schedule(now - timedelta(minutes=5), FutureTransaction.Frequency.ONCE)
+        upcoming = self.schedule(now + timedelta(hours=1), FutureTransaction.Frequency.DAILY)
+
+        with self.assertLogs('wallet.tasks', 'WARNING'):
+            metrics = tasks.execute_future_transaction()
+        self.assertEqual(metrics['wallets'], 2)
+        self.assertEqual(metrics['future_transactions'], 3)
+        self.assertEqual(metrics['occurrences'], 4 + 3 + 1)
+        self.assertGreaterEqual(metrics['max_lag'], now - monthly_start)
+
+        # Each occurrence is dated on its own execution date
+        self.assertEqual(
+            list(Transaction.objects.filter(wallet=self.other_wallet).order_by('date').values_list('date', flat=True)),
+            [monthly_start, monthly_start + relativedelta(months=1), monthly_start + relativedelta(months=2)],
+        )
+
+        # The execution dates are advanced past every created occurrence
+        daily.refresh_from_db()
+        monthly.refresh_from_db()
+        once.refresh_from_db()
+        upcoming.refresh_from_db()
+        self.assertEqual(daily.execution_date, daily_start + timedelta(days=4))
+        self.assertEqual(monthly.execution_date, monthly_start + relativedelta(months=3))
+        self.assertTrue(daily.active)
+        self.assertFalse(once.active)
+        self.assertEqual(upcoming.execution_date, now + timedelta(hours=1))
+
+        self.assertBalancesReconciled()
+        self.assertRollupsRebuilt()
+
+        # Nothing is due anymore
+        with self.assertLogs('wallet.tasks', 'INFO'):
+            self.assertEqual(tasks.execute_future_transaction()['occurrences'], 0)
+        self.assertEqual(Transaction.objects.count(), 8)
+
+
+@override_settings(AUDIT_SYNC=True, DB_LOCK_RETRY_DELAY=0)
+class FutureTransactionRetryTest(TransactionTestCase):
+    """
+    Locks are only retried outside of an atomic block, so outside of a TestCase
+    """
+
+    def setUp(self):
+        user = Account.objects.create_user('owner@example.com', "Owner", "Test", 'password')
+        self.wallet = Wallet.objects.create(name="Wallet", owner=user)
+        self.execution_date = timezone.now() - timedelta(days=1, hours=1)
+        self.future_transaction = FutureTransaction.objects.create(
+            title="Scheduled", category=Category.objects.create(name="Food"), user=user, amount=Decimal('10.00'),
+            wallet=self.wallet, execution_date=self.execution_date, frequency=FutureTransaction.Frequency.DAILY,
+        )
+
+    def test_locked_wallet_is_counted_once(self):
+        bulk_add = Transaction.bulk_add
+        attempts = []
+
+        def locked_once(transactions):
+            attempts.append(len(transactions))
+            if len(attempts) == 1:
+                raise OperationalError("database is locked")
+            return bulk_add(transactions)
+
+        with mock.patch.object(Transaction, 'bulk_add', side_effect=locked_once), \
+                self.assertLogs('familybusiness.db', 'INFO'), self.assertLogs('wallet.tasks', 'INFO'):
+            metrics = tasks.execute_future_transaction()
+
+        self.assertEqual(attempts, [2, 2])
+        self.assertEqual(metrics['wallets'], 1)
+        self.assertEqual(metrics['future_transactions'], 1)
+        self.assertEqual(metrics['occurrences'], 2)
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('-20.00'))
+
+    def test_wallet_still_locked_is_not_counted(self):
+        with mock.patch.object(Transaction, 'bulk_add', side_effect=OperationalError("database is locked")), \
+                self.assertLogs('familybusiness.db', 'INFO'), self.assertLogs('wallet.tasks', 'ERROR') as logs:
+            metrics = tasks.execute_future_transaction()
+        self.assertIn("after retries", logs.output[0])
+
+        self.assertEqual(metrics['wallets'], 0)
+        self.assertEqual(metrics['occurrences'], 0)
+        self.future_transaction.refresh_from_db()
+        self.assertEqual(self.future_transaction.execution_date, self.execution_date)
+        self.assertFalse(Transaction.objects.exists())
+
+
+class DueSchedulerTest(WalletTestCase):
+
+    def setUp(self):
+        # An ephemeral port, so the tests never reach a running scheduler
+        self.scheduler = scheduler.DueScheduler(address=('127.0.0.1', 0), max_sleep=60)
+        self.addCleanup(self.scheduler.close)
+        self.now = timezone.now()
+
+    def schedule(self, execution_date, active=True):
+        return FutureTransaction.objects.create(
+            title="Scheduled", category=self.food, user=self.user, amount=Decimal('10.00'), wallet=self.wallet,
+            execution_date=execution_date, frequency=FutureTransaction.Frequency.DAILY, active=active,
+        )
+
+    def send(self, *payloads):
+        address = self.scheduler.socket.getsockname()
+        with override_settings(SCHEDULER_NOTIFY_ADDRESSES=[address]):
+            for payload in payloads:
+                if isinstance(payload, bytes):
+                    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                        sock.sendto(payload, address)
+                else:
+                    scheduler.notify(payload)
+
+    def test_next_date_is_the_earliest_active_date(self):
+        self.schedule(self.now + timedelta(hours=3))
+        earliest = self.schedule(self.now + timedelta(hours=1))
+        self.schedule(self.now + timedelta(minutes=1), active=False)
+        self.schedule(self.now + timedelta(hours=2))
+
+        self.scheduler.reload()
+        self.assertEqual(self.scheduler.next_date(), earliest.execution_date)
+
+    def test_refresh(self):
+        first = self.schedule(self.now + timedelta(hours=1))
+        second = self.schedule(self.now + timedelta(hours=2))
+        self.scheduler.reload()
+
+        # Moved later: its old heap entry is stale and skipped
+        FutureTransaction.objects.filter(pk=first.pk).update(execution_date=self.now + timedelta(hours=4))
+        self.scheduler.refresh({first.id})
+        self.assertEqual(self.scheduler.next_date(), second.execution_date)
+
+        # Created earlier
+        added = self.schedule(self.now + timedelta(minutes=30))
+        self.scheduler.refresh({added.id})
+        self.assertEqual(self.scheduler.next_date(), added.execution_date)
+
+        # Deactivated and deleted
+        FutureTransaction.objects.filter(pk=added.pk).update(active=False)
+        FutureTransaction.objects.filter(pk=second.pk).delete()
+        self.scheduler.refresh({added.id, second.id})
+        self.assertEqual(self.scheduler.next_date(), self.now + timedelta(hours=4))
+
+        FutureTransaction.objects.filter(pk=first.pk).delete()
+        self.scheduler.refresh({first.id})
+        self.assertIsNone(self.scheduler.next_date())
+
+    def test_wait_returns_the_notified_ids(self):
+        self.send(12, b'not an id', 34)
+        self.assertEqual(self.scheduler.wait(1), {12, 34})
+        self.assertEqual(self.scheduler.wait(0), set())
+
+    def test_polls_when_the_address_is_taken(self):
+        with self.assertLogs('wallet.scheduler', 'WARNING'):
+            polling = scheduler.DueScheduler(address=self.scheduler.socket.getsockname(), max_sleep=60)
+        self.addCleanup(polling.close)
+        self.assertIsNone(polling.socket)
+        self.assertEqual(polling.wait(0), set())
+
+        # The notifications still reach the scheduler that holds the address
+        self.send(12)
+        self.assertEqual(self.scheduler.wait(1), {12})
+
+    def test_notifications_during_a_locked_run_are_kept(self):
+        self.schedule(self.now - timedelta(minutes=1))
+        later = self.schedule(self.now + timedelta(hours=2))
+        self.scheduler.reload()
+
+        # The due occurrences cannot be created (database locked), a notification arrives meanwhile
+        def locked():
+            self.send(later.id)
+            return {'occurrences': 0}
+
+        with mock.patch.object(scheduler, 'execute_future_transaction', side_effect=locked), \
+                mock.patch.object(self.scheduler, 'refresh', wraps=self.scheduler.refresh) as refresh:
+            self.scheduler.run_for(0.1)
+        refresh.assert_any_call({later.id})
@@ -10,7 +10,10 @@ urlpatterns = [
     path('wallets/<int:wallet_id>/edit/', views.wallet_update, name='wallet_update'),
     path('wallets/<int:wallet_id>/delete/', views.wallet_delete, name='wallet_delete'),
     path('wallets/<int:wallet_id>/', views.wallet_detail, name='wallet_detail'),
+    path('wallets/<int:wallet_id>/charts/evolution/', views.evolution_chart_data, name='evolution_chart_data'),
+    path('wallets/<int:wallet_id>/charts/categories/', views.category_chart_data, name='category_chart_data'),
     path('wallets/<int:wallet_id>/add-transaction/', views.add_transaction, name='add_transaction'),
+    path('wallets/<int:wallet_id>/import/', views.import_transactions, name='import_transactions'),
     path('wallets/<int:wallet_id>/add-future-transaction/', views.add_future_transaction, name='add_future_transaction'),
     path('wallets/<int:wallet_id>/transactions/', views.transaction_list, name='transaction_list'),
     path('wallets/<int:wallet_id>/future-transactions/', views.future_transaction_list, name='future_transaction_list'),
@@ -32,4 +35,7 @@ urlpatterns = [
     path('<int:wallet_id>/rapport/mensuel/', views.generate_monthly_report, name='generate_monthly_report'),
     path('<int:wallet_id>/rapport/trimestriel/', views.generate_quarterly_report, name='generate_quarterly_report'),
     path('<int:wallet_id>/rapport/annuel/', views.generate_annual_report, name='generate_annual_report'),
+    path('rapport/<int:job_id>/', views.report_job, name='report_job'),
+    path('rapport/<int:job_id>/status/', views.report_job_status, name='report_job_status'),
+    path('rapport/<int:job_id>/download/', views.download_report, name='download_report'),
 ]
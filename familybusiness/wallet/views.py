@@ -1,30 +1,35 @@
-import io
-import json
-from collections import defaultdict
-from datetime import timedelta
 from decimal import Decimal
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Count
-from django.http import HttpResponse
+from django.db.models import F
+from django.http import FileResponse, Http404, HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.shortcuts import render
-from django.template.loader import get_template
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import SimpleLazyObject
+from django.utils import translation
 from django.utils.translation import gettext as _
-from xhtml2pdf import pisa
 
 from account.models import Account
-from .forms import WalletForm, TransactionForm, InvitationForm, FutureTransactionForm
-from .models import Wallet, Transaction, Category, WalletInvitation, FutureTransaction
-from adminpanel.models import Event
+from familybusiness.db import retry_on_lock
+from . import importers, reports, rollups
+from .decorators import wallet_member_required, wallet_owner_required, is_wallet_member
+from .forms import WalletForm, TransactionForm, InvitationForm, FutureTransactionForm, TransactionImportForm
+from .models import Wallet, Transaction, Category, WalletInvitation, FutureTransaction, ReportJob
+from adminpanel.audit import log_event
+
+TRANSACTIONS_PAGE_SIZE = 50
+CHART_PERIODS = ('month', 'quarter', 'year')
 
 
 @login_required(login_url='account:login')
 def wallet_list(request):
-    wallets = Wallet.objects.filter(users=request.user)
+    wallets = Wallet.objects.filter(users=request.user).select_related('owner')
     return render(request, 'wallet/wallet_list.html', {'wallets': wallets})
 
 @login_required(login_url='account:login')
@@ -34,11 +39,11 @@ def wallet_create(request):
         if form.is_valid():
             wallet = form.save(commit=False)
             wallet.owner = request.user
+            wallet.initial_balance = wallet.balance
             wallet.save()
             # Automatically add the owner to the users
             wallet.users.add(request.user)
-            Event.objects.create(
-                date=timezone.now(),
+            log_event(
                 content=_("new_wallet_created") + f": {wallet.name}",
                 user=request.user,
                 type='WALLET_CREATE'
@@ -49,25 +54,21 @@ def wallet_create(request):
     return render(request, 'wallet/wallet_form.html', {'form': form, 'title': _("create_wallet")})
 
 @login_required(login_url='account:login')
-def wallet_update(request, wallet_id):
-    wallet = Wallet.objects.get(id=wallet_id)
-    if request.user != wallet.owner:
-        messages.error(request, _("no_access_to_wallet"))
-        Event.objects.create(
-            date=timezone.now(),
-            content=_("unauthorized_wallet_modification_attempt") + f": {wallet.name}",
-            user=request.user,
-            type='ERROR'
-        )
-        return redirect('wallet:wallet_list')  # ou 403
-
+@wallet_owner_required(attempt="unauthorized_wallet_modification_attempt")
+def wallet_update(request, wallet):
     if request.method == 'POST':
         form = WalletForm(request.POST, instance=wallet)
         if form.is_valid():
-            form.save()
+            # Apply the balance edit as a delta so concurrent transactions are not overwritten
+            delta = form.cleaned_data['balance'] - form.initial['balance']
+            Wallet.objects.filter(pk=wallet.pk).update(
+                name=form.cleaned_data['name'],
+                balance=F('balance') + delta,
+                initial_balance=F('initial_balance') + delta,
+                data_version=F('data_version') + 1,
+            )
             messages.success(request, _("wallet_modified_successfully").format(wallet_name=wallet.name))
-            Event.objects.create(
-                date=timezone.now(),
+            log_event(
                 content=_("wallet_modified") + f": {wallet.name}",
                 user=request.user,
                 type='WALLET_UPDATE'
@@ -78,23 +79,12 @@ def wallet_update(request, wallet_id):
     return render(request, 'wallet/wallet_form.html', {'form': form, 'title': _("edit_wallet")})
 
 @login_required(login_url='account:login')
-def wallet_delete(request, wallet_id):
-    wallet = Wallet.objects.get(id=wallet_id)
-    if request.user != wallet.owner:
-        messages.error(request, _("not_authorized_to_delete_wallet"))
-        Event.objects.create(
-            date=timezone.now(),
-            content=_("unauthorized_wallet_deletion_attempt") + f": {wallet.name}",
-            user=request.user,
-            type='ERROR'
-        )
-        return redirect('wallet:wallet_list')
-
+@wallet_owner_required(attempt="unauthorized_wallet_deletion_attempt", message="not_authorized_to_delete_wallet")
+def wallet_delete(request, wallet):
     if request.method == 'POST':
         wallet.delete()
         messages.success(request, _("wallet_deleted_successfully").format(wallet_name=wallet.name))
-        Event.objects.create(
-            date=timezone.now(),
+        log_event(
             content=_("wallet_deleted") + f": {wallet.name}",
             user=request.user,
             type='WALLET_DELETE'
@@ -104,81 +94,16 @@ def wallet_delete(request, wallet_id):
 
 
 @login_required(login_url='account:login')
-def wallet_detail(request, wallet_id):
-    wallet = get_object_or_404(Wallet, id=wallet_id)
+@wallet_member_required(attempt="unauthorized_wallet_access_attempt")
+def wallet_detail(request, wallet):
     members = wallet.users.all()
 
-    # Check user has access to wallet
-    if request.user not in wallet.users.all():
-        messages.error(request, _("no_access_to_wallet"))
-        Event.objects.create(
-            date=timezone.now(),
-            content=_("unauthorized_wallet_access_attempt") + f": {wallet.name}",
-            user=request.user,
-            type='ERROR'
-        )
-        return redirect('wallet:wallet_list')
-
-    # Get all wallet trx
-    transactions = Transaction.objects.filter(wallet=wallet).order_by('-date')
-
-    # Recent trx
-    recent_transactions = transactions[:5]
-
-    # Compute monthly indicators
-    now = timezone.now()
-    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-    monthly_transactions = transactions.filter(date__gte=start_of_month)
-    monthly_income = monthly_transactions.filter(is_income=True).aggregate(
-        total=Sum('amount'))['total'] or 0
-    monthly_expenses = monthly_transactions.filter(is_income=False).aggregate(
-        total=Sum('amount'))['total'] or 0
-
-    # data for evolution plot (from 1st of the month to today)
-    start_of_month_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0).date()
-    today = now.date()
-    days_in_current_month = (today - start_of_month_date).days + 1
+    # Recent trx, only read when their cached fragments are stale
+    recent_transactions = Transaction.objects.filter(wallet=wallet).select_related('category', 'user').order_by('-date')[:5]
 
-    daily_data = defaultdict(lambda: {'income': 0, 'expense': 0})
-
-    for transaction in transactions.filter(date__gte=start_of_month):
-        key = transaction.date.date()
-        if transaction.is_income:
-            daily_data[key]['income'] += float(transaction.amount)
-        else:
-            daily_data[key]['expense'] += float(transaction.amount)
-
-    # prepare data for Chart.js
-    dates = []
-    expenses = []
-    incomes = []
-
-    for i in range(days_in_current_month):
-        date = start_of_month_date + timedelta(days=i)
-        dates.append(date.strftime('%d/%m'))
-        expenses.append(daily_data[date]['expense'])
-        incomes.append(daily_data[date]['income'])
-
-    # data for category plot
-    cat_data = (
-        transactions.filter(is_income=False)
-        .values('category')  # group by category ID
-        .annotate(total=Sum('amount'))
-        .order_by('category')
-    )
-    categories = {
-        c.id: c.name for c in Category.objects.filter(
-            id__in=[entry['category'] for entry in cat_data]
-        )
-    }
-    category_labels = [categories[entry['category']] for entry in cat_data]
-    category_values = [float(entry['total']) for entry in cat_data]
-
-    # if not data on categories, empty lists
-    if not category_labels:
-        category_labels = []
-        category_values = []
+    # Compute monthly indicators from the daily rollups, also only when rendered
+    start_of_month = timezone.localdate().replace(day=1)
+    monthly_totals = SimpleLazyObject(lambda: rollups.period_totals(wallet, start_of_month))
 
     # Get all active invites for the wallet
     active_invitations = WalletInvitation.objects.filter(
@@ -190,16 +115,9 @@ def wallet_detail(request, wallet_id):
     context = {
         'wallet': wallet,
         'recent_transactions': recent_transactions,
-        'monthly_income': monthly_income,
-        'monthly_expenses': monthly_expenses,
-
-        # plot data (JSON format for JavaScript)
-        'chart_dates': json.dumps(dates),
-        'chart_incomes': json.dumps(incomes),
-        'chart_expenses': json.dumps(expenses),
-        'category_labels': json.dumps(category_labels),
-        'category_values': json.dumps(category_values),
-
+        'monthly_income': SimpleLazyObject(lambda: monthly_totals[0]),
+        'monthly_expenses': SimpleLazyObject(lambda: monthly_totals[1]),
+        'month': start_of_month,
         'members': members,
         'active_invitations': active_invitations,
         'invitation_form': InvitationForm(),
@@ -208,24 +126,81 @@ def wallet_detail(request, wallet_id):
     return render(request, 'wallet/wallet_detail.html', context)
 
 
+def _period_start(period, today):
+    """
+    Private function returning the first day of a chart period, None for all time
+    """
+    if period == 'month':
+        return today.replace(day=1)
+    if period == 'quarter':
+        return today.replace(month=(today.month - 1) // 3 * 3 + 1, day=1)
+    if period == 'year':
+        return today.replace(month=1, day=1)
+    return None
+
+
+def _chart_response(request, wallet, period, build_data):
+    """
+    Private function serving chart data with a strong ETag derived from the wallet's data version,
+    so unchanged charts are answered with a 304 before any aggregation
+    """
+    today = timezone.localdate()
+    etag = f'"{wallet.id}-{wallet.data_version}-{period}-{today.isoformat()}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(build_data(wallet, _period_start(period, today), today))
+        response['ETag'] = etag
+
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 @login_required
-def generate_invitation(request, wallet_id):
+@wallet_member_required(forbidden=True)
+def evolution_chart_data(request, wallet):
     """
-    View to generate and invitation link
+    Daily incomes and expenses of the wallet for the evolution chart
     """
-    wallet = get_object_or_404(Wallet, id=wallet_id)
+    period = request.GET.get('period', 'month')
+    if period not in CHART_PERIODS:
+        period = 'month'
+
+    def build_data(wallet, start_day, today):
+        if start_day is None:
+            start_day = today.replace(day=1)
+        dates, incomes, expenses = rollups.daily_series(wallet, start_day, today)
+        return {'dates': dates, 'incomes': incomes, 'expenses': expenses}
+
+    return _chart_response(request, wallet, period, build_data)
 
-    # Check that the user trying to create the invitation is the owner
-    if request.user != wallet.owner:
-        messages.error(request, _("no_access_to_wallet"))
-        Event.objects.create(
-            date=timezone.now(),
-            content=_("unauthorized_invitation_generation_attempt") + f": {wallet.name}",
-            user=request.user,
-            type='ERROR'
-        )
-        return redirect('wallet:wallet_list')
 
+@login_required
+@wallet_member_required(forbidden=True)
+def category_chart_data(request, wallet):
+    """
+    Expenses of the wallet by category for the category chart
+    """
+    period = request.GET.get('period', 'all')
+    if period not in CHART_PERIODS + ('all',):
+        period = 'all'
+
+    def build_data(wallet, start_day, today):
+        cat_data = rollups.category_breakdown(wallet, start_day, today if start_day else None)
+        return {
+            'labels': [entry['category__name'] for entry in cat_data],
+            'values': [float(entry['total']) for entry in cat_data],
+        }
+
+    return _chart_response(request, wallet, period, build_data)
+
+
+@login_required
+@wallet_owner_required(attempt="unauthorized_invitation_generation_attempt")
+def generate_invitation(request, wallet):
+    """
+    View to generate and invitation link
+    """
     if request.method == 'POST':
         form = InvitationForm(request.POST)
         if form.is_valid():
@@ -242,8 +217,7 @@ def generate_invitation(request, wallet_id):
 
             messages.success(request, _("invitation_generated_successfully"))
 
-            Event.objects.create(
-                date=timezone.now(),
+            log_event(
                 content=_("invitation_generated") + f": {wallet.name}",
                 user=request.user,
                 type='INVITATION_CREATE'
@@ -276,7 +250,7 @@ def accept_invitation(request, token):
 
         return redirect('wallet:wallet_list')
 
-    if request.user in invitation.wallet.users.all():
+    if is_wallet_member(request.user, invitation.wallet_id):
         messages.error(request, "Already in the wallet")
         messages.info(request, _("already_member_of_wallet"))
         return redirect('wallet:wallet_detail', wallet_id=invitation.wallet.id)
@@ -292,8 +266,7 @@ def accept_invitation(request, token):
 
     messages.success(request, _("successfully_joined_wallet").format(wallet_name=invitation.wallet.name))
 
-    Event.objects.create(
-        date=timezone.now(),
+    log_event(
         content=_("member_joined_via_invitation") + f": {request.user.get_full_name()} → {invitation.wallet.name}",
         user=request.user,
         type='WALLET_JOIN'
@@ -302,23 +275,17 @@ def accept_invitation(request, token):
     return redirect('wallet:wallet_detail', wallet_id=invitation.wallet.id)
 
 @login_required
-def cancel_invitation(request, wallet_id, invitation_id):
+@wallet_owner_required
+def cancel_invitation(request, wallet, invitation_id):
     """
     View to cancel invitation
     """
-    wallet = get_object_or_404(Wallet, id=wallet_id)
     invitation = get_object_or_404(WalletInvitation, id=invitation_id, wallet=wallet)
 
-    # Check that the user trying to cancel the invitation is the owner
-    if request.user != wallet.owner:
-        messages.error(request, _("no_access_to_wallet"))
-        return redirect('wallet:wallet_list')
-
     if request.method == 'POST':
         invitation.delete()
         messages.success(request, _("invitation_cancelled_successfully"))
-        Event.objects.create(
-            date=timezone.now(),
+        log_event(
             content=_("invitation_cancelled") + f": {wallet.name}",
             user=request.user,
             type='INVITATION_CANCEL'
@@ -327,22 +294,11 @@ def cancel_invitation(request, wallet_id, invitation_id):
     return redirect('wallet:wallet_detail', wallet_id=wallet.id)
 
 @login_required
-def add_transaction(request, wallet_id):
+@wallet_member_required(attempt="unauthorized_transaction_addition_attempt")
+def add_transaction(request, wallet):
     """
     View to add a new transaction to the wallet
     """
-    wallet = get_object_or_404(Wallet, id=wallet_id)
-
-    # Check that the user is a member of the wallet
-    if request.user not in wallet.users.all():
-        messages.error(request, _("no_access_to_wallet"))
-        Event.objects.create(
-            date=timezone.now(),
-            content=_("unauthorized_transaction_addition_attempt") + f": {wallet.name}",
-            user=request.user,
-            type='ERROR'
-        )
-        return redirect('wallet:wallet_list')
 
     if request.method == 'POST':
         form = TransactionForm(request.POST)
@@ -350,19 +306,15 @@ def add_transaction(request, wallet_id):
             transaction = form.save(commit=False)
             transaction.user = request.user
             transaction.wallet = wallet
-            transaction.save()
+            # Saving the transaction also updates the wallet balance
+            retry_on_lock(transaction.save)()
 
-            # Update wallet balance
             if transaction.is_income:
-                wallet.balance += transaction.amount
                 messages.success(request, _("income_added_successfully").format(amount=transaction.amount))
             else:
-                wallet.balance -= transaction.amount
                 messages.success(request, _("expense_recorded_successfully").format(amount=transaction.amount))
 
-            wallet.save()
-            Event.objects.create(
-                date=timezone.now(),
+            log_event(
                 content=_("transaction_added") + f" ({_('expense') if not transaction.is_income else _('income')}): {transaction.title} - {transaction.amount}€",
                 user=request.user,
                 type='TRANSACTION_CREATE'
@@ -380,13 +332,59 @@ def add_transaction(request, wallet_id):
 
     return render(request, 'wallet/add_transaction.html', context)
 
+
+@login_required
+@wallet_member_required(attempt="unauthorized_transaction_addition_attempt")
+def import_transactions(request, wallet):
+    """
+    View to import a CSV or OFX bank statement into the wallet, with a preview before importing
+    """
+
+    preview = None
+    errors = []
+    if request.method == 'POST':
+        form = TransactionImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            statement = form.cleaned_data['file']
+            category = form.cleaned_data['category']
+            try:
+                rows, errors = importers.read_statement(statement.read(), statement.name)
+            except importers.StatementError as e:
+                form.add_error('file', str(e))
+                rows = None
+
+            if rows is not None and form.cleaned_data['dry_run']:
+                preview = importers.preview_statement(rows, category)
+            elif rows:
+                count = retry_on_lock(importers.import_statement)(wallet, request.user, rows, category)
+                messages.success(request, _("transactions_imported").format(count=count))
+                if errors:
+                    messages.warning(request, _("import_lines_skipped").format(count=len(errors)))
+
+                log_event(
+                    content=_("transactions_imported").format(count=count) + f": {wallet.name} ({statement.name})",
+                    user=request.user,
+                    type='TRANSACTION_IMPORT'
+                )
+                return redirect('wallet:transaction_list', wallet_id=wallet.id)
+            elif rows is not None:
+                form.add_error('file', _("import_no_transactions"))
+    else:
+        form = TransactionImportForm()
+
+    context = {
+        'form': form,
+        'wallet': wallet,
+        'preview': preview,
+        'errors': errors[:importers.PREVIEW_ROWS],
+        'error_count': len(errors),
+    }
+
+    return render(request, 'wallet/import_transactions.html', context)
+
 @login_required()
-def add_future_transaction(request, wallet_id):
-    wallet = get_object_or_404(Wallet, id=wallet_id)
-    if request.user not in wallet.users.all():
-        messages.error(request, _("no_access_to_wallet"))
-        return redirect('wallet:wallet_list')
-    
+@wallet_member_required
+def add_future_transaction(request, wallet):
     if request.method == 'POST':
         form = FutureTransactionForm(request.POST)
         if form.is_valid():
@@ -403,50 +401,25 @@ def add_future_transaction(request, wallet_id):
     return render(request, 'wallet/add_future_transaction.html', {'form': form, 'wallet': wallet})
 
 @login_required
-def edit_transaction(request, wallet_id, transaction_id):
+@wallet_member_required(attempt="unauthorized_transaction_modification_attempt")
+def edit_transaction(request, wallet, transaction_id):
     """
     View to edit a wallet's transaction
     """
-    wallet = get_object_or_404(Wallet, id=wallet_id)
     transaction = get_object_or_404(Transaction, id=transaction_id, wallet=wallet)
 
-    # Check that the user is a member of the wallet
-    if request.user not in wallet.users.all():
-        messages.error(request, _("no_access_to_wallet"))
-        Event.objects.create(
-            date=timezone.now(),
-            content=_("unauthorized_transaction_modification_attempt") + f": {wallet.name}",
-            user=request.user,
-            type='ERROR'
-        )
-        return redirect('wallet:wallet_list')
-
-    old_amount = transaction.amount
-    old_is_income = transaction.is_income
-
     if request.method == 'POST':
         form = TransactionForm(request.POST, instance=transaction)
         if form.is_valid():
-            # Replace previous transaction
-            if old_is_income:
-                wallet.balance -= old_amount
-            else:
-                wallet.balance += old_amount
-
-            # Save new transaction
-            transaction = form.save()
+            # Saving the transaction replaces its previous amount in the wallet balance
+            transaction = retry_on_lock(form.save)()
 
-            # Update the wallet's balance
             if transaction.is_income:
-                wallet.balance += transaction.amount
                 messages.success(request, _("income_modified_successfully"))
             else:
-                wallet.balance -= transaction.amount
                 messages.success(request, _("expense_modified_successfully"))
 
-            wallet.save()
-            Event.objects.create(
-                date=timezone.now(),
+            log_event(
                 content=_("transaction_modified") + f" ({_('expense') if not transaction.is_income else _('income')}): {transaction.title} - {transaction.amount}€",
                 user=request.user,
                 type='TRANSACTION_UPDATE'
@@ -467,38 +440,23 @@ def edit_transaction(request, wallet_id, transaction_id):
 
 
 @login_required
-def delete_transaction(request, wallet_id, transaction_id):
+@wallet_member_required(attempt="unauthorized_transaction_deletion_attempt")
+def delete_transaction(request, wallet, transaction_id):
     """
     View to delete a wallet's transaction
     """
-    wallet = get_object_or_404(Wallet, id=wallet_id)
     transaction = get_object_or_404(Transaction, id=transaction_id, wallet=wallet)
 
-    # Check that the user is a member of the wallet
-    if request.user not in wallet.users.all():
-        messages.error(request, _("no_access_to_wallet"))
-        Event.objects.create(
-            date=timezone.now(),
-            content=_("unauthorized_transaction_deletion_attempt") + f": {wallet.name}",
-            user=request.user,
-            type='ERROR'
-        )
-        return redirect('wallet:wallet_list')
-
     if request.method == 'POST':
-        # Update wallet's balance
+        # Deleting the transaction also updates the wallet balance
+        retry_on_lock(transaction.delete)()
+
         if transaction.is_income:
-            wallet.balance -= transaction.amount
             messages.success(request, _("income_deleted").format(amount=transaction.amount))
         else:
-            wallet.balance += transaction.amount
             messages.success(request, _("expense_deleted").format(amount=transaction.amount))
 
-        wallet.save()
-        transaction.delete()
-
-        Event.objects.create(
-            date=timezone.now(),
+        log_event(
             content=_("transaction_deleted") + f" ({_('expense') if not transaction.is_income else _('income')}): {transaction.title} - {transaction.amount}€",
             user=request.user,
             type='TRANSACTION_DELETE'
@@ -514,34 +472,13 @@ def delete_transaction(request, wallet_id, transaction_id):
 
 
 @login_required
-def transaction_list(request, wallet_id):
+@wallet_member_required(attempt="unauthorized_transaction_list_access_attempt")
+def transaction_list(request, wallet):
     """
     View to display a list of all wallet's transactions
     """
-    wallet = get_object_or_404(Wallet, id=wallet_id)
 
-    # Check that the user is a member of the wallet
-    if request.user not in wallet.users.all():
-        messages.error(request, _("no_access_to_wallet"))
-        Event.objects.create(
-            date=timezone.now(),
-            content=_("unauthorized_transaction_list_access_attempt") + f": {wallet.name}",
-            user=request.user,
-            type='ERROR'
-        )
-        return redirect('wallet:wallet_list')
-
-    transactions = Transaction.objects.filter(wallet=wallet).order_by('-date')
-
-    # Compute wallet's indicators
-    now = timezone.now()
-    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-    monthly_transactions = transactions.filter(date__gte=start_of_month)
-    monthly_income = monthly_transactions.filter(is_income=True).aggregate(
-        total=Sum('amount'))['total'] or 0
-    monthly_expenses = monthly_transactions.filter(is_income=False).aggregate(
-        total=Sum('amount'))['total'] or 0
+    transactions = Transaction.objects.filter(wallet=wallet)
 
     # If required, filter on categories
     category_filter = request.GET.get('category')
@@ -552,34 +489,80 @@ def transaction_list(request, wallet_id):
 
     # Filter transaction by type if required
     type_filter = request.GET.get('type')
-    if type_filter == 'income':
-        transactions = transactions.filter(is_income=True)
-    elif type_filter == 'expense':
-        transactions = transactions.filter(is_income=False)
+    is_income = {'income': True, 'expense': False}.get(type_filter)
+    if is_income is not None:
+        transactions = transactions.filter(is_income=is_income)
+
+    # Only load one page, starting after the cursor
+    cursor = request.GET.get('cursor')
+
+    # "Load more" requests only need the next rows
+    if request.GET.get('partial'):
+        page, next_cursor = _transaction_page(transactions, cursor)
+        html = render_to_string('wallet/transaction_rows.html', {'wallet': wallet, 'transactions': page}, request=request)
+        return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+    # The page and the indicators are only computed when their cached fragments are stale
+    load_page = SimpleLazyObject(lambda: _transaction_page(transactions, cursor))
+    start_of_month = timezone.localdate().replace(day=1)
+    monthly_totals = SimpleLazyObject(lambda: rollups.period_totals(wallet, start_of_month))
+    total_count = SimpleLazyObject(lambda: rollups.transaction_count(wallet, category_filter or None, is_income))
+
+    # Keep the active filters in the "load more" link
+    filter_query = request.GET.copy()
+    filter_query.pop('cursor', None)
 
     categories = Category.objects.all()
 
     context = {
         'wallet': wallet,
-        'transactions': transactions,
+        'transactions': SimpleLazyObject(lambda: load_page[0]),
+        'total_count': total_count,
+        'next_cursor': SimpleLazyObject(lambda: load_page[1]),
+        'cursor': cursor or '',
+        'filter_query': filter_query.urlencode(),
         'categories': categories,
         'current_category': category_filter,
         'selected_category': selected_category,
         'current_type': type_filter,
-        'monthly_income': monthly_income,
-        'monthly_expenses': monthly_expenses,
+        'monthly_income': SimpleLazyObject(lambda: monthly_totals[0]),
+        'monthly_expenses': SimpleLazyObject(lambda: monthly_totals[1]),
+        'month': start_of_month,
     }
 
     return render(request, 'wallet/transaction_list.html', context)
 
-@login_required
-def future_transaction_list(request, wallet_id):
-    wallet = get_object_or_404(Wallet, id=wallet_id)
 
-    if request.user not in wallet.users.all():
-        messages.error(request, _("no_access_to_wallet"))
-        return redirect('wallet:wallet_list')
+def _transaction_page(transactions, cursor):
+    """
+    Private function returning one page of transactions ordered by (date, id)
+    descending, starting after the cursor, and the cursor of the next page
+    """
+    transactions = transactions.select_related('category', 'user').order_by('-date', '-id')
+
+    if cursor:
+        try:
+            cursor_date, cursor_id = cursor.rsplit('_', 1)
+            cursor_date = parse_datetime(cursor_date)
+            cursor_id = int(cursor_id)
+        except ValueError:
+            cursor_date = None
+
+        if cursor_date is not None:
+            # Seek on the (wallet, date) index instead of counting skipped rows
+            transactions = transactions.filter(date__lte=cursor_date).exclude(date=cursor_date, id__gte=cursor_id)
+
+    page = list(transactions[:TRANSACTIONS_PAGE_SIZE + 1])
+    next_cursor = None
+    if len(page) > TRANSACTIONS_PAGE_SIZE:
+        page = page[:TRANSACTIONS_PAGE_SIZE]
+        next_cursor = f"{page[-1].date.isoformat()}_{page[-1].id}"
+
+    return page, next_cursor
 
+@login_required
+@wallet_member_required
+def future_transaction_list(request, wallet):
     future_transactions = FutureTransaction.objects.filter(wallet=wallet, active=True).order_by('execution_date')
 
     context = {
@@ -590,14 +573,10 @@ def future_transaction_list(request, wallet_id):
     return render(request, 'wallet/future_transaction_list.html', context)
 
 @login_required
-def edit_future_transaction(request, wallet_id, transaction_id):
-    wallet = get_object_or_404(Wallet, id=wallet_id)
+@wallet_member_required
+def edit_future_transaction(request, wallet, transaction_id):
     future_transaction = get_object_or_404(FutureTransaction, id=transaction_id, wallet=wallet)
 
-    if request.user not in wallet.users.all():
-        messages.error(request, _("no_access_to_wallet"))
-        return redirect('wallet:wallet_list')
-
     if request.method == 'POST':
         form = FutureTransactionForm(request.POST, instance=future_transaction)
         if form.is_valid():
@@ -618,8 +597,8 @@ def edit_future_transaction(request, wallet_id, transaction_id):
     return render(request, 'wallet/add_future_transaction.html', context)
 
 @login_required
-def delete_future_transaction(request, wallet_id, transaction_id):
-    wallet = get_object_or_404(Wallet, id=wallet_id)
+@wallet_member_required
+def delete_future_transaction(request, wallet, transaction_id):
     future_transaction = get_object_or_404(FutureTransaction, id=transaction_id, wallet=wallet)
 
     if request.method == 'POST':
@@ -632,22 +611,11 @@ def delete_future_transaction(request, wallet_id, transaction_id):
     })
 
 @login_required
-def edit_objective(request, wallet_id):
+@wallet_member_required(attempt="unauthorized_objective_modification_attempt")
+def edit_objective(request, wallet):
     """
     View to edit the objective of the wallet
     """
-    wallet = get_object_or_404(Wallet, id=wallet_id)
-
-    # Check that the user is a member of the wallet
-    if request.user not in wallet.users.all():
-        messages.error(request, _("no_access_to_wallet"))
-        Event.objects.create(
-            date=timezone.now(),
-            content=_("unauthorized_objective_modification_attempt") + f": {wallet.name}",
-            user=request.user,
-            type='ERROR'
-        )
-        return redirect('wallet:wallet_list')
 
     if request.method == 'POST':
         objective = request.POST.get('objective')
@@ -659,7 +627,8 @@ def edit_objective(request, wallet_id):
                 else:
                     old_objective = wallet.objective
                     wallet.objective = objective_value
-                    wallet.save()
+                    wallet.save(update_fields=['objective'])
+                    Wallet.touch(wallet.id)
 
                     if old_objective != objective_value:
                         messages.success(request, _("objective_updated_successfully").format(
@@ -669,8 +638,7 @@ def edit_objective(request, wallet_id):
                     else:
                         messages.info(request, _("objective_unchanged"))
 
-                    Event.objects.create(
-                        date=timezone.now(),
+                    log_event(
                         content=_("objective_modified") + f": {wallet.name} - {old_objective}€ → {objective_value}€",
                         user=request.user,
                         type='OBJECTIVE_UPDATE'
@@ -707,30 +675,17 @@ def edit_objective(request, wallet_id):
     return render(request, 'wallet/edit_objective.html', context)
 
 @login_required
-def add_member(request, wallet_id):
+@wallet_owner_required(attempt="unauthorized_member_addition_attempt")
+def add_member(request, wallet):
     """
     View to add a new family member to the wallet
     """
-    wallet = get_object_or_404(Wallet, id=wallet_id)
-
-    # Check that the user is a member of the wallet
-    if request.user != wallet.owner:
-        messages.error(request, _("no_access_to_wallet"))
-        Event.objects.create(
-            date=timezone.now(),
-            content=_("unauthorized_member_addition_attempt") + f": {wallet.name}",
-            user=request.user,
-            type='ERROR'
-        )
-        return redirect('wallet:wallet_list')
-
     if request.method == 'POST':
         user_id = request.POST.get('user_id')
         user = get_object_or_404(Account, id=user_id)
         wallet.users.add(user)
         messages.success(request, _("member_added_to_wallet").format(user_name=user.get_full_name()))
-        Event.objects.create(
-            date=timezone.now(),
+        log_event(
             content=_("member_added_to_wallet_log") + f": {user.get_full_name()}",
             user=request.user,
             type='WALLET_UPDATE'
@@ -740,29 +695,16 @@ def add_member(request, wallet_id):
         return redirect('wallet:wallet_detail', wallet_id=wallet.id)
 
 @login_required
-def remove_member(request, wallet_id, user_id):
+@wallet_owner_required(attempt="unauthorized_member_removal_attempt")
+def remove_member(request, wallet, user_id):
     """
     View to delete a member from the wallet
     """
-    wallet = get_object_or_404(Wallet, id=wallet_id)
-
-    # Check that the user is a member of the wallet
-    if request.user != wallet.owner:
-        messages.error(request, _("no_access_to_wallet"))
-        Event.objects.create(
-            date=timezone.now(),
-            content=_("unauthorized_member_removal_attempt") + f": {wallet.name}",
-            user=request.user,
-            type='ERROR'
-        )
-        return redirect('wallet:wallet_list')
-
     user = get_object_or_404(Account, id=user_id)
     if request.user != user:
         wallet.users.remove(user)
         messages.success(request, _("member_removed_from_wallet").format(user_name=user.get_full_name()))
-        Event.objects.create(
-            date=timezone.now(),
+        log_event(
             content=_("member_removed_from_wallet_log") + f": {user.get_full_name()}",
             user=request.user,
             type='WALLET_UPDATE'
@@ -774,155 +716,128 @@ def remove_member(request, wallet_id, user_id):
 
 
 @login_required
-def generate_monthly_report(request, wallet_id):
+@wallet_member_required
+def generate_monthly_report(request, wallet):
     """
-    Generate a monthly PDF report
+    Queue a monthly PDF report
     """
-    wallet = get_object_or_404(Wallet, id=wallet_id)
-
-    # Check if user has access to the wallet
-    if request.user not in wallet.users.all():
-        messages.error(request, _("no_access_to_wallet"))
-        return redirect('wallet:wallet_list')
-
     # Calculate dates for current month
-    now = timezone.now()
+    now = timezone.localtime()
     start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
-    return _generate_report(request, wallet, start_of_month, now, _('monthly'))
+    return _queue_report(request, wallet, ReportJob.Period.MONTHLY, start_of_month, now)
 
 
 @login_required
-def generate_quarterly_report(request, wallet_id):
+@wallet_member_required
+def generate_quarterly_report(request, wallet):
     """
-    Generate a quarterly PDF report
+    Queue a quarterly PDF report
     """
-    wallet = get_object_or_404(Wallet, id=wallet_id)
-
-    # Check if user has access to the wallet
-    if request.user not in wallet.users.all():
-        messages.error(request, _("no_access_to_wallet"))
-        return redirect('wallet:wallet_list')
-
     # Calculate dates for current quarter
-    now = timezone.now()
+    now = timezone.localtime()
     current_quarter = (now.month - 1) // 3 + 1
     start_of_quarter = now.replace(month=(current_quarter - 1) * 3 + 1, day=1, hour=0, minute=0, second=0,
                                    microsecond=0)
 
-    return _generate_report(request, wallet, start_of_quarter, now, _('quarterly'))
+    return _queue_report(request, wallet, ReportJob.Period.QUARTERLY, start_of_quarter, now)
 
 
 @login_required
-def generate_annual_report(request, wallet_id):
+@wallet_member_required
+def generate_annual_report(request, wallet):
     """
-    Generate an annual PDF report
+    Queue an annual PDF report
     """
-    wallet = get_object_or_404(Wallet, id=wallet_id)
-
-    # Check if user has access to the wallet
-    if request.user not in wallet.users.all():
-        messages.error(request, _("no_access_to_wallet"))
-        return redirect('wallet:wallet_list')
-
     # Calculate dates for current year
-    now = timezone.now()
+    now = timezone.localtime()
     start_of_year = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
 
-    return _generate_report(request, wallet, start_of_year, now, _('annual'))
+    return _queue_report(request, wallet, ReportJob.Period.ANNUAL, start_of_year, now)
 
 
-def _generate_report(request, wallet, start_date, end_date, period_type):
+def _queue_report(request, wallet, period, start_date, end_date):
     """
-    Private function to generate PDF reports
+    Private function queuing a PDF report for the report workers,
+    unless the same report is already cached or queued
     """
-    # Get transactions for the period
-    transactions = Transaction.objects.filter(
-        wallet=wallet,
-        date__gte=start_date,
-        date__lte=end_date
-    ).order_by('-date')
-
-    # Calculate statistics
-    period_income = transactions.filter(is_income=True).aggregate(
-        total=Sum('amount'))['total'] or 0
-    period_expenses = transactions.filter(is_income=False).aggregate(
-        total=Sum('amount'))['total'] or 0
-
-    net_result = period_income - period_expenses
-
-    # Statistics by category (expenses only)
-    category_stats = (
-        transactions.filter(is_income=False)
-        .values('category__name')
-        .annotate(
-            total=Sum('amount'),
-            count=Count('id')
+    language = translation.get_language()
+    cache_key = reports.report_cache_key(wallet, period, start_date, end_date, language)
+
+    job = reports.find_cached_job(wallet, cache_key)
+    if job is None:
+        job = ReportJob.objects.create(
+            wallet=wallet,
+            requested_by=request.user,
+            period=period,
+            start_date=start_date,
+            end_date=end_date,
+            language=language,
+            cache_key=cache_key,
         )
-        .order_by('-total')
-    )
+    return redirect('wallet:report_job', job_id=job.id)
+
+
+def _get_report_job(request, job_id):
+    """
+    Private function returning the job if the user is a member of its wallet
+    """
+    job = get_object_or_404(ReportJob.objects.select_related('wallet'), id=job_id)
+    if not is_wallet_member(request.user, job.wallet_id):
+        return None
+    return job
 
-    # Statistics by user
-    user_stats = []
-    for user in wallet.users.all():
-        user_transactions = transactions.filter(user=user)
-        income_total = user_transactions.filter(is_income=True).aggregate(
-            total=Sum('amount'))['total'] or 0
-        expense_total = user_transactions.filter(is_income=False).aggregate(
-            total=Sum('amount'))['total'] or 0
-        transaction_count = user_transactions.count()
-
-        if transaction_count > 0:  # Only include users with transactions
-            user_stats.append({
-                'user_name': user.get_full_name(),
-                'income_total': income_total,
-                'expense_total': expense_total,
-                'transaction_count': transaction_count
-            })
-
-    # Sort by transaction count (descending)
-    user_stats.sort(key=lambda x: x['transaction_count'], reverse=True)
-
-    # Prepare context for template
-    context = {
-        'wallet': wallet,
-        'period_type': period_type,
-        'start_date': start_date,
-        'end_date': end_date,
-        'transactions': transactions,
-        'period_income': period_income,
-        'period_expenses': period_expenses,
-        'net_result': net_result,
-        'category_stats': category_stats,
-        'user_stats': user_stats,
-        'transaction_count': transactions.count(),
-        'generated_at': timezone.now(),
-        'generated_by': request.user,
-    }
 
-    # Generate PDF
-    template = get_template('wallet/report_pdf.html')
-    html = template.render(context)
+@login_required
+def report_job(request, job_id):
+    """
+    Page waiting for a queued report and offering its download
+    """
+    job = _get_report_job(request, job_id)
+    if job is None:
+        messages.error(request, _("no_access_to_wallet"))
+        return redirect('wallet:wallet_list')
 
-    # Create PDF response
-    result = io.BytesIO()
-    pdf = pisa.pisaDocument(io.BytesIO(html.encode("UTF-8")), result)
+    return render(request, 'wallet/report_job.html', {'job': job, 'wallet': job.wallet})
 
-    if not pdf.err:
-        # Create filename
-        filename = f"{_('report')}_{period_type}_{wallet.name}_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.pdf"
 
-        # Log event
-        Event.objects.create(
-            date=timezone.now(),
-            content=_("report_generated") + f" ({period_type}): {wallet.name}",
-            user=request.user,
-            type='REPORT_GENERATE'
-        )
+@login_required
+def report_job_status(request, job_id):
+    """
+    Status of a queued report, polled by the report page
+    """
+    job = _get_report_job(request, job_id)
+    if job is None:
+        return HttpResponseForbidden()
+
+    return JsonResponse({
+        'status': job.status,
+        'download_url': reverse('wallet:download_report', kwargs={'job_id': job.id})
+        if job.status == ReportJob.Status.DONE else None,
+    })
+
+
+@login_required
+def download_report(request, job_id):
+    """
+    Serve a finished report straight from disk
+    """
+    job = _get_report_job(request, job_id)
+    if job is None:
+        messages.error(request, _("no_access_to_wallet"))
+        return redirect('wallet:wallet_list')
+
+    if job.status != ReportJob.Status.DONE:
+        messages.error(request, _("error_generating_report"))
+        return redirect('wallet:transaction_list', wallet_id=job.wallet.id)
+
+    try:
+        report = open(job.file_path, 'rb')
+    except FileNotFoundError:
+        raise Http404
 
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+    # Keep recently downloaded reports in the cache
+    ReportJob.objects.filter(id=job.id).update(last_accessed_at=timezone.now())
 
-    messages.error(request, _("error_generating_report"))
-    return redirect('wallet:transaction_list', wallet_id=wallet.id)
\ No newline at end of file
+    return FileResponse(report, as_attachment=True, filename=reports.report_filename(job),
+                        content_type='application/pdf')